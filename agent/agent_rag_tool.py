@@ -1,21 +1,43 @@
-from langchain_unstructured import UnstructuredLoader
+# LangChain, the Unstructured, Google GenAI, Pinecone and OpenAI clients and the local index
+# modules are imported where they are first used, so importing the tool stays well under a second
 # from langchain_community.document_loaders import PyPDFLoader
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
-from pinecone import Pinecone, ServerlessSpec
-import pinecone
-# Chat history in langchain
-from langchain.memory import ConversationBufferMemory
-from langchain_core.prompts import MessagesPlaceholder
 
 from dotenv import load_dotenv, find_dotenv
-from langchain_core.tools import tool
 import os
 import time
 
+from agent.uri_resolver import URIResolver
+from agent.tracing import tracer
+from agent.registry import deferred_tools, get_chat_model, shared
+
 #Load the environment variables
 load_dotenv(find_dotenv(), override=True)
 
+# "pinecone" or "local" (memory-mapped index in LOCAL_INDEX_DIR)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "agent/content/index")
+# "google" or "hash" (deterministic, no network)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "google")
+# "api" partitions through the Unstructured API, "local" with the offline process-parallel partitioner
+PARTITION_MODE = os.getenv("PARTITION_MODE", "api")
+# BM25 index over the ingested chunks and the example URLs, fused with vector search results
+KEYWORD_INDEX_PATH = os.getenv("KEYWORD_INDEX_PATH", "agent/content/keyword_index.json")
+EXAMPLE_URLS_PATH = "agent/content/docs/example_urls.txt"
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", 6))
+# Resolutions at or above this confidence are answered without retrieval or the LLM
+URI_RESOLVER_THRESHOLD = float(os.getenv("URI_RESOLVER_THRESHOLD", 0.8))
+# Output size of text-embedding-004 (and of HashingEmbeddings by default)
+EMBEDDING_DIMENSION = 768
+
+
+def create_embeddings():
+    """Embedding model selected by EMBEDDING_BACKEND"""
+    if EMBEDDING_BACKEND == "hash":
+        from agent.embeddings import HashingEmbeddings
+        return HashingEmbeddings()
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    return GoogleGenerativeAIEmbeddings(model="models/text-embedding-004", google_api_key=os.getenv("GEMINI_API_KEY"))
+
 
 #-------------------------------------------------------
 #-------------Spliting and Chunking the PDF-------------
@@ -28,8 +50,13 @@ def load_pdf_pages(file_path: list[str]):
         file_path (str): The path to the PDF file.
     
     Returns:
-        docs: A list of document objects (each representing a page) loaded via UnstructuredLoader.
+        docs: The document chunks, loaded via UnstructuredLoader or, with PARTITION_MODE=local,
+              streamed from the local partitioner as they are produced.
     """
+    if PARTITION_MODE == "local":
+        from agent.pdf_partition import partition_documents
+        return partition_documents(file_path)
+    from langchain_unstructured import UnstructuredLoader
     loader = UnstructuredLoader(
     file_path=file_path,
     api_key=os.getenv("UNSTRUCTURED_API_KEY"),
@@ -45,38 +72,66 @@ def load_pdf_pages(file_path: list[str]):
 #-----------------------------------------------------------
 def embedding_and_saving(index_name, docs):
     """
-    Creates embeddings for the provided documents and saves them to a Pinecone vector store.
+    Creates embeddings for the provided documents and saves them to the configured vector store.
   
     Parameters:
-        index_name: The name of the Pinecone index.
+        index_name: The name of the Pinecone index (ignored by the local backend).
         docs: The list of documents to be embedded and stored.
     
     Returns:
-        vector_store: An instance of the PineconeVectorStore with documents added.
+        vector_store: The PineconeVectorStore or LocalVectorStore with documents added.
     """
-    #Create a embedding model using Google Generative AI
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004", google_api_key=os.getenv("GEMINI_API_KEY"))
-
-    #Create a Pinecone Vector Store instance
-    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-    if not pc.has_index(index_name):
-        pc.create_index(
-            name=index_name,
-            dimension=738,
-            metric="cosine",
-            spec=ServerlessSpec(
-                cloud="aws", 
-                region="us-east-1"
+    from agent.ingest import IngestionPipeline
+    from agent.keyword_index import BM25Index, line_documents
+
+    #Create the embedding model selected by EMBEDDING_BACKEND
+    embeddings = create_embeddings()
+
+    if VECTOR_BACKEND == "local":
+        from agent.vector_store import LocalVectorStore
+        vector_store = LocalVectorStore(LOCAL_INDEX_DIR, embeddings)
+        manifest_path = os.path.join(LOCAL_INDEX_DIR, "manifest.json")
+    else:
+        from langchain_pinecone import PineconeVectorStore
+        from pinecone import Pinecone, ServerlessSpec
+        #Create a Pinecone Vector Store instance
+        pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+        if not pc.has_index(index_name):
+            pc.create_index(
+                name=index_name,
+                dimension=EMBEDDING_DIMENSION,
+                metric="cosine",
+                spec=ServerlessSpec(
+                    cloud="aws", 
+                    region="us-east-1"
+                ) 
             ) 
-        ) 
 
-    # Wait for the index to be ready
-    while not pc.describe_index(index_name).status['ready']:
-        time.sleep(1)
+        # Wait for the index to be ready
+        while not pc.describe_index(index_name).status['ready']:
+            time.sleep(1)
+
+        vector_store = PineconeVectorStore(index_name=index_name, embedding=embeddings, pinecone_api_key=os.getenv("PINECONE_API_KEY"))
+        manifest_path = f"agent/content/{index_name}.manifest.json"
+
+    #Embed and save only the chunks that changed since the last run, adding every chunk
+    #to a fresh keyword index as it streams past
+    keyword_index = BM25Index()
+
+    def index_keywords(docs):
+        for doc in docs:
+            keyword_index.add(doc)
+            yield doc
+
+    stats = IngestionPipeline(vector_store, manifest_path).run(index_keywords(docs))
+    print(f"Ingestion finished: {stats}")
 
-    vector_store = PineconeVectorStore(index=index_name, embedding=embeddings)
-    #Embed and save the documents to the vector store
-    vector_store.from_documents(documents=docs)
+    #Complete the keyword index with one entry per example URL
+    if os.path.exists(EXAMPLE_URLS_PATH):
+        for doc in line_documents(EXAMPLE_URLS_PATH):
+            keyword_index.add(doc)
+    keyword_index.finish()
+    keyword_index.save(KEYWORD_INDEX_PATH)
 
     return vector_store
 
@@ -84,11 +139,177 @@ def embedding_and_saving(index_name, docs):
 #------------QUERY AND RETRIVE DOCUMENT------------------
 #-------------------------------------------------------
 
-@tool
+#Check Index Name on Pinecone Database with your actual index name
+INDEX_NAME = "rest-apic-configuration"
+
+RAG_TEMPLATE = """
+## Role Definition
+You are a Cisco APIC Documentation Specialist with dual capabilities in:
+1. Technical Information Retrieval
+2. API Endpoint Synthesis
+
+## Context Analysis
+**Input Context**:
+{context}
+
+**Query Analysis**:
+- Primary Intent: {question}
+- Secondary Objectives:
+    1. Identify implicit requirements
+    2. Detect API version requirements
+    3. Determine response format needs
+
+## URL Extraction Rules
+1. **Validation Criteria**:
+    - Must start with `/api/`
+    - Must include .json extension
+    - Must contain valid MO class (e.g., fvTenant, fvBD)
+    - Must include required query parameters if applicable
+
+2. **Priority Order**:
+    1. Class-based queries (class/*.json)
+    2. Managed object queries (mo/*.json)
+    3. Cross-class queries (node/class/*.json)
+
+## Answer Structure
+**Mandatory Components**:
+[API Endpoint]
+URL: <valid_api_url_here>
+
+**Optional Components**:
+! When health metrics requested:
+◼ Add Health Score Formula:
+healthScore = (faultCounts.CRITICAL * 10) + (faultCounts.MAJOR * 5) + (faultCounts.MINOR * 1)
+
+! When troubleshooting:
+◼ Add Diagnostic Steps:
+1. Verify tenant existence
+2. Check parent object health
+3. Validate EPG associations
+
+## Error Handling Protocol
+**Condition**: Incomplete/Missing Context
+→ Response Template:
+"Insufficient documentation context for precise API endpoint generation. 
+Required parameters missing: [param1, param2]. 
+Suggested fallback endpoint: /api/class/[object_class].json"
+
+**Condition**: Multiple Valid URLs
+→ Response Template:
+"Multiple valid API endpoints found:
+1. [URL1] - Primary recommendation
+2. [URL2] - Alternative for [specific_condition]
+Selection criteria: [explanation]"
+
+## Security Constraints
+- NEVER include credentials in examples
+- ALWAYS recommend HTTPS
+- SANITIZE output from context (remove internal IPs/credentials)
+
+## Examples
+**User Query**: "How to get tenant list with health status?"
+**Model Response**:
+[API Endpoint]
+URL: /api/class/fvTenant.json?rsp-subtree-include=health,required
+
+[Explanation]
+Combines tenant class query with health subtree inclusion
+
+[Usage Example]
+curl -k -X GET https://apic-ip-address/api/class/fvTenant.json?rsp-subtree-include=health,required -u $USER:$PASS
+
+**User Query**: "Show EPG associations for BD PROD-DB"
+**Model Response**:
+[API Endpoint]
+URL: /api/mo/uni/tn-PROD/BD-PROD-DB.json?query-target=children&target-subtree-class=fvRsCons
+
+[Explanation]
+Navigates BD hierarchy to find consumer EPG relationships
+
+## Critical Requirements
+1. URL must be DIRECTLY extracted from context
+2. If no exact match exists, construct using context patterns
+3. Include error prevention tips when appropriate
+4. Add time complexity estimates for large queries
+
+## Output Format
+Strictly follow this JSON structure:
+{{
+    "api_endpoint": "<generated_url>",
+    "technical_basis": "<selection_reasoning>",
+    "complexity_estimate": "<low|medium|high>",
+    "security_note": "<authentication_requirements>",
+    "alternative_endpoints": ["<url1>", "<url2>"]
+}}
+
+Now process this query:
+Question: {question}
+Context: {context}
+"""
+
+# Embedding model, vector store, indexes and LLM live in the shared registry, created on first use
+def get_embeddings():
+    """Configured embedding model with repeated query embeddings served from memory (CachedQueryEmbeddings)"""
+    def create():
+        from agent.embeddings import CachedQueryEmbeddings
+        return CachedQueryEmbeddings(create_embeddings())
+    return shared("embeddings", create)
+
+
+def _create_vector_store():
+    if VECTOR_BACKEND == "local":
+        from agent.vector_store import LocalVectorStore
+        return LocalVectorStore(LOCAL_INDEX_DIR, get_embeddings())
+    from langchain_pinecone import PineconeVectorStore
+    return PineconeVectorStore(index_name=INDEX_NAME, embedding=get_embeddings(), pinecone_api_key=os.getenv("PINECONE_API_KEY"))
+
+
+def get_vector_store():
+    """Vector store selected by VECTOR_BACKEND"""
+    return shared("vector_store", _create_vector_store)
+
+
+def get_keyword_index():
+    """BM25 index written at ingestion time, or None when documents were never ingested"""
+    if not os.path.exists(KEYWORD_INDEX_PATH):
+        return None
+
+    def load():
+        from agent.keyword_index import BM25Index
+        return BM25Index.load(KEYWORD_INDEX_PATH)
+    return shared("keyword_index", load)
+
+
+def get_uri_resolver() -> URIResolver:
+    """Rule-based resolver compiled from the example URLs"""
+    return shared("uri_resolver", lambda: URIResolver(EXAMPLE_URLS_PATH))
+
+
+def get_answer_cache():
+    """Answers of earlier questions, reused for near-identical queries (SemanticCache)"""
+    def create():
+        from agent.semantic_cache import SemanticCache
+        return SemanticCache()
+    return shared("answer_cache", create)
+
+
+def get_rag_prompt():
+    """PromptTemplate of RAG_TEMPLATE, built once per process instead of on every tool call"""
+    def create():
+        from langchain_core.prompts import PromptTemplate
+        return PromptTemplate(input_variables=["question", "context"], template=RAG_TEMPLATE)
+    return shared("rag_prompt", create)
+
+
+def get_llm():
+    return get_chat_model()
+
+
 def query_and_retrieve_document(query: str):
     """
-    Performs a similarity search on the Pinecone vector store and uses the retrieved context
-    to generate an answer via a language model.
+    Resolves the query to an APIC URL directly when it maps onto a known class, object
+    and modifiers. Otherwise performs a hybrid search, vector similarity fused with BM25
+    keyword matches, and uses the retrieved context to generate an answer via a language model.
   
     Parameters:
         query (str): The user's query to search in the vector store.
@@ -97,150 +318,54 @@ def query_and_retrieve_document(query: str):
         The content of the generated answer from the language model.
         Returns None if an error occurs.
     """
-
-    #Check Index Name on Pinecone Database with your actual index name
-    index_name="rest-apic-configuration"
-    #Create a embedding model using Google Generative AI and vector store
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004", google_api_key=os.getenv("GEMINI_API_KEY"))
-    vector_store = PineconeVectorStore(index_name=index_name,embedding=embeddings, pinecone_api_key=os.getenv("PINECONE_API_KEY"))
-
     try:
-        retrieved_docs = vector_store.similarity_search(query=query, k=10)
+        with tracer.span("rag.resolve") as span:
+            resolution = get_uri_resolver().resolve(query)
+            span.set(confidence=resolution.confidence if resolution else 0.0)
+        if resolution is not None and resolution.confidence >= URI_RESOLVER_THRESHOLD:
+            return resolution.answer()
+
+        query_vector = get_embeddings().embed_query(query)
+        with tracer.span("rag.cache_lookup") as span:
+            cached_answer = get_answer_cache().lookup(query, query_vector)
+            span.set(hit=cached_answer is not None)
+        if cached_answer is not None:
+            return cached_answer
+
+        with tracer.span("rag.vector_search", backend=VECTOR_BACKEND):
+            retrieved_docs = get_vector_store().similarity_search_by_vector(query_vector, k=10)
+        keyword_index = get_keyword_index()
+        if keyword_index is not None:
+            with tracer.span("rag.keyword_search"):
+                keyword_docs = [doc for doc, _ in keyword_index.search(query, k=10)]
+            from agent.keyword_index import reciprocal_rank_fusion
+            retrieved_docs = reciprocal_rank_fusion([retrieved_docs, keyword_docs], limit=RAG_TOP_K)
         docs_content = "\n\n".join(doc.page_content for doc in retrieved_docs)
 
-        #Define the prompt template
-        from langchain_core.prompts import PromptTemplate, ChatPromptTemplate
-        from langchain_openai import ChatOpenAI
-        from agent.apic_client import APICClient
-
-        client = APICClient()
-        llm = ChatOpenAI(model="qwen-plus", api_key=client.api_key, base_url="https://dashscope-intl.aliyuncs.com/compatible-mode/v1")
-
-        prompt_template = PromptTemplate(
-            input_variables=["question", "context"],
-            template="""
-            ## Role Definition
-            You are a Cisco APIC Documentation Specialist with dual capabilities in:
-            1. Technical Information Retrieval
-            2. API Endpoint Synthesis
-
-            ## Context Analysis
-            **Input Context**:
-            {context}
-
-            **Query Analysis**:
-            - Primary Intent: {question}
-            - Secondary Objectives:
-                1. Identify implicit requirements
-                2. Detect API version requirements
-                3. Determine response format needs
-
-            ## URL Extraction Rules
-            1. **Validation Criteria**:
-                - Must start with `/api/`
-                - Must include .json extension
-                - Must contain valid MO class (e.g., fvTenant, fvBD)
-                - Must include required query parameters if applicable
-            
-            2. **Priority Order**:
-                1. Class-based queries (class/*.json)
-                2. Managed object queries (mo/*.json)
-                3. Cross-class queries (node/class/*.json)
-
-            ## Answer Structure
-            **Mandatory Components**:
-            [API Endpoint]
-            URL: <valid_api_url_here>
-
-            **Optional Components**:
-            ! When health metrics requested:
-            ◼ Add Health Score Formula:
-            healthScore = (faultCounts.CRITICAL * 10) + (faultCounts.MAJOR * 5) + (faultCounts.MINOR * 1)
-
-            ! When troubleshooting:
-            ◼ Add Diagnostic Steps:
-            1. Verify tenant existence
-            2. Check parent object health
-            3. Validate EPG associations
-
-            ## Error Handling Protocol
-            **Condition**: Incomplete/Missing Context
-            → Response Template:
-            "Insufficient documentation context for precise API endpoint generation. 
-            Required parameters missing: [param1, param2]. 
-            Suggested fallback endpoint: /api/class/[object_class].json"
-
-            **Condition**: Multiple Valid URLs
-            → Response Template:
-            "Multiple valid API endpoints found:
-            1. [URL1] - Primary recommendation
-            2. [URL2] - Alternative for [specific_condition]
-            Selection criteria: [explanation]"
-
-            ## Security Constraints
-            - NEVER include credentials in examples
-            - ALWAYS recommend HTTPS
-            - SANITIZE output from context (remove internal IPs/credentials)
-
-            ## Examples
-            **User Query**: "How to get tenant list with health status?"
-            **Model Response**:
-            [API Endpoint]
-            URL: /api/class/fvTenant.json?rsp-subtree-include=health,required
-
-            [Explanation]
-            Combines tenant class query with health subtree inclusion
-
-            [Usage Example]
-            curl -k -X GET https://apic-ip-address/api/class/fvTenant.json?rsp-subtree-include=health,required -u $USER:$PASS
-
-            **User Query**: "Show EPG associations for BD PROD-DB"
-            **Model Response**:
-            [API Endpoint]
-            URL: /api/mo/uni/tn-PROD/BD-PROD-DB.json?query-target=children&target-subtree-class=fvRsCons
-
-            [Explanation]
-            Navigates BD hierarchy to find consumer EPG relationships
-
-            ## Critical Requirements
-            1. URL must be DIRECTLY extracted from context
-            2. If no exact match exists, construct using context patterns
-            3. Include error prevention tips when appropriate
-            4. Add time complexity estimates for large queries
-
-            ## Output Format
-            Strictly follow this JSON structure:
-            {{
-                "api_endpoint": "<generated_url>",
-                "technical_basis": "<selection_reasoning>",
-                "complexity_estimate": "<low|medium|high>",
-                "security_note": "<authentication_requirements>",
-                "alternative_endpoints": ["<url1>", "<url2>"]
-            }}
-
-            Now process this query:
-            Question: {question}
-            Context: {context}
-            """
-        )
         # Format the prompt
-        formatted_prompt = prompt_template.format(question=query, context=docs_content)
+        formatted_prompt = get_rag_prompt().format(question=query, context=docs_content)
 
         # Generate the answer using the LLM
-        answer = llm.invoke(formatted_prompt)
+        with tracer.span("rag.generate", chunks=len(retrieved_docs), context_chars=len(docs_content)):
+            answer = get_llm().invoke(formatted_prompt)
+        if answer.content:
+            get_answer_cache().store(query, query_vector, answer.content)
         return answer.content
     except Exception as e:
         print(f"Error: {e}")
         return None
 
+# query_and_retrieve_document becomes a tool when first imported from this module
+__getattr__ = deferred_tools(globals(), query_and_retrieve_document)
+
 if __name__ == "__main__":
 
     filepath = ["agent/content/docs/cisco-apic-rest-api-configuration-guide-42x-and-later.pdf", "agent/content/docs/example_urls.txt"]
     index_name = "rest-apic-configuration"
 
-    docs = load_pdf_pages(filepath=filepath)
+    docs = load_pdf_pages(file_path=filepath)
 
     vector_store = embedding_and_saving(index_name=index_name, docs=docs)
 
-    respones = query_and_retrieve_document("How can get tenant information using REST API?")
+    respones = __getattr__("query_and_retrieve_document").invoke({"query": "How can get tenant information using REST API?"})
     print(respones)
\ No newline at end of file
@@ -1,57 +1,160 @@
-from agent.apic_client import APICClient
+from agent.registry import (deferred_tools, get_apic_client, get_batch_runner, get_fabric_clients, get_result_store,
+                            get_worker_pool)
+from agent.apic_projection import estimate_tokens, summarize, to_table
+from agent.apic_cluster import merge_fabric_results
+from agent.apic_control import is_error
 # from langchain_fireworks import ChatFireworks
-from langchain_core.tools import tool
-from langchain_experimental.utilities import PythonREPL
 
 # Import the Langgraph and create_react_agent
 # from langgraph.prebuilt import create_react_agent
 # Import the process function from the fuzzywuzzy module (For finding the closest uri match)
+import os
 import json
-client = APICClient()
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+# The APIC client (with its mirror), the result store and the Python workers come from the
+# shared registry and are created on first use, not when the tools are imported
+# Results larger than this (in estimated tokens) are summarized; the full data stays available by handle
+GET_APIC_TOKEN_BUDGET = int(os.getenv("GET_APIC_TOKEN_BUDGET", 4000))
+GET_APIC_TOP_N = int(os.getenv("GET_APIC_TOP_N", 10))
 # model = ChatFireworks(model="accounts/fireworks/models/deepseek-v3", api_key=client.api_key)
 
 
 # Define the python_repl tool
-@tool
 def python_repl(input: str) -> str:
     """
-    This tool executes valid Python code and returns the output.
-    The input must be a valid Python expression or statement.
+    This tool executes valid Python code and returns what it prints.
+    The input must be a valid Python expression or statement; use print() to return values.
+    Never paste get_apic output into the code: every get_apic result carries a "handle",
+    and `load("<handle>")` returns the full JSON of that result. `save(value)` stores a
+    value and returns a new handle for later calls.
+    For very large APIC classes, iterate with `iter_apic(uri)` instead: it yields one MO
+    at a time, fetching the result page by page.
+    Code runs in a separate worker process with a time and memory limit. Only data modules
+    can be imported (math, statistics, json, csv, re, datetime, collections, itertools, ...);
+    open(), eval/exec, getattr and private attributes are not available.
     """
-    # Create an instance of PythonREPL
-    repl = PythonREPL()
-
+    from langchain_experimental.utilities import PythonREPL
     # Sanitize the input to remove unwanted characters
     sanitized_input = PythonREPL.sanitize_input(input)
 
     try:
-        # Execute the sanitized input using the PythonREPL instance
-        output = repl.run(sanitized_input)
-        return output
+        # Execute the sanitized input in a pooled worker process
+        return get_worker_pool().run(sanitized_input)
     except Exception as e:
         # Return the error message if execution fails
         return f"Error executing Python code: {str(e)}"
 
     
 
-@tool
-def get_apic(uri: str) -> json:
+def get_apic(uri: str, fields: Optional[list[str]] = None, filters: Optional[dict] = None,
+             prop_include: Optional[str] = None, compact: bool = True) -> json:
     """
     This tool calls the APIC GET method and get information from the APIC.
+    Keep results small:
+    - fields: only return these attributes of each object, e.g. ["name", "healthScore"] (dn is always kept)
+    - filters: attribute conditions the APIC applies, e.g. {"name": "PROD"}, {"role": ["leaf", "spine"]};
+      a value starting with ~ is a wildcard match
+    - prop_include: "config-only" or "naming-only" to drop operational attributes on the APIC side
+    - compact: return objects as tables ({"tables": {class: {"columns": [...], "rows": [...]}}}); children
+      such as healthInst or faultInst get their own table with a parentDn column; set false for the raw APIC JSON
+    Large results are replaced by a summary (counts, value counts, numeric ranges, a sample).
+    The result always includes a "handle"; python_repl code can pass it to load() to get the full data.
+    A failed call returns {"error": {"status", "text", "retryable", "hint"}} instead; throttled reads
+    were already retried, so follow the hint rather than repeating the same call.
     """
-    response = client.get_resource(uri)
-    return response
+    try:
+        response = get_apic_client().get_resource(uri, fields=fields, filters=filters, prop_include=prop_include)
+    except ValueError as err:
+        return {"error": str(err)}
+    if is_error(response):
+        # Not stored under a handle: the agent should read the error, not load() it
+        return response
+    return present(response, compact)
+
+
+def present(response: dict, compact: bool = True, budget: Optional[int] = None) -> dict:
+    """Store the full response under a handle and return it as tables, or summarized if over the token budget"""
+    handle = get_result_store().put(response)
+    body = to_table(response) if compact else response
+    if estimate_tokens(body) > (budget or GET_APIC_TOKEN_BUDGET):
+        body = summarize(response, GET_APIC_TOP_N)
+    return {"handle": handle, **body}
+
+
+def get_apic_fabrics(uri: str, fabrics: Optional[list[str]] = None, fields: Optional[list[str]] = None,
+                     filters: Optional[dict] = None, prop_include: Optional[str] = None, compact: bool = True) -> dict:
+    """
+    This tool runs the same APIC GET on several fabrics at once and merges the results.
+    fabrics names the fabrics to query (all configured fabrics by default); fields, filters,
+    prop_include and compact work as for get_apic. Every returned object carries a "fabric"
+    attribute, and fabrics that failed are listed under "failedFabrics" with their errors
+    under "fabricErrors".
+    """
+    clients = get_fabric_clients()
+    selected = fabrics or list(clients)
+    unknown = [name for name in selected if name not in clients]
+    if unknown:
+        return {"error": f"Unknown fabrics {unknown}, configured fabrics are {list(clients)}"}
+
+    def fetch(name):
+        return clients[name].get_resource(uri, fields=fields, filters=filters, prop_include=prop_include)
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(selected)) as executor:
+            responses = dict(zip(selected, executor.map(fetch, selected)))
+    except ValueError as err:
+        return {"error": str(err)}
+    merged = merge_fabric_results(responses)
+    failures = {key: merged[key] for key in ("failedFabrics", "fabricErrors") if key in merged}
+    if len(failures.get("failedFabrics", [])) == len(selected):
+        return {"error": "The query failed on every fabric", **failures}
+    # The tables only carry the objects, so the failures are added back next to them
+    return {**present(merged, compact), **failures}
+
+
+def get_apic_batch(uris: list[str], compact: bool = True) -> dict:
+    """
+    This tool calls the APIC GET method for several URIs at once and returns the results keyed by URI.
+    Use it instead of repeated get_apic calls when the URIs do not depend on each other.
+    Every result is presented as by get_apic (tables, a "handle" for load(), a summary when large),
+    with the token budget shared across the URIs; failed URIs return an "error" instead.
+    """
+    results = get_batch_runner().get_many(uris)
+    budget = max(1, GET_APIC_TOKEN_BUDGET // max(1, len(results)))
+    return {
+        uri: result if is_error(result) else present(result, compact, budget)
+        for uri, result in results.items()
+    }
 
 
-@tool
 def post_apic(uri: str, payload: dict) -> str:
     """
     This tool calls the APIC POST method to change configuration on APIC.
     """
-    response = client.post_resouce(uri, payload)
+    response = get_apic_client().post_resouce(uri, payload)
 
     return response
 
+
+def post_apic_batch(payloads: list[dict], dry_run: bool = False) -> dict:
+    """
+    This tool applies several APIC configuration objects in one POST (one APIC transaction).
+    Each payload looks like {"fvBD": {"attributes": {"dn": "uni/tn-X/BD-Y", ...}}} and must carry its dn.
+    Set dry_run to true to get the per-object create/modify/delete diff without changing anything.
+    """
+    batch = get_apic_client().batch()
+    try:
+        for payload in payloads:
+            batch.add(payload)
+        return batch.diff() if dry_run else batch.commit()
+    except ValueError as err:
+        return {"success": False, "error": str(err)}
+
+# The functions above become tools when first imported from this module, so importing it stays cheap
+__getattr__ = deferred_tools(globals(), python_repl, get_apic, get_apic_fabrics, get_apic_batch, post_apic,
+                             post_apic_batch)
+
 if __name__ == "__main__":
 
     pass
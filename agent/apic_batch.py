@@ -0,0 +1,201 @@
+import copy
+import re
+from urllib.parse import urlsplit
+from typing import Dict, List, Optional, Tuple
+
+from agent.apic_control import apic_error_text, is_error
+from agent.mit_store import split_dn
+
+# /api/node/mo/uni/tn-X.json -> uni/tn-X
+MO_PATH_RE = re.compile(r"^/api/(?:node/)?mo/(.+)\.json$")
+
+# Classes of container objects, used to wrap batched MOs in their ancestors
+RN_CLASSES = {
+  "uni": "polUni",
+  "infra": "infraInfra",
+  "fabric": "fabricInst",
+  "tn-": "fvTenant",
+  "ap-": "fvAp",
+  "epg-": "fvAEPg",
+  "BD-": "fvBD",
+  "ctx-": "fvCtx",
+  "subnet-": "fvSubnet",
+  "brc-": "vzBrCP",
+  "subj-": "vzSubj",
+  "flt-": "vzFilter",
+  "e-": "vzEntry",
+  "out-": "l3extOut",
+  "lnodep-": "l3extLNodeP",
+  "lifp-": "l3extLIfP",
+  "instP-": "l3extInstP",
+  "l2out-": "l2extOut",
+  "attentp-": "infraAttEntityP",
+  "nprof-": "infraNodeP",
+  "accportprof-": "infraAccPortP",
+  "hports-": "infraHPortS",
+  "funcprof": "infraFuncP",
+  "accportgrp-": "infraAccPortGrp",
+  "accbundle-": "infraAccBndlGrp",
+  "vlanns-": "fvnsVlanInstP",
+  "phys-": "physDomP",
+  "l3dom-": "l3extDomP",
+}
+
+# Attributes that describe the request rather than the object
+NON_CONFIG_ATTRIBUTES = {"dn", "rn", "status", "childAction"}
+
+
+def class_for_rn(rn: str) -> Optional[str]:
+    """Guess the class of a container object from its RN"""
+    if rn in RN_CLASSES:
+      return RN_CLASSES[rn]
+    prefix = rn.split("-", 1)[0] + "-"
+    return RN_CLASSES.get(prefix)
+
+
+class WriteBatch:
+    """
+    Collects MO payloads and posts them as one tree rooted at their common ancestor.
+
+    The APIC applies a single POST as one transaction, so the whole batch either
+    succeeds or is rolled back. Ancestors between the common root and each MO are
+    sent with status=modified so the batch never creates them implicitly.
+    """
+    def __init__(self, client):
+      self.client = client
+      # dn -> (class name, body) in insertion order
+      self.objects: Dict[str, Tuple[str, dict]] = {}
+
+    def __enter__(self) -> "WriteBatch":
+      return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+      if exc_type is None and self.objects:
+        self.commit()
+
+    def __len__(self) -> int:
+      return len(self.objects)
+
+    def add(self, payload: dict, uri: Optional[str] = None) -> None:
+      """Queue a {class: {"attributes": ...}} payload; the dn comes from its attributes or the uri"""
+      for class_name, body in payload.items():
+        body = copy.deepcopy(body)
+        attributes = body.setdefault("attributes", {})
+        dn = attributes.get("dn")
+        if not dn and uri:
+          match = MO_PATH_RE.match(urlsplit(uri.strip()).path)
+          dn = match.group(1) if match else None
+        if not dn:
+          raise ValueError(f"{class_name} payload has no dn and no /api/mo/<dn>.json uri")
+        attributes["dn"] = dn
+        if dn in self.objects:
+          # Merge repeated writes to the same object
+          _, queued = self.objects[dn]
+          queued["attributes"].update(attributes)
+          queued.setdefault("children", []).extend(body.get("children", []))
+        else:
+          self.objects[dn] = (class_name, body)
+
+    def common_ancestor(self) -> str:
+      """Deepest DN that contains every queued object"""
+      paths = [split_dn(dn) for dn in self.objects]
+      common = []
+      for rns in zip(*paths):
+        if any(rn != rns[0] for rn in rns):
+          break
+        common.append(rns[0])
+      if not common:
+        raise ValueError("Batched objects do not share a root (e.g. uni and topology)")
+      # A lone object is posted to its parent so its own status is honored
+      if len(self.objects) == 1 and len(common) > 1:
+        common = common[:-1]
+      return "/".join(common)
+
+    def build(self) -> Tuple[str, dict]:
+      """Return the (uri, payload) of the merged tree"""
+      if not self.objects:
+        raise ValueError("Nothing to write")
+      root_dn = self.common_ancestor()
+      root_rns = split_dn(root_dn)
+      tree: Dict[str, List[str]] = {}
+      for dn in self.objects:
+        rns = split_dn(dn)
+        for depth in range(len(root_rns), len(rns)):
+          parent, child = "/".join(rns[:depth]), "/".join(rns[:depth + 1])
+          siblings = tree.setdefault(parent, [])
+          if child not in siblings:
+            siblings.append(child)
+      return f"/api/mo/{root_dn}.json", self._build_node(root_dn, tree)
+
+    def _build_node(self, dn: str, tree: Dict[str, List[str]]) -> dict:
+      children = [self._build_node(child, tree) for child in tree.get(dn, [])]
+      if dn in self.objects:
+        class_name, body = self.objects[dn]
+        body = copy.deepcopy(body)
+      else:
+        class_name = class_for_rn(split_dn(dn)[-1])
+        if class_name is None:
+          raise ValueError(f"Unknown class for container {dn}; add it to the batch explicitly")
+        body = {"attributes": {"dn": dn, "status": "modified"}}
+      if children:
+        body.setdefault("children", []).extend(children)
+      return {class_name: body}
+
+    def diff(self) -> dict:
+      """Dry run: compare each queued object with the controller without writing anything"""
+      uri, payload = self.build()
+      root_dn = MO_PATH_RE.match(uri).group(1)
+      classes = sorted({class_name for class_name, _ in self.objects.values()})
+      current_response = self.client.get_resource(
+        f"/api/mo/{root_dn}.json?query-target=subtree&target-subtree-class={','.join(classes)}")
+      if is_error(current_response):
+        # Without the current state every object would look new
+        return {"uri": uri, "payload": payload, **current_response}
+      current = {}
+      for mo in current_response.get("imdata", []):
+        for _, body in mo.items():
+          attributes = body.get("attributes", {})
+          current[attributes.get("dn")] = attributes
+
+      objects = []
+      for dn, (class_name, body) in self.objects.items():
+        wanted = body["attributes"]
+        existing = current.get(dn)
+        if wanted.get("status") == "deleted":
+          action, changes = ("delete" if existing else "absent"), {}
+        elif existing is None:
+          action = "create"
+          changes = {key: {"old": None, "new": value} for key, value in wanted.items()
+                     if key not in NON_CONFIG_ATTRIBUTES}
+        else:
+          changes = {key: {"old": existing.get(key), "new": value} for key, value in wanted.items()
+                     if key not in NON_CONFIG_ATTRIBUTES and existing.get(key) != value}
+          action = "modify" if changes or body.get("children") else "unchanged"
+        objects.append({"dn": dn, "class": class_name, "action": action, "changes": changes})
+      return {"uri": uri, "payload": payload, "objects": objects}
+
+    def commit(self) -> dict:
+      """Post the merged tree once and report a result for every queued object"""
+      uri, payload = self.build()
+      full_url = f"{self.client.base_url}{uri}"
+      error = None
+      try:
+        response = self.client._request("POST", full_url, json=payload)
+        if response.status_code >= 400:
+          error = apic_error_text(response)
+      except Exception as err:
+        error = str(err)
+      finally:
+        self.client.cache.invalidate_write(uri, payload)
+
+      # The APIC rolls back the whole transaction; point at the object it complained about
+      culprit = max((dn for dn in self.objects if error and dn in error), key=len, default=None)
+      objects = []
+      for dn, (class_name, _) in self.objects.items():
+        if error is None:
+          status = "ok"
+        else:
+          status = "failed" if dn == culprit or culprit is None else "rolled-back"
+        objects.append({"dn": dn, "class": class_name, "status": status})
+      self.objects = {}
+      return {"uri": uri, "success": error is None, "error": error, "objects": objects}
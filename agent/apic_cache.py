@@ -0,0 +1,225 @@
+import os
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from urllib.parse import urlsplit, parse_qsl, urlencode
+from typing import Dict, FrozenSet, Iterable, Optional
+
+# /api/node/mo/uni/tn-X.json -> uni/tn-X
+MO_PATH_RE = re.compile(r"^/api/(?:node/)?mo/(.+)\.json$")
+# /api/node/class/topology/pod-1/l1PhysIf.json -> (topology/pod-1, l1PhysIf)
+CLASS_PATH_RE = re.compile(r"^/api/(?:node/)?class/(?:(.+)/)?([A-Za-z0-9]+)\.json$")
+
+# Operational classes change on their own, so they are only cached briefly
+DEFAULT_CLASS_TTLS = {
+  "faultInst": 5,
+  "faultSummary": 5,
+  "healthInst": 5,
+  "fvCEp": 10,
+  "fvIp": 10,
+  "eventRecord": 5,
+  "aaaModLR": 5,
+}
+
+
+def parse_class_ttls(value: str) -> Dict[str, float]:
+    """Parse "faultInst=5,fvCEp=10" into a class -> seconds mapping"""
+    ttls = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+      name, _, seconds = item.partition("=")
+      ttls[name.strip()] = float(seconds)
+    return ttls
+
+
+def dn_overlaps(a: str, b: str) -> bool:
+    """True when one DN is the other or one of its ancestors"""
+    if a == b:
+      return True
+    shorter, longer = sorted((a, b), key=len)
+    return longer.startswith(shorter + "/")
+
+
+@dataclass
+class CacheEntry:
+    # Response body as received; every hit parses its own copy, so callers may modify what they get
+    body: bytes
+    expires_at: float
+    size: int
+    # DN the query is scoped to, None for fabric-wide class queries
+    dn: Optional[str]
+    # Classes the response can contain, None when any class may appear
+    classes: Optional[FrozenSet[str]]
+
+
+class ResponseCache:
+    """Thread-safe TTL + LRU cache of APIC GET responses bounded by total response size"""
+    def __init__(self, max_bytes: Optional[int] = None, default_ttl: Optional[float] = None,
+                 class_ttls: Optional[Dict[str, float]] = None):
+      self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv('APIC_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+      self.default_ttl = default_ttl if default_ttl is not None else float(os.getenv('APIC_CACHE_TTL', 30))
+      self.class_ttls = dict(DEFAULT_CLASS_TTLS)
+      self.class_ttls.update(parse_class_ttls(os.getenv('APIC_CACHE_CLASS_TTLS', '')))
+      self.class_ttls.update(class_ttls or {})
+      self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+      self._lock = threading.Lock()
+      self.total_bytes = 0
+      self.hits = 0
+      self.misses = 0
+      self.evictions = 0
+      self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+      return self.default_ttl > 0 and self.max_bytes > 0
+
+    @staticmethod
+    def make_key(uri: str) -> str:
+      """Normalize a URI so equivalent queries share one cache entry"""
+      parts = urlsplit(uri.strip())
+      params = sorted(parse_qsl(parts.query, keep_blank_values=True))
+      path = parts.path.rstrip("/")
+      return f"{path}?{urlencode(params)}" if params else path
+
+    @staticmethod
+    def _scope(uri: str):
+      """Work out the DN and classes a query can return"""
+      parts = urlsplit(uri.strip())
+      params = dict(parse_qsl(parts.query))
+      # Subtree includes can pull in any descendant class
+      wide = "rsp-subtree" in params or "rsp-subtree-include" in params
+      target_classes = frozenset(filter(None, params.get("target-subtree-class", "").split(",")))
+      mo_match = MO_PATH_RE.match(parts.path)
+      if mo_match:
+        classes = target_classes if target_classes and not wide else None
+        return mo_match.group(1), classes
+      class_match = CLASS_PATH_RE.match(parts.path)
+      if class_match:
+        classes = None if wide else frozenset([class_match.group(2)])
+        return class_match.group(1), classes
+      return None, None
+
+    def _ttl(self, classes: Optional[FrozenSet[str]]) -> float:
+      if not classes:
+        return self.default_ttl
+      return min(self.class_ttls.get(name, self.default_ttl) for name in classes)
+
+    def cacheable(self, uri: str) -> bool:
+      return self.enabled and "subscription=yes" not in uri
+
+    def get(self, uri: str) -> Optional[dict]:
+      """Return a fresh cached response or None, counting the hit or miss"""
+      key = self.make_key(uri)
+      with self._lock:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+          self._remove(key)
+          entry = None
+        if entry is None:
+          self.misses += 1
+          return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        body = entry.body
+      return json.loads(body)
+
+    def put(self, uri: str, body: bytes) -> None:
+      """Store a response body, evicting least recently used entries to stay under max_bytes"""
+      size = len(body)
+      if size > self.max_bytes:
+        return
+      dn, classes = self._scope(uri)
+      ttl = self._ttl(classes)
+      if ttl <= 0:
+        return
+      key = self.make_key(uri)
+      with self._lock:
+        if key in self._entries:
+          self._remove(key)
+        self._entries[key] = CacheEntry(body, time.monotonic() + ttl, size, dn, classes)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+          oldest = next(iter(self._entries))
+          self._remove(oldest)
+          self.evictions += 1
+
+    def invalidate(self, dn: str, classes: Iterable[str] = ()) -> int:
+      """Drop entries that may contain objects written under dn or of the written classes (any class if none are given)"""
+      written_classes = frozenset(classes)
+      with self._lock:
+        stale = []
+        for key, entry in self._entries.items():
+          if entry.dn is not None and dn_overlaps(entry.dn, dn):
+            stale.append(key)
+          elif entry.dn is None and (entry.classes is None or not written_classes
+                                     or entry.classes & written_classes):
+            stale.append(key)
+        for key in stale:
+          self._remove(key)
+        self.invalidations += len(stale)
+        return len(stale)
+
+    def invalidate_write(self, uri: str, payload: dict) -> int:
+      """Drop everything a POST of payload to uri may have changed"""
+      mo_match = MO_PATH_RE.match(urlsplit(uri.strip()).path)
+      if not mo_match:
+        return self.clear()
+      if deletes_subtree(payload):
+        # A deleted MO takes its whole subtree with it, so class queries of any class may be stale
+        return self.invalidate(mo_match.group(1))
+      return self.invalidate(mo_match.group(1), payload_classes(payload))
+
+    def clear(self) -> int:
+      """Drop every entry, returning how many there were"""
+      with self._lock:
+        stale = len(self._entries)
+        self._entries.clear()
+        self.total_bytes = 0
+        return stale
+
+    def _remove(self, key: str) -> None:
+      entry = self._entries.pop(key)
+      self.total_bytes -= entry.size
+
+    def stats(self) -> dict:
+      """Hit/miss counters and current occupancy"""
+      with self._lock:
+        lookups = self.hits + self.misses
+        return {
+          "entries": len(self._entries),
+          "bytes": self.total_bytes,
+          "hits": self.hits,
+          "misses": self.misses,
+          "hit_rate": self.hits / lookups if lookups else 0.0,
+          "evictions": self.evictions,
+          "invalidations": self.invalidations,
+        }
+
+
+def payload_classes(payload: dict) -> set:
+    """Collect every MO class name in a (possibly nested) APIC payload"""
+    classes = set()
+    stack = [payload]
+    while stack:
+      node = stack.pop()
+      for name, body in node.items():
+        classes.add(name)
+        if isinstance(body, dict):
+          stack.extend(child for child in body.get("children", []) if isinstance(child, dict))
+    return classes
+
+
+def deletes_subtree(payload: dict) -> bool:
+    """True when any MO in the payload is deleted (status "deleted")"""
+    stack = [payload]
+    while stack:
+      node = stack.pop()
+      for body in node.values():
+        if not isinstance(body, dict):
+          continue
+        if "deleted" in body.get("attributes", {}).get("status", ""):
+          return True
+        stack.extend(child for child in body.get("children", []) if isinstance(child, dict))
+    return False
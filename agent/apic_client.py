@@ -1,22 +1,70 @@
 import os
+import re
+import json
+import time
+import logging
+import threading
 import requests
 from urllib3 import disable_warnings
 from dotenv import load_dotenv, find_dotenv
-from typing import Dict
+from urllib.parse import urlsplit, parse_qsl, urlencode
+from typing import Dict, Iterable, Iterator, Optional
+
+from agent.apic_cache import ResponseCache
+from agent.apic_batch import WriteBatch
+from agent.apic_control import RETRY_STATUSES, CircuitOpenError, RequestControl, error_result, is_error, retry_after
+from agent.mit_store import MITStore
+from agent.apic_projection import shape_uri, project
+from agent.tracing import TracedHTTPAdapter, tracer
+
+logger = logging.getLogger(__name__)
 
 # load environment variables OPEN API KEY
 load_dotenv(find_dotenv(), override=True)
 
+# Renew the token this many seconds before the APIC expires it
+TOKEN_REFRESH_MARGIN = 30
+
+# Last path segment of a class query, e.g. /api/node/class/fvBD.json -> fvBD
+CLASS_QUERY_RE = re.compile(r"/class/(?:.+/)?([A-Za-z0-9]+)\.json$")
+
+def normalize_uri(url: str) -> str:
+    """Clean up a URI produced by the LLM so it can be appended to the base URL"""
+    url = url.strip()
+    # Ensure the URL starts with a slash
+    if not url.startswith('/'):
+        url = '/' + url
+    if url.endswith('\"'):
+        url = url[:-1]
+    return url
+
 class APICClient:
     """Manange APIC Connect interactions with automate token refresh"""
-    def __init__(self):
-      self.base_url = os.getenv('APIC_BASE_URL')
+    def __init__(self, pool_size: Optional[int] = None, timeout: Optional[float] = None,
+                 base_url: Optional[str] = None):
+      self.base_url = base_url or os.getenv('APIC_BASE_URL')
       self.username = os.getenv('APIC_USERNAME')
       self.password = os.getenv('APIC_PASSWORD')
       self.api_key = os.getenv('ALIBABA_API_KEY')
+      self.pool_size = pool_size or int(os.getenv('APIC_POOL_SIZE', 10))
+      self.timeout = timeout or float(os.getenv('APIC_TIMEOUT', 30))
+      # One keep-alive connection pool per controller, reused by every call
       self.session = requests.Session()
       self.session.verify = False
+      adapter = TracedHTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+      self.session.mount("https://", adapter)
+      self.session.mount("http://", adapter)
       self.cookie = None
+      self.token_expiry = 0.0
+      self._auth_lock = threading.Lock()
+      # Shared GET response cache, invalidated by our own writes
+      self.cache = ResponseCache()
+      # Rate limit, adaptive concurrency limit and circuit breaker for this controller
+      self.control = RequestControl(self.base_url, int(os.getenv('APIC_MAX_IN_FLIGHT', self.pool_size)), self.timeout)
+      # Optional MITMirror that answers covered queries locally, attached by the mirror itself
+      self.mirror = None
+      # Offline snapshot from APIC_SNAPSHOT, queried before the controller
+      self.snapshot = MITStore.from_env()
       disable_warnings()
 
     def _authenticate(self) -> None:
@@ -31,46 +79,234 @@ class APICClient:
           }
         }
       }
-      response = self.session.post(auth_url, json=auth_payload)
+      response = self.session.post(auth_url, json=auth_payload, timeout=self.timeout)
       response.raise_for_status()
-      self.cookie = response.cookies
+      self._store_token(response)
+
+    def _refresh(self) -> None:
+      """Renew the current token with aaaRefresh, falling back to a fresh login"""
+      try:
+        response = self.session.get(f"{self.base_url}/api/aaaRefresh.json", timeout=self.timeout)
+        response.raise_for_status()
+        self._store_token(response)
+      except requests.exceptions.RequestException:
+        self._authenticate()
+
+    def _store_token(self, response: requests.Response) -> None:
+      """Record the session cookie and when the APIC will expire it"""
+      self.cookie = self.session.cookies
+      try:
+        attributes = response.json()["imdata"][0]["aaaLogin"]["attributes"]
+        lifetime = float(attributes.get("refreshTimeoutSeconds", 300))
+      except (ValueError, KeyError, IndexError):
+        lifetime = 300.0
+      self.token_expiry = time.monotonic() + lifetime
+
+    def _ensure_token(self) -> None:
+      """Log in on first use and refresh the token shortly before it expires"""
+      # Fast path without the lock, so concurrent sessions only queue while a login or refresh is running
+      if self.cookie and time.monotonic() < self.token_expiry - TOKEN_REFRESH_MARGIN:
+        return
+      with self._auth_lock:
+        if not self.cookie:
+          self._authenticate()
+        elif time.monotonic() >= self.token_expiry - TOKEN_REFRESH_MARGIN:
+          self._refresh()
+
+    def _relogin(self, stale_expiry: float) -> None:
+      """Log in again unless another thread already did since the failed call"""
+      with self._auth_lock:
+        if self.token_expiry == stale_expiry:
+          self._authenticate()
+
+    def _request(self, method: str, full_url: str, **kwargs) -> requests.Response:
+      """
+      Send a request, retrying a GET that was throttled or failed transiently.
+
+      Retries wait with exponential backoff and full jitter, or as long as the
+      controller's Retry-After asks; writes are never retried. The last
+      response is returned even if it is an error, the last exception raised.
+      """
+      attempt = 0
+      while True:
+        try:
+          response = self._attempt(method, full_url, **kwargs)
+        except CircuitOpenError:
+          raise
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+          delay = self.control.retry_delay(attempt) if method == "GET" else None
+          if delay is None:
+            raise
+        else:
+          if method != "GET" or response.status_code not in RETRY_STATUSES:
+            return response
+          delay = self.control.retry_delay(attempt, retry_after(response.headers))
+          if delay is None:
+            return response
+          response.close()
+        attempt += 1
+        tracer.annotate(retries=attempt)
+        time.sleep(delay)
+
+    def _attempt(self, method: str, full_url: str, admit_timeout: Optional[float] = None,
+                 **kwargs) -> requests.Response:
+      """
+      Send one request over the pooled session within the rate controls,
+      re-authenticating once on 401/403. admit_timeout overrides how long to
+      wait for a rate token or a slot.
+      """
+      self.control.admit(admit_timeout)
+      started = time.monotonic()
+      response, error = None, None
+      try:
+        parts = urlsplit(full_url)
+        with tracer.span("apic.http", method=method, path=parts.path, query=parts.query or None) as span:
+          self._ensure_token()
+          expiry = self.token_expiry
+          kwargs.setdefault("timeout", self.timeout)
+          response = self.session.request(method, full_url, **kwargs)
+          if response.status_code in (401, 403):
+            response.close()
+            self._relogin(expiry)
+            span.set(relogin=True)
+            response = self.session.request(method, full_url, **kwargs)
+          # elapsed runs from sending the request to parsing the headers: server time plus one round trip
+          span.set(status=response.status_code, server_ms=round(response.elapsed.total_seconds() * 1000, 3))
+          length = response.headers.get("Content-Length")
+          if not kwargs.get("stream"):
+            span.set(bytes=len(response.content))
+          elif length and length.isdigit():
+            span.set(bytes=int(length))
+        return response
+      except Exception as err:
+        error = err
+        raise
+      finally:
+        self.control.complete(response, time.monotonic() - started, error)
 
+    def get_resource(self, url: str, fields: Optional[Iterable[str]] = None, filters: Optional[dict] = None,
+                     prop_include: Optional[str] = None) -> dict:
+      """
+      Make API call to APIC.
 
-    def get_resource(self, url: str) -> dict:
+      filters (attribute -> value) become a query-target-filter and prop_include
+      sets rsp-prop-include, so the APIC does the filtering. fields keeps only
+      those attributes (and dn) of every returned MO.
+      """
+      url = shape_uri(normalize_uri(url), filters, prop_include)
+      data = self._get(url)
+      if fields and not is_error(data):
+        return project(data, fields)
+      return data
+
+    def _get(self, url: str) -> dict:
+      if self.snapshot is not None:
+        local = self.snapshot.query(url)
+        if local is not None:
+          return local
+      if self.mirror is not None:
+        mirrored = self.mirror.query(url)
+        if mirrored is not None:
+          return mirrored
+      use_cache = self.cache.cacheable(url)
+      if use_cache:
+        cached = self.cache.get(url)
+        if cached is not None:
+          return cached
+      full_url = f"{self.base_url}{url}"
+      try:
+        response = self._request("GET", full_url)
+        response.raise_for_status()
+        data = response.json()
+        if use_cache:
+          self.cache.put(url, response.content)
+        return data
+      except requests.exceptions.HTTPError as http_err:
+        logger.warning("HTTP error: %s", http_err)
+        return error_result(http_err, self.base_url)
+      except Exception as err:
+        logger.warning("GET %s failed: %s", full_url, err)
+        return error_result(err, self.base_url)
+
+    def iter_resource(self, url: str, page_size: Optional[int] = None,
+                      max_page_bytes: Optional[int] = None) -> Iterator[dict]:
+      """
+      Yield the MOs of a query one by one, driving the APIC page/page-size parameters.
+
+      Only one page is held in memory at a time. A page whose body exceeds
+      max_page_bytes is discarded and re-requested with half the page size.
+      HTTP errors are raised to the caller instead of being printed.
+      """
+      page_size = page_size or int(os.getenv('APIC_PAGE_SIZE', 1000))
+      max_page_bytes = max_page_bytes or int(os.getenv('APIC_MAX_PAGE_BYTES', 16 * 1024 * 1024))
+      parts = urlsplit(normalize_uri(url))
+      params = [(k, v) for k, v in parse_qsl(parts.query) if k not in ("page", "page-size")]
+      if not any(k == "order-by" for k, _ in params):
+        # Paging is only stable when the APIC sorts the result
+        match = CLASS_QUERY_RE.search(parts.path)
+        target_class = dict(params).get("target-subtree-class", "").split(",")[0]
+        order_class = match.group(1) if match else target_class
+        if order_class:
+          params.append(("order-by", f"{order_class}.dn"))
+
+      offset = 0
+      while True:
+        query = urlencode(params + [("page", offset // page_size), ("page-size", page_size)], safe=",()")
+        full_url = f"{self.base_url}{parts.path}?{query}"
+        response = self._request("GET", full_url, stream=True)
+        response.raise_for_status()
+        body = self._read_capped(response, max_page_bytes if page_size > 1 else None)
+        if body is None:
+          # Page too large for the memory cap, retry the same offset with smaller pages
+          page_size //= 2
+          while offset % page_size:
+            page_size -= 1
+          continue
+        data = json.loads(body)
+        del body
+        imdata = data.get("imdata", [])
+        total = int(data.get("totalCount", 0))
+        yield from imdata
+        offset += len(imdata)
+        if len(imdata) < page_size or offset >= total:
+          return
+
+    @staticmethod
+    def _read_capped(response: requests.Response, max_bytes: Optional[int]) -> Optional[bytes]:
+      """Read a streamed body, giving up and returning None once it exceeds max_bytes"""
+      body = bytearray()
+      for chunk in response.iter_content(chunk_size=64 * 1024):
+        body.extend(chunk)
+        if max_bytes is not None and len(body) > max_bytes:
+          response.close()
+          return None
+      return bytes(body)
+
+    def post_resouce(self, url: str, payload: Dict) -> dict:
       """Make API call to APIC"""
-      if not self.cookie:
-        self._authenticate()
-      
-      # Ensure the URL starts with a slash
-      if not url.startswith('/'):
-        url = '/' + url        
-      full_url = (f"{self.base_url}{url}").strip()
-      if full_url.endswith('\"'):
-        full_url = full_url[:-1]
-      print(full_url)
+      url = normalize_uri(url)
+      full_url = f"{self.base_url}{url}"
       try:
-        response = requests.get(full_url, cookies=self.cookie, verify=False)
+        response = self._request("POST", full_url, json=payload)
         response.raise_for_status()
         return response.json()
       except requests.exceptions.HTTPError as http_err:
-        return print(f"HTTP error occurred: {http_err}")
+        logger.warning("HTTP error: %s", http_err)
+        return error_result(http_err, self.base_url)
       except Exception as err:
-        return print(f"Error occurred: {err}")
-        
-    def post_resouce(self, url: str, payload: Dict) -> dict:
-        """Make API call to APIC"""
-        if not self.cookie:
-            self._authenticate()
-        
-        full_url = f"{self.base_url}{url}"
-        try:
-            response = requests.post(full_url, cookies=self.cookie, json=payload, verify=False)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as http_err:
-            return print(f"HTTP error occurred: {http_err}")
-        except Exception as err:
-            return print(f"Error occurred: {err}")
+        logger.warning("POST %s failed: %s", full_url, err)
+        return error_result(err, self.base_url)
+      finally:
+        # Even a failed write may have been applied, so never serve the old state
+        self.cache.invalidate_write(url, payload)
+
+    def batch(self) -> WriteBatch:
+      """Start a write batch that is posted to the APIC as a single transaction"""
+      return WriteBatch(self)
+
+    def close(self) -> None:
+      """Close the pooled connections, e.g. when the registry discards the client"""
+      self.session.close()
 
 
 # Usage example
@@ -82,6 +318,6 @@ if __name__ == "__main__":
     tenants = apic_client.get_resource(url)
     print(tenants)
 
-    
 
-    
+
+
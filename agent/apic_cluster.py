@@ -0,0 +1,313 @@
+import os
+import time
+import random
+import logging
+import threading
+import requests
+from urllib3.exceptions import NewConnectionError
+from typing import Dict, List, Optional
+
+from agent.apic_client import APICClient
+from agent.apic_control import AdmissionTimeout, CircuitOpenError, is_error
+from agent.tracing import tracer
+
+# Weight of the newest sample in a controller's moving average latency
+LATENCY_ALPHA = 0.3
+# A failed controller is left out for EJECT_SECONDS, doubling per consecutive failure up to EJECT_MAX_SECONDS
+EJECT_SECONDS = 5.0
+EJECT_MAX_SECONDS = 120.0
+# Unauthenticated endpoint used to check that an ejected controller answers again
+PROBE_PATH = "/api/aaaListDomains.json"
+# Server errors that mean "try another controller" for a read
+FAILOVER_STATUSES = {502, 503, 504}
+# Throttled: try another controller, but this one is healthy and stays in service
+THROTTLED_STATUS = 429
+
+logger = logging.getLogger(__name__)
+
+
+class Controller:
+    """One member of a cluster: its own client (session, connection pool, token) and health"""
+    def __init__(self, client: APICClient):
+        self.client = client
+        self.latency: Optional[float] = None
+        self.in_flight = 0
+        self.failures = 0
+        # Set while the controller is out of service; a background probe clears it
+        self.ejected = False
+        self.retry_at = 0.0
+        self.probe: Optional[threading.Thread] = None
+
+    def load(self) -> float:
+        """Expected wait for one more request: latency times the requests ahead of it"""
+        return (self.latency or 0.0) * (self.in_flight + 1)
+
+
+class APICCluster(APICClient):
+    """
+    APICClient for a fabric with several controllers.
+
+    Each controller keeps its own session, connection pool and token. Reads go
+    to the healthy controller with the lowest expected wait (moving average
+    latency times requests in flight); a controller whose own concurrency or
+    rate limit is full passes the request on instead of holding it, and only
+    when every controller is full does the request wait for a slot. A read
+    that fails to connect, times out or gets a 429/502/503/504 is retried on
+    the next controller. Writes go to the first healthy controller in
+    configured order and are only retried elsewhere when the connection could
+    not be opened. A failed controller is ejected with exponential backoff and
+    probed in the background until it answers again, or until the cluster
+    is closed. Each controller also has
+    its own rate controls (see RequestControl); a controller whose circuit
+    breaker is open is skipped. When every controller failed, a read is
+    retried with backoff as for a single controller. The response cache,
+    snapshot and mirror work as for a single controller.
+    """
+    def __init__(self, base_urls: List[str], pool_size: Optional[int] = None, timeout: Optional[float] = None,
+                 connect_timeout: Optional[float] = None):
+        if not base_urls:
+            raise ValueError("APICCluster needs at least one controller URL")
+        self.controllers = [Controller(APICClient(pool_size, timeout, base_url=url)) for url in base_urls]
+        for controller in self.controllers:
+            # The cluster answers from its own cache and snapshot before choosing a controller
+            controller.client.snapshot = None
+        super().__init__(pool_size, timeout, base_url=base_urls[0])
+        # A dead controller must not hold a call for the full read timeout just to open the connection
+        self.connect_timeout = connect_timeout or float(os.getenv("APIC_CONNECT_TIMEOUT", 3))
+        self._health_lock = threading.Lock()
+        # Set by close(); stops the background probes
+        self._closed = threading.Event()
+
+    # The mirror subscribes through the first controller's session, so it lives on that client
+    @property
+    def mirror(self):
+        return self.controllers[0].client.mirror
+
+    @mirror.setter
+    def mirror(self, value) -> None:
+        self.controllers[0].client.mirror = value
+
+    @property
+    def primary(self) -> APICClient:
+        """Client of the first controller, which owns the websocket mirror"""
+        return self.controllers[0].client
+
+    def reader(self) -> APICClient:
+        """Client of the controller the next read would go to"""
+        return self._read_order()[0].client
+
+    def _read_order(self) -> List[Controller]:
+        with self._health_lock:
+            healthy = [controller for controller in self.controllers if not controller.ejected]
+            # Shuffle first so controllers with equal load (e.g. not yet measured) share the reads
+            random.shuffle(healthy)
+            healthy.sort(key=Controller.load)
+            ejected = sorted((c for c in self.controllers if c.ejected), key=lambda c: c.retry_at)
+        # With every controller ejected, still try them rather than failing outright
+        return healthy + ejected
+
+    def _write_order(self) -> List[Controller]:
+        with self._health_lock:
+            healthy = [controller for controller in self.controllers if not controller.ejected]
+            ejected = [controller for controller in self.controllers if controller.ejected]
+        return healthy + ejected
+
+    def _attempt(self, method: str, full_url: str, **kwargs) -> requests.Response:
+        """Send the request to a controller chosen for the method, failing over to the others"""
+        path = full_url[len(self.base_url):] if full_url.startswith(self.base_url) else full_url
+        kwargs.setdefault("timeout", (self.connect_timeout, self.timeout))
+        read = method == "GET"
+        last_error: Optional[Exception] = None
+        last_response: Optional[requests.Response] = None
+        # First ask each controller for a slot without waiting, so a busy controller passes the request on
+        # instead of holding the thread; only when all of them are busy wait on the first busy one
+        candidates = [(controller, 0.0) for controller in (self._read_order() if read else self._write_order())]
+        waited = False
+        while candidates:
+            controller, admit_timeout = candidates.pop(0)
+            with self._health_lock:
+                controller.in_flight += 1
+            try:
+                response = controller.client._attempt(
+                    method, f"{controller.client.base_url}{path}", admit_timeout=admit_timeout, **kwargs)
+            except AdmissionTimeout as err:
+                # Nothing was sent and our own limits, not the controller, held it back: no ejection
+                last_error = err
+                if not waited:
+                    candidates.append((controller, None))
+                    waited = True
+                continue
+            except CircuitOpenError as err:
+                # Nothing was sent, so even a write can go to the next controller; the breaker already holds this one back
+                last_error = err
+                continue
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as err:
+                self._eject(controller, err)
+                last_error = err
+                # A write that reached the controller may have been applied; only a refused connection is safe to retry
+                if read or isinstance(err, requests.exceptions.ConnectTimeout) or _refused(err):
+                    continue
+                raise
+            finally:
+                with self._health_lock:
+                    controller.in_flight -= 1
+            if read and response.status_code in FAILOVER_STATUSES | {THROTTLED_STATUS}:
+                if response.status_code != THROTTLED_STATUS:
+                    self._eject(controller, requests.exceptions.HTTPError(f"{response.status_code} from {controller.client.base_url}"))
+                if last_response is not None:
+                    last_response.close()
+                last_response = response
+                continue
+            self._observe(controller, response.elapsed.total_seconds())
+            if last_response is not None:
+                last_response.close()
+            return response
+        # Every controller answered with an error: return the last one, so the caller can retry or report it
+        if last_response is not None:
+            return last_response
+        raise last_error or requests.exceptions.ConnectionError("No APIC controller available")
+
+    def _observe(self, controller: Controller, seconds: float) -> None:
+        with self._health_lock:
+            controller.failures = 0
+            if controller.latency is None:
+                controller.latency = seconds
+            else:
+                controller.latency += LATENCY_ALPHA * (seconds - controller.latency)
+
+    @staticmethod
+    def _backoff(controller: Controller) -> float:
+        controller.failures += 1
+        backoff = min(EJECT_MAX_SECONDS, EJECT_SECONDS * 2 ** (controller.failures - 1))
+        controller.retry_at = time.monotonic() + backoff
+        return backoff
+
+    def _eject(self, controller: Controller, error: Exception) -> None:
+        with self._health_lock:
+            if controller.ejected:
+                return
+            controller.ejected = True
+            backoff = self._backoff(controller)
+        tracer.annotate(ejected=controller.client.base_url)
+        logger.warning("APIC controller %s ejected for %gs: %s", controller.client.base_url, backoff, error)
+        if self._closed.is_set():
+            return
+        controller.probe = threading.Thread(target=self._probe, args=(controller,), daemon=True)
+        controller.probe.start()
+
+    def _probe(self, controller: Controller) -> None:
+        """Wait out the backoff, then check the controller until it answers and return it to service"""
+        while not self._closed.wait(max(0.0, controller.retry_at - time.monotonic())):
+            try:
+                response = controller.client.session.get(
+                    f"{controller.client.base_url}{PROBE_PATH}", timeout=(self.connect_timeout, self.connect_timeout))
+                response.close()
+                if response.status_code < 500:
+                    with self._health_lock:
+                        controller.failures = 0
+                        controller.ejected = False
+                    logger.info("APIC controller %s is back in service", controller.client.base_url)
+                    return
+            except requests.exceptions.RequestException:
+                pass
+            with self._health_lock:
+                self._backoff(controller)
+
+    def close(self) -> None:
+        """Stop the background probes and close every controller's connections"""
+        self._closed.set()
+        for controller in self.controllers:
+            controller.client.close()
+        super().close()
+
+    def health(self) -> List[dict]:
+        """State of every controller, for diagnostics"""
+        now = time.monotonic()
+        with self._health_lock:
+            return [{
+                "controller": controller.client.base_url,
+                "healthy": not controller.ejected,
+                "latency_ms": round(controller.latency * 1000, 3) if controller.latency is not None else None,
+                "in_flight": controller.in_flight,
+                "next_probe_s": round(max(0.0, controller.retry_at - now), 1) if controller.ejected else None,
+                "breaker": controller.client.control.breaker.state,
+                "concurrency_limit": round(controller.client.control.limiter.limit, 2),
+            } for controller in self.controllers]
+
+
+def _refused(error: BaseException) -> bool:
+    """True when the connection was never established (nothing was sent)"""
+    # requests wraps urllib3's MaxRetryError, whose reason is the NewConnectionError
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, (NewConnectionError, ConnectionRefusedError)):
+            return True
+        reason = getattr(error, "reason", None)
+        if isinstance(reason, BaseException):
+            error = reason
+        elif error.args and isinstance(error.args[0], BaseException):
+            error = error.args[0]
+        else:
+            error = error.__cause__ or error.__context__
+    return False
+
+
+def parse_fabrics(value: str) -> Dict[str, List[str]]:
+    """Parse "dc1=https://a,https://b;dc2=https://c" into a fabric -> controller URLs mapping"""
+    fabrics = {}
+    for item in filter(None, (part.strip() for part in value.split(";"))):
+        name, _, urls = item.partition("=")
+        fabrics[name.strip()] = [url.strip().rstrip("/") for url in urls.split(",") if url.strip()]
+    return fabrics
+
+
+def create_client(base_urls: List[str]) -> APICClient:
+    """APICClient for one controller, APICCluster for several"""
+    if len(base_urls) > 1:
+        return APICCluster(base_urls)
+    return APICClient(base_url=base_urls[0] if base_urls else None)
+
+
+def clients_from_env() -> Dict[str, APICClient]:
+    """
+    One client per fabric: "default" from APIC_BASE_URLS (comma-separated
+    controllers) or APIC_BASE_URL, then every fabric in APIC_FABRICS. All
+    fabrics use APIC_USERNAME and APIC_PASSWORD.
+    """
+    default = [url.strip().rstrip("/") for url in os.getenv("APIC_BASE_URLS", "").split(",") if url.strip()]
+    fabrics = parse_fabrics(os.getenv("APIC_FABRICS", ""))
+    clients = {}
+    if default or os.getenv("APIC_BASE_URL") or not fabrics:
+        clients["default"] = create_client(default)
+    for name, urls in fabrics.items():
+        clients[name] = create_client(urls)
+    return clients
+
+
+def merge_fabric_results(responses: Dict[str, Optional[dict]]) -> dict:
+    """
+    Merge the responses of one query on several fabrics: the MOs of all of them,
+    each tagged with a "fabric" attribute, and the summed totalCount. Fabrics
+    that failed are listed under failedFabrics, with their errors under
+    fabricErrors.
+    """
+    imdata, total, failed, errors = [], 0, [], {}
+    for fabric, response in responses.items():
+        if response is None or is_error(response):
+            failed.append(fabric)
+            if response is not None:
+                errors[fabric] = response["error"]
+            continue
+        for mo in response.get("imdata", []):
+            imdata.append({
+                class_name: {**body, "attributes": {**body.get("attributes", {}), "fabric": fabric}}
+                for class_name, body in mo.items()
+            })
+        total += int(response.get("totalCount", len(response.get("imdata", []))))
+    merged = {"totalCount": str(total), "imdata": imdata}
+    if failed:
+        merged["failedFabrics"] = failed
+    if errors:
+        merged["fabricErrors"] = errors
+    return merged
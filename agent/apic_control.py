@@ -0,0 +1,353 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+import requests
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional
+
+from agent.tracing import tracer
+
+# Statuses a GET is retried on: throttled, or the controller is briefly unable to answer
+RETRY_STATUSES = {429, 502, 503, 504}
+# Statuses that mean the controller is overloaded and fewer requests should be in flight
+OVERLOAD_STATUSES = {429, 503}
+# Recent latency above this multiple of the usual latency counts as a sign of queueing
+LATENCY_TOLERANCE = 2.0
+# Weights of the newest sample in the recent and the usual moving average latency
+RECENT_ALPHA = 0.3
+USUAL_ALPHA = 0.02
+# Factor the concurrency limit is cut by when the controller is overloaded
+DECREASE_FACTOR = 0.5
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of sending a request while a controller's circuit breaker is open"""
+
+
+class AdmissionTimeout(requests.exceptions.ConnectTimeout):
+    """
+    Raised instead of sending a request when no rate token or concurrency slot
+    freed up in time. The limit is our own, so it says nothing about the
+    controller's health.
+    """
+
+
+class TokenBucket:
+    """Allows rate requests per second on average, with bursts of up to burst requests"""
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        # No request may start before this time, e.g. after a Retry-After from the controller
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def take(self, timeout: float) -> bool:
+        """Wait for a token; False if none would be available within timeout seconds"""
+        if self.rate <= 0 and not self.paused_until:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            if self.rate > 0:
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                # Reserve the token now, so concurrent callers queue behind each other
+                wait = max(0.0, (1 - self.tokens) / self.rate, self.paused_until - now)
+                if wait > timeout:
+                    return False
+                self.tokens -= 1
+            else:
+                wait = max(0.0, self.paused_until - now)
+                if wait > timeout:
+                    return False
+        if wait:
+            time.sleep(wait)
+        return True
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit adjusted by AIMD: every successful request raises it by
+    1/limit (about one per round of requests), a throttled request halves it,
+    and so does a rise of the recent latency (short moving average) above
+    LATENCY_TOLERANCE times the usual latency (long moving average), the sign
+    that requests queue on the controller. Cuts happen at most once per round
+    trip, so a burst of 429s answering the same round counts once.
+    """
+    def __init__(self, initial: float, max_limit: float, min_limit: float = 1.0):
+        self.max_limit = max(min_limit, max_limit)
+        self.min_limit = min_limit
+        self.limit = min(self.max_limit, max(min_limit, initial))
+        self.in_flight = 0
+        self.recent: Optional[float] = None
+        self.usual: Optional[float] = None
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            self.in_flight += 1
+        return True
+
+    def release(self, seconds: Optional[float], overloaded: bool = False) -> None:
+        """Return a slot; seconds is the latency of a successful request, None for any other outcome"""
+        with self._condition:
+            self.in_flight -= 1
+            if seconds is not None:
+                if self.usual is None:
+                    self.recent = self.usual = seconds
+                else:
+                    self.recent += RECENT_ALPHA * (seconds - self.recent)
+                    self.usual += USUAL_ALPHA * (seconds - self.usual)
+                overloaded = self.recent > LATENCY_TOLERANCE * self.usual
+            now = time.monotonic()
+            if overloaded:
+                if now - self._last_decrease >= (self.usual or 0.0):
+                    self.limit = max(self.min_limit, self.limit * DECREASE_FACTOR)
+                    self._last_decrease = now
+            elif seconds is not None:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify()
+
+
+class CircuitBreaker:
+    """
+    Stops sending to a controller after failures consecutive failures. After
+    reset_seconds one trial request is let through (half-open): its success
+    closes the circuit again, its failure keeps it open for another period.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, failures: int, reset_seconds: float):
+        self.threshold = max(1, failures)
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def retry_in(self) -> float:
+        """Seconds until the next trial request is allowed"""
+        with self._lock:
+            return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    def record(self, success: Optional[bool]) -> Optional[str]:
+        """Record a request's outcome (None: neither, e.g. a 4xx); returns the new state when it changed"""
+        with self._lock:
+            trial, self._trial = self._trial, False
+            if success is None:
+                return None
+            before = self.state
+            if success:
+                self.failures = 0
+                self.state = self.CLOSED
+            else:
+                self.failures += 1
+                if trial or self.failures >= self.threshold:
+                    self.state = self.OPEN
+                    self.opened_at = time.monotonic()
+            return self.state if self.state != before else None
+
+
+class RequestControl:
+    """
+    Client-side flow control for one controller: a token bucket caps the request
+    rate, an AdaptiveLimiter caps the requests in flight, and a CircuitBreaker
+    fails calls at once while the controller keeps failing. Reads that are
+    throttled or fail transiently are retried with exponential backoff and full
+    jitter, honouring Retry-After.
+    """
+    def __init__(self, name: str, max_in_flight: int, wait_timeout: float):
+        self.name = name
+        rate = float(os.getenv("APIC_RATE_LIMIT", 0))
+        self.bucket = TokenBucket(rate, float(os.getenv("APIC_RATE_BURST", max(1.0, rate))))
+        self.limiter = AdaptiveLimiter(float(os.getenv("APIC_INITIAL_IN_FLIGHT", max_in_flight)), max_in_flight)
+        self.breaker = CircuitBreaker(int(os.getenv("APIC_BREAKER_FAILURES", 5)),
+                                      float(os.getenv("APIC_BREAKER_RESET", 30)))
+        self.max_retries = int(os.getenv("APIC_MAX_RETRIES", 3))
+        self.retry_base = float(os.getenv("APIC_RETRY_BASE", 0.2))
+        self.retry_max = float(os.getenv("APIC_RETRY_MAX", 5))
+        # How long a request may wait for a rate token or a slot before it fails
+        self.wait_timeout = wait_timeout
+
+    def admit(self, timeout: Optional[float] = None) -> None:
+        """
+        Wait up to timeout seconds (default wait_timeout) until a request may be
+        sent; raises CircuitOpenError or AdmissionTimeout when it may not.
+        """
+        wait = self.wait_timeout if timeout is None else timeout
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit breaker for {self.name} is open, retry in {self.breaker.retry_in():.0f}s")
+        if not self.bucket.take(wait):
+            self.breaker.record(None)
+            raise AdmissionTimeout(f"No request slot for {self.name} within {wait:g}s (rate limit)")
+        if not self.limiter.acquire(wait):
+            self.breaker.record(None)
+            raise AdmissionTimeout(f"No request slot for {self.name} within {wait:g}s (concurrency limit)")
+
+    def complete(self, response: Optional[requests.Response], seconds: float,
+                 error: Optional[BaseException] = None) -> None:
+        """Record the outcome of an admitted request sent with requests"""
+        if response is not None:
+            self.record(seconds, response.status_code, response.headers)
+        else:
+            self.record(
+                seconds, failed=isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)),
+                timed_out=isinstance(error, requests.exceptions.Timeout),
+            )
+
+    def record(self, seconds: float, status: Optional[int] = None, headers: Optional[Mapping[str, str]] = None,
+               failed: bool = False, timed_out: bool = False) -> None:
+        """
+        Record the outcome of an admitted request from any HTTP library: its
+        status and headers, or, without a status, whether it failed to get an
+        answer (failed, timed_out) or was abandoned for another reason.
+        """
+        if status is not None:
+            overloaded = status in OVERLOAD_STATUSES
+            self.limiter.release(seconds if status < 400 else None, overloaded)
+            if status == 429:
+                self.bucket.pause(retry_after(headers) or 0.0)
+            success = False if status >= 500 else (None if status == 429 else True)
+        else:
+            self.limiter.release(None, overloaded=timed_out)
+            success = False if failed else None
+        changed = self.breaker.record(success)
+        if changed:
+            tracer.annotate(breaker=f"{self.name} {changed}")
+            logger.warning("APIC circuit breaker for %s is %s", self.name, changed)
+
+    def retry_delay(self, attempt: int, wait: Optional[float] = None) -> Optional[float]:
+        """
+        Seconds to wait before retry number attempt + 1 of a read, or None to
+        give up. wait is the controller's Retry-After, if it sent one.
+        """
+        if attempt >= self.max_retries:
+            return None
+        delay = random.uniform(0, min(self.retry_max, self.retry_base * 2 ** attempt))
+        if wait is not None:
+            # Retrying before the controller asked would only be throttled again
+            if wait > self.retry_max:
+                return None
+            delay = max(delay, wait)
+        return delay
+
+    def state(self) -> dict:
+        """Current limits, for diagnostics"""
+        return {
+            "controller": self.name,
+            "breaker": self.breaker.state,
+            "in_flight": self.limiter.in_flight,
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "rate_limit": self.bucket.rate or None,
+        }
+
+
+def retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Seconds from a Retry-After header (delay or HTTP date), None without one"""
+    value = (headers or {}).get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def apic_error_text(response: requests.Response) -> str:
+    """The APIC's own error code and text from an error response, or the start of the body"""
+    return error_text(response.status_code, response.content)
+
+
+def error_text(status: int, body: bytes) -> str:
+    try:
+        attributes = json.loads(body)["imdata"][0]["error"]["attributes"]
+        return f"{attributes.get('code')}: {attributes.get('text')}"
+    except (ValueError, KeyError, IndexError, TypeError):
+        return f"HTTP {status}: {body[:500].decode(errors='replace')}"
+
+
+def status_error(status: int, text: str, wait: Optional[float] = None, controller: Optional[str] = None) -> dict:
+    """
+    Structured result for an error response, returned instead of None so the
+    agent can tell a throttled or overloaded controller (retryable, better
+    waited out) from a query the APIC rejected (fix the query).
+    """
+    body = {"status": status, "text": text, "retryable": status in RETRY_STATUSES}
+    if wait is not None:
+        body["retryAfter"] = round(wait, 1)
+    if status == 429:
+        body["hint"] = "The APIC is throttling requests; wait before retrying or ask for less data"
+    elif status in RETRY_STATUSES:
+        body["hint"] = "The APIC could not answer; try again later"
+    elif status == 400:
+        body["hint"] = "The APIC rejected the query; check the URI, class names and filters"
+    if controller:
+        body["controller"] = controller
+    return {"error": body}
+
+
+def unreachable_error(text: str, controller: Optional[str] = None, circuit_open: bool = False,
+                      sent: bool = True) -> dict:
+    """Structured result for a call that got no response; sent is False when it never left the client"""
+    body = {"status": None, "text": text, "retryable": True}
+    if not sent:
+        body["sent"] = False
+    if circuit_open:
+        body["hint"] = "The controller keeps failing and is not being called; do not retry this turn"
+    else:
+        body["hint"] = "The controller could not be reached; try again later"
+    if controller:
+        body["controller"] = controller
+    return {"error": body}
+
+
+def error_result(error: BaseException, controller: Optional[str] = None) -> dict:
+    """Structured result for an exception raised by a call"""
+    response = getattr(error, "response", None)
+    if response is not None:
+        return status_error(response.status_code, apic_error_text(response), retry_after(response.headers), controller)
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        held = isinstance(error, (CircuitOpenError, AdmissionTimeout))
+        return unreachable_error(str(error), controller, isinstance(error, CircuitOpenError), sent=not held)
+    body = {"status": None, "text": str(error), "retryable": False}
+    if controller:
+        body["controller"] = controller
+    return {"error": body}
+
+
+def is_error(result) -> bool:
+    """True for the structured error results above"""
+    return isinstance(result, dict) and "error" in result and "imdata" not in result
@@ -0,0 +1,212 @@
+import os
+import ssl
+import json
+import logging
+import threading
+import websocket
+from urllib.parse import urlsplit
+from typing import Dict, List, Optional, Set
+
+from agent.apic_client import APICClient, normalize_uri
+from agent.mit_store import MITStore
+
+logger = logging.getLogger(__name__)
+
+
+class MITMirror:
+    """
+    Local copy of selected APIC classes kept current through websocket subscriptions.
+
+    The mirror subscribes to each class with subscription=yes, loads the initial
+    objects from the subscription response, then applies the created/modified/deleted
+    events pushed over the APIC websocket. Subscriptions are refreshed well before
+    the APIC times them out, and a dropped websocket is reconnected and re-bootstrapped.
+    While the mirror is in sync, APICClient.get_resource answers covered queries locally.
+    """
+    def __init__(self, client: APICClient, classes: List[str], ws_url: Optional[str] = None,
+                 refresh_interval: Optional[float] = None):
+      self.client = client
+      self.classes = list(classes)
+      self.ws_url = ws_url or os.getenv('APIC_MIRROR_WS_URL')
+      self.refresh_interval = refresh_interval or float(os.getenv('APIC_MIRROR_REFRESH_SECONDS', 30))
+      self.store = MITStore()
+      self.subscriptions: Dict[str, str] = {}
+      # dns of modified objects the mirror did not have, being fetched in full
+      self._pending: Set[str] = set()
+      self.ready = False
+      self._lock = threading.RLock()
+      self._connected = threading.Event()
+      self._stop = threading.Event()
+      self._ws = None
+      self._threads: List[threading.Thread] = []
+
+    @classmethod
+    def from_env(cls, client: APICClient) -> Optional["MITMirror"]:
+      """Start a mirror for the classes listed in APIC_MIRROR_CLASSES, if any"""
+      classes = [name.strip() for name in os.getenv('APIC_MIRROR_CLASSES', '').split(",") if name.strip()]
+      if not classes:
+        return None
+      mirror = cls(client, classes)
+      mirror.start()
+      return mirror
+
+    #------------------------- lifecycle -------------------------
+
+    def start(self) -> None:
+      """Connect the websocket, bootstrap the classes and attach the mirror to the client"""
+      self._threads = [
+        threading.Thread(target=self._run_websocket, name="apic-mirror-ws", daemon=True),
+        threading.Thread(target=self._run_refresh, name="apic-mirror-refresh", daemon=True),
+      ]
+      for thread in self._threads:
+        thread.start()
+      self.client.mirror = self
+
+    def stop(self) -> None:
+      self._stop.set()
+      self.ready = False
+      if self.client.mirror is self:
+        self.client.mirror = None
+      if self._ws is not None:
+        self._ws.close()
+
+    def _socket_url(self) -> str:
+      self.client._ensure_token()
+      token = self.client.session.cookies.get("APIC-cookie")
+      if self.ws_url:
+        return f"{self.ws_url}{token}"
+      parts = urlsplit(self.client.base_url)
+      scheme = "wss" if parts.scheme == "https" else "ws"
+      return f"{scheme}://{parts.netloc}/socket{token}"
+
+    def _run_websocket(self) -> None:
+      """Keep one websocket open, re-subscribing from scratch after every reconnect"""
+      backoff = 1.0
+      while not self._stop.is_set():
+        try:
+          self._ws = websocket.WebSocketApp(
+            self._socket_url(),
+            on_open=self._on_open,
+            on_message=self._on_message,
+            on_close=self._on_close,
+          )
+          self._ws.run_forever(sslopt={"cert_reqs": ssl.CERT_NONE})
+        except Exception as err:
+          logger.warning("Mirror websocket error: %s", err)
+        self.ready = False
+        self._connected.clear()
+        if self._stop.wait(backoff):
+          break
+        backoff = min(backoff * 2, 60.0)
+
+    def _on_open(self, ws) -> None:
+      self._connected.set()
+      threading.Thread(target=self._bootstrap, name="apic-mirror-bootstrap", daemon=True).start()
+
+    def _on_close(self, ws, status_code, message) -> None:
+      self.ready = False
+      self._connected.clear()
+
+    def _bootstrap(self) -> None:
+      """Subscribe to every class and load its current objects"""
+      try:
+        with self._lock:
+          self.store = MITStore()
+          self.subscriptions.clear()
+          self._pending.clear()
+          for name in self.classes:
+            # Hold the lock until the snapshot is applied so earlier events queue behind it
+            response = self.client._request(
+              "GET", f"{self.client.base_url}/api/class/{name}.json?subscription=yes")
+            response.raise_for_status()
+            data = response.json()
+            self.subscriptions[name] = data["subscriptionId"]
+            for mo in data.get("imdata", []):
+              self._apply(mo)
+          self.ready = True
+      except Exception as err:
+        logger.warning("Mirror bootstrap failed: %s", err)
+        if self._ws is not None:
+          self._ws.close()
+
+    def _run_refresh(self) -> None:
+      """Refresh every subscription before the APIC times it out"""
+      while not self._stop.wait(self.refresh_interval):
+        for name, subscription_id in list(self.subscriptions.items()):
+          try:
+            response = self.client._request(
+              "GET", f"{self.client.base_url}/api/subscriptionRefresh.json?id={subscription_id}")
+            response.raise_for_status()
+          except Exception as err:
+            logger.warning("Mirror refresh of %s failed: %s", name, err)
+            self.ready = False
+            if self._ws is not None:
+              self._ws.close()
+            break
+
+    #------------------------- events -------------------------
+
+    def _on_message(self, ws, message: str) -> None:
+      try:
+        event = json.loads(message)
+      except ValueError:
+        return
+      with self._lock:
+        missing = [dn for mo in event.get("imdata", []) for dn in self._apply(mo)]
+      if missing:
+        threading.Thread(target=self._refetch, args=(missing,), name="apic-mirror-refetch", daemon=True).start()
+
+    def _apply(self, mo: dict) -> List[str]:
+      """
+      Apply one object from a snapshot or a created/modified/deleted event.
+      Returns the dns of modified objects the mirror does not have: the event
+      only carries the changed attributes, so they must be fetched in full.
+      """
+      missing = []
+      for name, body in mo.items():
+        attributes = body.get("attributes", {})
+        dn = attributes.get("dn")
+        if not dn:
+          continue
+        status = attributes.pop("status", "")
+        attributes.pop("childAction", None)
+        if status == "deleted":
+          self.store.remove(dn)
+          self._pending.discard(dn)
+        elif status != "modified":
+          self.store.add(name, dict(attributes), dn)
+          self._pending.discard(dn)
+        elif self.store.update(dn, attributes) is None and dn not in self._pending:
+          self._pending.add(dn)
+          missing.append(dn)
+      return missing
+
+    def _refetch(self, dns: List[str]) -> None:
+      """Load the full objects behind modified events for unknown dns, unless deleted or created meanwhile"""
+      for dn in dns:
+        try:
+          response = self.client._request("GET", f"{self.client.base_url}/api/mo/{dn}.json")
+          response.raise_for_status()
+          data = response.json()
+        except Exception as err:
+          logger.warning("Mirror refetch of %s failed: %s", dn, err)
+          # The mirror no longer matches the controller: bootstrap again
+          self.ready = False
+          if self._ws is not None:
+            self._ws.close()
+          return
+        with self._lock:
+          if dn not in self._pending:
+            continue
+          self._pending.discard(dn)
+          for mo in data.get("imdata", []):
+            self._apply(mo)
+
+    #------------------------- queries -------------------------
+
+    def query(self, uri: str) -> Optional[dict]:
+      """Answer a GET from the mirror, or return None when the mirror cannot cover it"""
+      if not self.ready:
+        return None
+      with self._lock:
+        return self.store.query(normalize_uri(uri), covered=set(self.subscriptions))
@@ -0,0 +1,174 @@
+import re
+import json
+from collections import Counter
+from urllib.parse import urlsplit, parse_qsl, urlencode
+from typing import Dict, Iterable, List, Optional, Union
+
+# Last path segment of a class query, e.g. /api/node/class/fvBD.json -> fvBD
+CLASS_QUERY_RE = re.compile(r"/class/(?:.+/)?([A-Za-z0-9]+)\.json$")
+# Values the APIC accepts for rsp-prop-include
+PROP_INCLUDE_VALUES = {"all", "naming-only", "config-only", "config-explicit"}
+# Attributes with at most this many distinct values are summarized as value counts
+CATEGORICAL_LIMIT = 20
+
+
+def quote_value(value) -> str:
+    return '"' + str(value).replace('"', '\\"') + '"'
+
+
+def build_filter(class_name: str, conditions: Dict[str, Union[str, int, List]]) -> str:
+    """
+    Build a query-target-filter from attribute conditions, e.g.
+    {"name": "PROD", "role": ["leaf", "spine"]} ->
+    and(eq(fabricNode.name,"PROD"),or(eq(fabricNode.role,"leaf"),eq(fabricNode.role,"spine")))
+    A value starting with ~ is a wildcard match; keys may carry their own class (fvBD.name).
+    """
+    terms = []
+    for key, value in conditions.items():
+        prop = key if "." in key else f"{class_name}.{key}"
+        values = value if isinstance(value, (list, tuple)) else [value]
+        matches = [
+            f"wcard({prop},{quote_value(item[1:])})" if isinstance(item, str) and item.startswith("~")
+            else f"eq({prop},{quote_value(item)})"
+            for item in values
+        ]
+        terms.append(matches[0] if len(matches) == 1 else f"or({','.join(matches)})")
+    return terms[0] if len(terms) == 1 else f"and({','.join(terms)})"
+
+
+def query_class(url: str) -> Optional[str]:
+    """Class the query returns: the class of a class query, or its target-subtree-class"""
+    parts = urlsplit(url)
+    match = CLASS_QUERY_RE.search(parts.path)
+    if match:
+        return match.group(1)
+    target = dict(parse_qsl(parts.query)).get("target-subtree-class", "")
+    return target.split(",")[0] or None
+
+
+def shape_uri(url: str, filters: Optional[dict] = None, prop_include: Optional[str] = None) -> str:
+    """
+    Add server-side filtering to a query: a query-target-filter built from
+    filters (combined with any filter already in the URL) and rsp-prop-include.
+    """
+    if not filters and not prop_include:
+        return url
+    parts = urlsplit(url)
+    params = dict(parse_qsl(parts.query))
+    if filters:
+        class_name = query_class(url)
+        if class_name is None and not all("." in key for key in filters):
+            raise ValueError("filters need a class query, a target-subtree-class, or Class.attribute keys")
+        expression = build_filter(class_name, filters)
+        existing = params.get("query-target-filter")
+        params["query-target-filter"] = f"and({existing},{expression})" if existing else expression
+    if prop_include:
+        if prop_include not in PROP_INCLUDE_VALUES:
+            raise ValueError(f"rsp-prop-include must be one of {sorted(PROP_INCLUDE_VALUES)}")
+        params["rsp-prop-include"] = prop_include
+    return f"{parts.path}?{urlencode(params, safe=',()')}"
+
+
+def project(response: dict, fields: Iterable[str]) -> dict:
+    """Keep only the listed attributes (and dn) of every MO, children included"""
+    keep = set(fields) | {"dn"}
+
+    def project_mo(mo: dict) -> dict:
+        projected = {}
+        for class_name, body in mo.items():
+            node = {"attributes": {k: v for k, v in body.get("attributes", {}).items() if k in keep}}
+            if body.get("children"):
+                node["children"] = [project_mo(child) for child in body["children"]]
+            projected[class_name] = node
+        return projected
+
+    return {**response, "imdata": [project_mo(mo) for mo in response.get("imdata", [])]}
+
+
+def iter_rows(response: dict):
+    """
+    (class, attributes) of every MO, children included. A child's attributes
+    also carry the DN of the MO it was returned under as parentDn, since
+    rsp-subtree children (e.g. healthInst, faultInst) often have no dn.
+    """
+    def walk(mo: dict, parent_dn: Optional[str]):
+        for class_name, body in mo.items():
+            attributes = body.get("attributes", {})
+            if parent_dn is not None:
+                attributes = {"parentDn": parent_dn, **attributes}
+            yield class_name, attributes
+            dn = attributes.get("dn")
+            if not dn and parent_dn:
+                dn = f"{parent_dn}/{attributes['rn']}" if attributes.get("rn") else parent_dn
+            for child in body.get("children", []):
+                yield from walk(child, dn)
+
+    for mo in response.get("imdata", []):
+        yield from walk(mo, None)
+
+
+def to_table(response: dict) -> dict:
+    """
+    Compact tabular encoding: attribute names once per class instead of once
+    per MO. Children (rsp-subtree, rsp-subtree-include=health,faults) get
+    tables of their own, linked to their parent by parentDn.
+    """
+    tables: Dict[str, dict] = {}
+    for class_name, attributes in iter_rows(response):
+        table = tables.setdefault(class_name, {"columns": [], "rows": []})
+        for name in attributes:
+            if name not in table["columns"]:
+                table["columns"].append(name)
+        table["rows"].append(attributes)
+    for table in tables.values():
+        table["rows"] = [[row.get(name, "") for name in table["columns"]] for row in table["rows"]]
+    return {"totalCount": response.get("totalCount", str(len(response.get("imdata", [])))), "tables": tables}
+
+
+def summarize(response: dict, top_n: int = 10) -> dict:
+    """
+    Summary of a result too large for the context: object counts per class,
+    value counts of categorical attributes, min/max/mean of numeric ones,
+    and the first top_n objects of each class as a table.
+    """
+    by_class: Dict[str, List[dict]] = {}
+    for class_name, attributes in iter_rows(response):
+        by_class.setdefault(class_name, []).append(attributes)
+    classes = {}
+    for class_name, rows in by_class.items():
+        columns = {name for row in rows for name in row}
+        numeric, categorical = {}, {}
+        for name in sorted(columns):
+            values = [row[name] for row in rows if row.get(name) not in (None, "")]
+            numbers = [_number(value) for value in values]
+            if values and all(number is not None for number in numbers) and name not in ("dn", "rn", "name", "id"):
+                numeric[name] = {
+                    "min": min(numbers), "max": max(numbers), "mean": round(sum(numbers) / len(numbers), 3)
+                }
+            else:
+                counts = Counter(values)
+                if 1 < len(counts) <= CATEGORICAL_LIMIT:
+                    categorical[name] = dict(counts.most_common(top_n))
+        classes[class_name] = {
+            "count": len(rows),
+            "numeric": numeric,
+            "value_counts": categorical,
+            "sample": to_table({"imdata": [{class_name: {"attributes": row}} for row in rows[:top_n]]})["tables"][class_name],
+        }
+    return {
+        "totalCount": response.get("totalCount", str(len(response.get("imdata", [])))),
+        "summarized": True,
+        "classes": classes,
+    }
+
+
+def estimate_tokens(value) -> int:
+    """Rough token count of a JSON value (about four characters per token)"""
+    return len(json.dumps(value, separators=(",", ":"), default=str)) // 4
+
+
+def _number(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,279 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import aiohttp
+import requests
+import threading
+from dotenv import load_dotenv, find_dotenv
+from typing import Dict, List, Optional
+
+from agent.apic_client import APICClient, normalize_uri
+from agent.apic_cluster import FAILOVER_STATUSES, THROTTLED_STATUS, APICCluster
+from agent.apic_control import (
+    RETRY_STATUSES, CircuitOpenError, RequestControl, error_result, error_text, is_error, retry_after, status_error,
+    unreachable_error,
+)
+from agent.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# load environment variables
+load_dotenv(find_dotenv(), override=True)
+
+
+class AsyncAPICClient:
+    """Asyncio APIC client that runs many GET requests concurrently over one connection pool"""
+    def __init__(self, max_concurrency: Optional[int] = None, timeout: Optional[float] = None):
+      self.base_url = os.getenv('APIC_BASE_URL')
+      self.username = os.getenv('APIC_USERNAME')
+      self.password = os.getenv('APIC_PASSWORD')
+      self.max_concurrency = max_concurrency or int(os.getenv('APIC_MAX_CONCURRENCY', 8))
+      self.timeout = timeout or float(os.getenv('APIC_TIMEOUT', 30))
+      self.token = None
+      # Optional ResponseCache shared with a sync APICClient
+      self.cache = None
+      # Rate limit, adaptive concurrency limit and circuit breaker; from_client shares the sync client's
+      self.control = RequestControl(self.base_url, self.max_concurrency, self.timeout)
+      self._session = None
+      self._semaphore = None
+      self._auth_lock = None
+
+    @classmethod
+    def from_client(cls, client: APICClient, **kwargs) -> "AsyncAPICClient":
+      """Build an async client that reuses the controller and token of a sync APICClient"""
+      async_client = cls(**kwargs)
+      async_client.cache = client.cache
+      if isinstance(client, APICCluster):
+        # Send the batch to the controller the cluster would pick for a read
+        client = client.reader()
+      async_client.control = client.control
+      async_client.base_url = client.base_url
+      async_client.username = client.username
+      async_client.password = client.password
+      if client.cookie:
+        async_client.token = client.session.cookies.get("APIC-cookie")
+      return async_client
+
+    async def __aenter__(self) -> "AsyncAPICClient":
+      connector = aiohttp.TCPConnector(limit=self.max_concurrency, ssl=False)
+      self._session = aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=self.timeout),
+      )
+      self._semaphore = asyncio.Semaphore(self.max_concurrency)
+      self._auth_lock = asyncio.Lock()
+      return self
+
+    async def __aexit__(self, *exc_info) -> None:
+      await self._session.close()
+      self._session = None
+
+    async def _authenticate(self) -> None:
+      """Obtain and set access token"""
+      auth_url = f"{self.base_url}/api/aaaLogin.json"
+      auth_payload = {
+        "aaaUser": {
+          "attributes": {
+            "name": self.username,
+            "pwd": self.password
+          }
+        }
+      }
+      async with self._session.post(auth_url, json=auth_payload) as response:
+        response.raise_for_status()
+        data = await response.json()
+      self.token = data["imdata"][0]["aaaLogin"]["attributes"]["token"]
+
+    async def _ensure_token(self, stale_token: Optional[str] = None) -> None:
+      """Log in once for all concurrent callers, or again if stale_token was rejected"""
+      async with self._auth_lock:
+        if not self.token or self.token == stale_token:
+          await self._authenticate()
+
+    async def get_resource(self, url: str) -> dict:
+      """
+      Make API call to APIC.
+
+      Requests pass the same rate controls as the sync client's (shared with it
+      when built with from_client), and throttled or failed reads are retried
+      with the same backoff. Errors are returned as structured error results.
+      """
+      url = normalize_uri(url)
+      use_cache = self.cache is not None and self.cache.cacheable(url)
+      if use_cache:
+        cached = self.cache.get(url)
+        if cached is not None:
+          return cached
+      full_url = f"{self.base_url}{url}"
+      try:
+        async with self._semaphore:
+          await self._ensure_token()
+          path, _, query = url.partition("?")
+          with tracer.span("apic.http", method="GET", path=path, query=query or None, client="async") as span:
+            retries = 0
+            while True:
+              try:
+                status, headers, body = await self._attempt(full_url)
+              except CircuitOpenError:
+                raise
+              except (aiohttp.ClientConnectionError, asyncio.TimeoutError,
+                      requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                delay = self.control.retry_delay(retries)
+                if delay is None:
+                  raise
+              else:
+                span.set(status=status)
+                if status not in RETRY_STATUSES:
+                  break
+                delay = self.control.retry_delay(retries, retry_after(headers))
+                if delay is None:
+                  break
+              # Throttled or briefly unavailable: back off as the sync client would
+              retries += 1
+              span.set(retries=retries)
+              await asyncio.sleep(delay)
+            span.set(bytes=len(body))
+          if status >= 400:
+            logger.warning("HTTP error %s for url: %s", status, full_url)
+            return status_error(status, error_text(status, body), retry_after(headers), self.base_url)
+          data = json.loads(body)
+          if use_cache:
+            self.cache.put(url, body)
+          return data
+      except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as err:
+        logger.warning("GET %s failed: %s", full_url, err)
+        return unreachable_error(str(err) or type(err).__name__, self.base_url)
+      except Exception as err:
+        logger.exception("GET %s failed", full_url)
+        return error_result(err, self.base_url)
+
+    async def _attempt(self, full_url: str):
+      """One GET within the rate controls, logging in again once on 401/403: (status, headers, body)"""
+      await self._admit()
+      started = time.monotonic()
+      status = headers = None
+      failed = timed_out = False
+      try:
+        token = self.token
+        async with self._session.get(full_url, headers={"Cookie": f"APIC-cookie={token}"}) as response:
+          if response.status not in (401, 403):
+            status, headers = response.status, response.headers
+            return status, headers, await response.read()
+        await self._ensure_token(stale_token=token)
+        async with self._session.get(full_url, headers={"Cookie": f"APIC-cookie={self.token}"}) as response:
+          status, headers = response.status, response.headers
+          return status, headers, await response.read()
+      except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as err:
+        failed, timed_out = True, isinstance(err, asyncio.TimeoutError)
+        raise
+      finally:
+        self.control.record(time.monotonic() - started, status, headers, failed, timed_out)
+
+    async def _admit(self) -> None:
+      """control.admit() may wait for a token or a slot, so it runs off the event loop"""
+      admitted = asyncio.ensure_future(asyncio.to_thread(self.control.admit))
+      try:
+        await asyncio.shield(admitted)
+      except asyncio.CancelledError:
+        # The slot may still be granted after the caller gave up; hand it straight back
+        admitted.add_done_callback(
+          lambda done: done.cancelled() or done.exception() or self.control.record(0.0))
+        raise
+
+    async def get_many(self, uris: List[str]) -> Dict[str, dict]:
+      """Fetch every URI concurrently, at most max_concurrency in flight, keyed by URI"""
+      unique_uris = list(dict.fromkeys(uris))
+      results = await asyncio.gather(*(self.get_resource(uri) for uri in unique_uris))
+      return dict(zip(unique_uris, results))
+
+
+class AsyncBatchRunner:
+    """
+    Runs get_many batches for a sync APICClient on one background event loop.
+
+    The loop and its AsyncAPICClient (session, connection pool, token) live as
+    long as the runner, so every batch reuses warm connections, and callers
+    need no event loop of their own: get_many works from plain threads and
+    from threads that already run a loop. For an APICCluster the runner keeps
+    one AsyncAPICClient per controller and spreads each batch over the
+    healthy controllers; a read that fails on one (429, 502/503/504 or no
+    answer) is tried on the next, and a failed controller is ejected as for
+    sync reads.
+    """
+    def __init__(self, client: APICClient, timeout: Optional[float] = None):
+      self.client = client
+      self.timeout = timeout or float(os.getenv('APIC_BATCH_TIMEOUT', 300))
+      self._loop = asyncio.new_event_loop()
+      self._thread = threading.Thread(target=self._loop.run_forever, name="apic-batch", daemon=True)
+      self._thread.start()
+      # One async client per controller, by base URL, created on first use
+      self._async_clients: Dict[str, AsyncAPICClient] = {}
+
+    def get_many(self, uris: List[str]) -> Dict[str, dict]:
+      """Fetch every URI concurrently on the runner's loop, keyed by URI"""
+      return asyncio.run_coroutine_threadsafe(self._get_many(uris), self._loop).result(self.timeout)
+
+    async def _get_many(self, uris: List[str]) -> Dict[str, dict]:
+      if not isinstance(self.client, APICCluster):
+        return await (await self._async_client(self.client)).get_many(uris)
+      unique_uris = list(dict.fromkeys(uris))
+      order = self.client._read_order()
+      healthy = [controller for controller in order if not controller.ejected] or order
+      ejected = [controller for controller in order if controller not in healthy]
+      # Deal the URIs out round-robin, each with the rest of the cluster to fail over to
+      results = await asyncio.gather(*(
+        self._read(uri, healthy[index % len(healthy):] + healthy[:index % len(healthy)] + ejected)
+        for index, uri in enumerate(unique_uris)
+      ))
+      return dict(zip(unique_uris, results))
+
+    async def _read(self, uri: str, controllers: list) -> dict:
+      """Read uri from the first controller that answers it, as APICCluster does for a sync read"""
+      result = None
+      for controller in controllers:
+        async_client = await self._async_client(controller.client)
+        with self.client._health_lock:
+          controller.in_flight += 1
+        started = time.monotonic()
+        try:
+          result = await async_client.get_resource(uri)
+        finally:
+          with self.client._health_lock:
+            controller.in_flight -= 1
+        if not is_error(result):
+          self.client._observe(controller, time.monotonic() - started)
+          return result
+        error = result["error"]
+        status = error["status"]
+        if error.get("sent") is False:
+          # Held back by the breaker or our own rate limits: try the next controller without ejecting this one
+          continue
+        if status in FAILOVER_STATUSES or (status is None and error["retryable"]):
+          self.client._eject(controller, requests.exceptions.ConnectionError(error["text"]))
+        elif status != THROTTLED_STATUS:
+          return result
+      return result
+
+    async def _async_client(self, client: APICClient) -> AsyncAPICClient:
+      async_client = self._async_clients.get(client.base_url)
+      if async_client is None:
+        async_client = await AsyncAPICClient.from_client(client).__aenter__()
+        # Every controller's reads share the cluster's response cache
+        async_client.cache = self.client.cache
+        self._async_clients[client.base_url] = async_client
+      return async_client
+
+    def close(self) -> None:
+      async def shutdown():
+        while self._async_clients:
+          await self._async_clients.popitem()[1].__aexit__(None, None, None)
+
+      if self._loop.is_closed():
+        return
+      asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(self.timeout)
+      self._loop.call_soon_threadsafe(self._loop.stop)
+      self._thread.join()
+      self._loop.close()
+
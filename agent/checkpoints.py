@@ -0,0 +1,200 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Optional
+
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+# Idle threads are looked for at most this often, in seconds
+SWEEP_INTERVAL = 60.0
+
+
+class ThreadLimits:
+    """
+    Bookkeeping shared by the bounded checkpointers: every keep checkpoints a
+    thread is compacted back to its latest keep, and at most every
+    SWEEP_INTERVAL seconds threads idle for longer than ttl are deleted, as are
+    the least recently used ones beyond max_threads.
+    """
+    def _init_limits(self, max_threads: Optional[int], ttl: Optional[float], keep: Optional[int]) -> None:
+        self.max_threads = max_threads or int(os.getenv("CHECKPOINT_MAX_THREADS", 200))
+        self.ttl = ttl or float(os.getenv("CHECKPOINT_TTL_SECONDS", 8 * 3600))
+        self.keep = keep or int(os.getenv("CHECKPOINT_KEEP", 10))
+        self._puts = defaultdict(int)
+        self._next_sweep = time.monotonic() + SWEEP_INTERVAL
+        self._limits_lock = threading.Lock()
+
+    def _after_put(self, thread_id: str) -> None:
+        with self._limits_lock:
+            self._puts[thread_id] += 1
+            compact = self._puts[thread_id] % self.keep == 0
+            sweep = time.monotonic() >= self._next_sweep
+            if sweep:
+                self._next_sweep = time.monotonic() + SWEEP_INTERVAL
+        if compact:
+            self.compact(thread_id)
+        if sweep:
+            self.evict_idle()
+
+    def _forget(self, thread_id: str) -> None:
+        with self._limits_lock:
+            self._puts.pop(thread_id, None)
+
+
+class BoundedMemorySaver(ThreadLimits, MemorySaver):
+    """
+    MemorySaver that keeps only the latest checkpoints of each thread and drops
+    idle or least recently used threads, so memory stays flat however many
+    sessions come and go. Every checkpoint of a react agent holds the whole
+    message list, so without compaction a thread grows quadratically.
+    """
+    def __init__(self, max_threads: Optional[int] = None, ttl: Optional[float] = None,
+                 keep: Optional[int] = None, **kwargs):
+        super().__init__(**kwargs)
+        self._init_limits(max_threads, ttl, keep)
+        # thread_id -> time of its last checkpoint, least recently used first
+        self._last_seen: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            result = super().put(config, checkpoint, metadata, new_versions)
+            self._last_seen[thread_id] = time.time()
+            self._last_seen.move_to_end(thread_id)
+            while len(self._last_seen) > self.max_threads:
+                self.delete_thread(next(iter(self._last_seen)))
+        self._after_put(thread_id)
+        return result
+
+    def put_writes(self, *args, **kwargs):
+        with self._lock:
+            return super().put_writes(*args, **kwargs)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            super().delete_thread(thread_id)
+            self._last_seen.pop(thread_id, None)
+        self._forget(thread_id)
+
+    def compact(self, thread_id: str) -> None:
+        """Drop all but the latest keep checkpoints of a thread, with their writes and unreferenced blobs"""
+        with self._lock:
+            for checkpoint_ns, checkpoints in self.storage.get(thread_id, {}).items():
+                if len(checkpoints) <= self.keep:
+                    continue
+                # Checkpoint ids are time-ordered (uuid6), so the oldest sort first
+                for checkpoint_id in sorted(checkpoints)[:-self.keep]:
+                    del checkpoints[checkpoint_id]
+                    self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+                live = set()
+                for saved, _, _ in checkpoints.values():
+                    versions = self.serde.loads_typed(saved)["channel_versions"]
+                    live.update((thread_id, checkpoint_ns, channel, version) for channel, version in versions.items())
+                for key in [key for key in self.blobs if key[:2] == (thread_id, checkpoint_ns) and key not in live]:
+                    del self.blobs[key]
+
+    def evict_idle(self) -> None:
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            idle = [thread_id for thread_id, seen in self._last_seen.items() if seen < cutoff]
+            for thread_id in idle:
+                self.delete_thread(thread_id)
+
+
+class BoundedSqliteSaver(ThreadLimits, SqliteSaver):
+    """
+    SqliteSaver with the same limits as BoundedMemorySaver. Conversations
+    survive restarts; the last use of each thread is kept in a thread_access
+    table, and freed pages are returned to the file system after each sweep.
+    """
+    def __init__(self, conn: sqlite3.Connection, max_threads: Optional[int] = None,
+                 ttl: Optional[float] = None, keep: Optional[int] = None, **kwargs):
+        super().__init__(conn, **kwargs)
+        self._init_limits(max_threads, ttl, keep)
+
+    @classmethod
+    def from_path(cls, path: str, **kwargs) -> "BoundedSqliteSaver":
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Streamlit serves every session from its own thread; the saver's lock serializes access
+        return cls(sqlite3.connect(path, check_same_thread=False), **kwargs)
+
+    def setup(self) -> None:
+        # Called by cursor() with self.lock held
+        if self.is_setup:
+            return
+        # Only takes effect on a new database, before any table exists
+        self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        super().setup()
+        self.conn.execute("CREATE TABLE IF NOT EXISTS thread_access (thread_id TEXT PRIMARY KEY, last_seen REAL NOT NULL)")
+        self.conn.commit()
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        result = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = config["configurable"]["thread_id"]
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT INTO thread_access (thread_id, last_seen) VALUES (?, ?) "
+                "ON CONFLICT(thread_id) DO UPDATE SET last_seen = excluded.last_seen",
+                (thread_id, time.time()),
+            )
+        self._after_put(thread_id)
+        return result
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self.cursor() as cur:
+            for table in ("checkpoints", "writes", "thread_access"):
+                cur.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+        self._forget(thread_id)
+
+    def compact(self, thread_id: str) -> None:
+        """Drop all but the latest keep checkpoints of a thread, with their writes"""
+        with self.cursor() as cur:
+            namespaces = [row[0] for row in cur.execute(
+                "SELECT DISTINCT checkpoint_ns FROM checkpoints WHERE thread_id = ?", (thread_id,)
+            ).fetchall()]
+            for checkpoint_ns in namespaces:
+                cur.execute(
+                    "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN ("
+                    "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT ?)",
+                    (thread_id, checkpoint_ns, thread_id, checkpoint_ns, self.keep),
+                )
+                cur.execute(
+                    "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN ("
+                    "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?)",
+                    (thread_id, checkpoint_ns, thread_id, checkpoint_ns),
+                )
+
+    def evict_idle(self) -> None:
+        with self.cursor() as cur:
+            idle = [row[0] for row in cur.execute(
+                "SELECT thread_id FROM thread_access WHERE last_seen < ?", (time.time() - self.ttl,)
+            ).fetchall()]
+            idle += [row[0] for row in cur.execute(
+                "SELECT thread_id FROM thread_access WHERE last_seen >= ? ORDER BY last_seen DESC LIMIT -1 OFFSET ?",
+                (time.time() - self.ttl, self.max_threads),
+            ).fetchall()]
+        for thread_id in idle:
+            self.delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("PRAGMA incremental_vacuum")
+
+
+def create_checkpointer(backend: Optional[str] = None):
+    """
+    Checkpointer selected by CHECKPOINT_BACKEND: memory (default) keeps
+    conversations in process, sqlite persists them to CHECKPOINT_PATH.
+    Both are bounded by CHECKPOINT_MAX_THREADS, CHECKPOINT_TTL_SECONDS and
+    CHECKPOINT_KEEP.
+    """
+    backend = backend or os.getenv("CHECKPOINT_BACKEND", "memory")
+    if backend == "memory":
+        return BoundedMemorySaver()
+    if backend == "sqlite":
+        return BoundedSqliteSaver.from_path(os.getenv("CHECKPOINT_PATH", "agent/content/checkpoints.sqlite"))
+    raise ValueError(f"Unknown CHECKPOINT_BACKEND {backend!r}, expected memory or sqlite")
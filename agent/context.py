@@ -0,0 +1,129 @@
+import os
+import json
+from typing import Callable, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+from agent.registry import get_result_store
+from agent.tracing import tracer
+
+# Estimated tokens of earlier turns sent with each model call (the system prompt and the current turn come on top)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 12000))
+# Tool results of earlier turns above this many estimated tokens are replaced by a stub with a handle
+CONTEXT_TOOL_RESULT_TOKENS = int(os.getenv("CONTEXT_TOOL_RESULT_TOKENS", 200))
+# Earlier questions listed in the note that stands in for dropped turns
+DROPPED_QUESTIONS_LISTED = 10
+
+
+def message_tokens(message: BaseMessage) -> int:
+    """Rough token count of a message (about four characters per token, plus framing)"""
+    tool_calls = getattr(message, "tool_calls", None)
+    return (len(str(message.content)) + (len(json.dumps(tool_calls, default=str)) if tool_calls else 0)) // 4 + 4
+
+
+def split_turns(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+    """Group messages into turns, each starting at a user message"""
+    turns: List[List[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def evict_tool_result(message: ToolMessage) -> ToolMessage:
+    """
+    Stub for a large tool result: its handle (the full data stays loadable with
+    load(handle) in python_repl), the total count and the objects per class.
+    Results without a handle are stored first so they get one.
+    """
+    try:
+        data = json.loads(message.content) if isinstance(message.content, str) else message.content
+    except ValueError:
+        data = message.content
+    if isinstance(data, dict) and "handle" in data:
+        stub = {"handle": data["handle"], "totalCount": data.get("totalCount")}
+        if "tables" in data:
+            stub["objects"] = {name: len(table.get("rows", [])) for name, table in data["tables"].items()}
+        elif "classes" in data:
+            stub["objects"] = {name: body.get("count") for name, body in data["classes"].items()}
+    else:
+        stub = {"handle": get_result_store().put(data), "preview": str(message.content)[:200]}
+    stub["evicted"] = "removed from the conversation to save context; load(handle) in python_repl returns the full result"
+    return ToolMessage(
+        content=json.dumps(stub), id=message.id, tool_call_id=message.tool_call_id, name=message.name,
+        status=message.status, additional_kwargs={**message.additional_kwargs, "evicted": True},
+    )
+
+
+def dropped_turns_note(turns: List[List[BaseMessage]]) -> Optional[str]:
+    """The user's most recent dropped questions, each with the start of the answer it got"""
+    entries = []
+    for turn in turns:
+        if not isinstance(turn[0], HumanMessage):
+            continue
+        entry = f"- {str(turn[0].content)[:200]}"
+        answers = [m for m in turn if isinstance(m, AIMessage) and not m.tool_calls and m.content]
+        if answers:
+            entry += f"\n  Answer: {str(answers[-1].content)[:200]}"
+        entries.append(entry)
+    if not entries:
+        return None
+    listed = "\n".join(entries[-DROPPED_QUESTIONS_LISTED:])
+    return (
+        f"{len(turns)} earlier turns of this conversation were dropped to save context. "
+        f"The user's most recent earlier questions were:\n{listed}"
+    )
+
+
+def manage_context(state: dict, system_prompt: Optional[str] = None) -> dict:
+    """
+    pre_model_hook for create_react_agent, run before every model call.
+
+    Large tool results of finished turns are replaced in the stored state by
+    stubs that keep their handles, so the checkpointed conversation stops
+    growing with raw APIC JSON. The model then sees system_prompt, as many
+    finished turns as fit CONTEXT_TOKEN_BUDGET (newest first) and the current
+    turn in full. Only finished turns decide the window, so it stays the same
+    for every call of a turn and the system prompt and earlier turns form a
+    stable prefix the provider can cache; it moves at the next question. A
+    note listing the dropped questions is appended to the system prompt, so
+    the model gets a single system message.
+    """
+    with tracer.span("agent.context") as span:
+        turns = split_turns(state["messages"])
+        evicted = []
+        for turn in turns[:-1]:
+            for index, message in enumerate(turn):
+                if (isinstance(message, ToolMessage) and not message.additional_kwargs.get("evicted")
+                        and message_tokens(message) > CONTEXT_TOOL_RESULT_TOKENS):
+                    turn[index] = evict_tool_result(message)
+                    evicted.append(turn[index])
+
+        budget = CONTEXT_TOKEN_BUDGET
+        first_kept = len(turns) - 1
+        while first_kept > 0:
+            cost = sum(message_tokens(message) for message in turns[first_kept - 1])
+            if cost > budget:
+                break
+            budget -= cost
+            first_kept -= 1
+        messages = [message for turn in turns[first_kept:] for message in turn]
+        note = dropped_turns_note(turns[:max(first_kept, 0)])
+        system = "\n\n".join(filter(None, [system_prompt, note]))
+        if system:
+            messages.insert(0, SystemMessage(content=system))
+
+        span.set(
+            messages=len(messages), tokens=sum(message_tokens(message) for message in messages),
+            evicted=len(evicted), dropped_turns=max(first_kept, 0),
+        )
+    # Stubs replace the stored messages with the same id; the trimmed list only goes to the model
+    return {"messages": evicted, "llm_input_messages": messages}
+
+
+def context_hook(system_prompt: str) -> Callable[[dict], dict]:
+    """pre_model_hook that sends system_prompt, with the note on dropped turns, ahead of the managed history"""
+    def hook(state: dict) -> dict:
+        return manage_context(state, system_prompt)
+    return hook
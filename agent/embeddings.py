@@ -0,0 +1,77 @@
+import re
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from agent.tracing import tracer
+
+
+def normalize_query(text: str) -> str:
+    """Normalize query text so trivially different phrasings share one embedding"""
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    return text.rstrip("?.! ")
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Embedding wrapper that memoizes embed_query (thread-safe LRU).
+
+    The normalized query text is only the cache key: the model always embeds
+    the text as asked, so casing and punctuation still reach it.
+    """
+    def __init__(self, embeddings: Embeddings, max_entries: int = 1024):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with tracer.span("embedding.documents", texts=len(texts)):
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                tracer.annotate(embedding_cache="hit")
+                return vector
+            self.misses += 1
+        # Embed outside the lock so concurrent misses do not serialize on the network call
+        with tracer.span("embedding.query", chars=len(text)):
+            vector = self.embeddings.embed_query(text)
+        with self._lock:
+            self._cache[key] = vector
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return vector
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic offline embeddings from hashed word and character trigram features, for tests and air-gapped labs"""
+    def __init__(self, dim: int = 768):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            features = [word] + [word[i:i + 3] for i in range(max(1, len(word) - 2))]
+            for feature in features:
+                digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+                vector[digest % self.dim] += 1.0 if digest >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
@@ -0,0 +1,141 @@
+import os
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Optional
+
+from langchain_core.documents import Document
+
+# Pinecone only accepts flat metadata values
+METADATA_TYPES = (str, int, float, bool)
+
+
+def chunk_id(doc: Document) -> str:
+    """Content hash of a chunk; identical text always maps to the same vector id"""
+    return hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()[:32]
+
+
+def clean_metadata(metadata: dict) -> dict:
+    """Keep only the metadata values every vector store backend can hold"""
+    cleaned = {}
+    for key, value in metadata.items():
+        if isinstance(value, METADATA_TYPES):
+            cleaned[key] = value
+        elif isinstance(value, list) and all(isinstance(item, str) for item in value):
+            cleaned[key] = value
+    return cleaned
+
+
+class IngestionPipeline:
+    """
+    Incremental, resumable ingestion of document chunks into a vector store.
+
+    Every chunk is identified by a hash of its content. A manifest file records
+    which ids are already in the index, so unchanged chunks are skipped and an
+    interrupted run resumes where it stopped: the manifest is checkpointed after
+    every batch that lands in the store. New chunks are embedded and upserted in
+    batches on a bounded thread pool. After the run, ids that belonged to the
+    ingested sources but no longer appear in them are deleted from the index.
+    """
+    def __init__(self, vector_store, manifest_path: str, batch_size: Optional[int] = None,
+                 max_workers: Optional[int] = None):
+        self.vector_store = vector_store
+        self.manifest_path = manifest_path
+        self.batch_size = batch_size or int(os.getenv("INGEST_BATCH_SIZE", 64))
+        self.max_workers = max_workers or int(os.getenv("INGEST_MAX_WORKERS", 4))
+        # id -> source of every chunk known to be in the index
+        self.manifest: Dict[str, str] = self._load_manifest()
+        self._lock = threading.Lock()
+
+    def _load_manifest(self) -> Dict[str, str]:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as manifest_file:
+            return json.load(manifest_file)["chunks"]
+
+    def _save_manifest(self) -> None:
+        """Checkpoint atomically so a crash never corrupts the manifest"""
+        directory = os.path.dirname(self.manifest_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.manifest_path}.tmp"
+        with open(temporary, "w") as manifest_file:
+            json.dump({"chunks": self.manifest}, manifest_file)
+        os.replace(temporary, self.manifest_path)
+
+    def _upsert(self, batch: List[tuple]) -> List[str]:
+        ids = [doc_id for doc_id, _ in batch]
+        self.vector_store.add_texts(
+            texts=[doc.page_content for _, doc in batch],
+            metadatas=[clean_metadata(doc.metadata) for _, doc in batch],
+            ids=ids,
+        )
+        return ids
+
+    def run(self, docs: Iterable[Document]) -> dict:
+        """Bring the index in line with docs; returns counts of what changed"""
+        seen: Dict[str, str] = {}
+        batch: List[tuple] = []
+        stats = {"chunks": 0, "skipped": 0, "added": 0, "deleted": 0, "failed": 0}
+
+        def on_done(future):
+            try:
+                ids = future.result()
+            except Exception as err:
+                print(f"Ingestion batch failed: {err}")
+                stats["failed"] += 1
+                return
+            with self._lock:
+                for doc_id in ids:
+                    self.manifest[doc_id] = seen[doc_id]
+                stats["added"] += len(ids)
+                self._save_manifest()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = []
+            for doc in docs:
+                doc_id = chunk_id(doc)
+                if doc_id in seen:
+                    continue
+                source = str(doc.metadata.get("source", ""))
+                seen[doc_id] = source
+                stats["chunks"] += 1
+                if doc_id in self.manifest:
+                    stats["skipped"] += 1
+                    self.manifest[doc_id] = source
+                    continue
+                batch.append((doc_id, doc))
+                if len(batch) >= self.batch_size:
+                    futures.append(executor.submit(self._upsert, batch))
+                    batch = []
+                # Keep at most a few batches queued so a streamed input is never fully buffered
+                while sum(not future.done() for future in futures) > 2 * self.max_workers:
+                    next(as_completed(futures))
+                    futures = self._drain(futures, on_done)
+            if batch:
+                futures.append(executor.submit(self._upsert, batch))
+            for future in as_completed(futures):
+                on_done(future)
+
+        # Only chunks of the sources ingested in this run can be stale
+        sources = set(seen.values())
+        stale = [doc_id for doc_id, source in self.manifest.items() if source in sources and doc_id not in seen]
+        if stale and not stats["failed"]:
+            self.vector_store.delete(ids=stale)
+            for doc_id in stale:
+                del self.manifest[doc_id]
+            stats["deleted"] = len(stale)
+        self._save_manifest()
+        return stats
+
+    @staticmethod
+    def _drain(futures: list, on_done) -> list:
+        """Record finished batches and return the ones still running"""
+        pending = []
+        for future in futures:
+            if future.done():
+                on_done(future)
+            else:
+                pending.append(future)
+        return pending
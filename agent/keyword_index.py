@@ -0,0 +1,158 @@
+import os
+import re
+import json
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+# URL-ish runs stay together first (fvRsCons, target-subtree-class, tn-PROD, 10.0.0.1)
+RAW_TOKEN_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.\-]*")
+CAMEL_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can for from get how i in is it of on or show the this to use using what when "
+    "which with you your json api".split()
+)
+
+
+def apic_tokens(text: str) -> List[str]:
+    """
+    Tokenize text for keyword search over APIC documentation.
+
+    Every whole token is kept lowercased, so exact names such as fvRsCons or
+    rsp-subtree-include match exactly, and it is also broken into its dotted
+    or hyphenated pieces and their camelCase parts (fvrscons, fv, rs, cons;
+    rsp, subtree, include) so a query that only names part of a class or
+    parameter still matches.
+    """
+    tokens = []
+    for raw in RAW_TOKEN_RE.findall(text):
+        raw = raw.rstrip(".-")
+        whole = raw.lower()
+        if whole in STOPWORDS or len(whole) < 2:
+            continue
+        tokens.append(whole)
+        pieces = re.split(r"[_.\-]", raw)
+        for piece in pieces:
+            parts = CAMEL_RE.findall(piece)
+            extra = ([piece] if len(pieces) > 1 else []) + (parts if len(parts) > 1 else [])
+            tokens.extend(part.lower() for part in extra if len(part) > 1 and part.lower() not in STOPWORDS)
+    return tokens
+
+
+class BM25Index:
+    """
+    Precomputed BM25 inverted index over document chunks.
+
+    The index keeps postings (term -> [[doc, term frequency], ...]), document
+    lengths and texts, and is saved as one JSON file, so building happens at
+    ingestion time and a search only scores the documents that share a term
+    with the query. Documents can be added one at a time as they stream in;
+    finish() then computes the statistics search needs.
+    """
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents: List[Document] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, List[List[int]]] = {}
+        self.idf: Dict[str, float] = {}
+        self.average_length = 0.0
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Document], **kwargs) -> "BM25Index":
+        index = cls(**kwargs)
+        for doc in documents:
+            index.add(doc)
+        index.finish()
+        return index
+
+    def add(self, doc: Document) -> None:
+        """Index one document; call finish() once all are added"""
+        row = len(self.documents)
+        counts = Counter(apic_tokens(doc.page_content))
+        self.documents.append(doc)
+        self.lengths.append(sum(counts.values()))
+        for term, frequency in counts.items():
+            self.postings.setdefault(term, []).append([row, frequency])
+
+    def finish(self) -> None:
+        """Compute the average length and term IDFs from the documents added so far"""
+        total = len(self.documents)
+        self.average_length = sum(self.lengths) / total if total else 0.0
+        self.idf = {
+            term: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[Document, float]]:
+        """Top k documents by BM25 score, best first"""
+        scores: Dict[int, float] = {}
+        for term in set(apic_tokens(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for row, frequency in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[row] / self.average_length)
+                scores[row] = scores.get(row, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        best = sorted(scores.items(), key=lambda item: -item[1])[:k]
+        return [(self.documents[row], score) for row, score in best]
+
+    def save(self, path: str) -> None:
+        """Write atomically so a crash never leaves a truncated index"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {
+            "k1": self.k1,
+            "b": self.b,
+            "documents": [{"text": doc.page_content, "metadata": doc.metadata} for doc in self.documents],
+            "lengths": self.lengths,
+            "postings": self.postings,
+        }
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as index_file:
+            json.dump(data, index_file, default=str)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(path) as index_file:
+            data = json.load(index_file)
+        index = cls(k1=data["k1"], b=data["b"])
+        index.documents = [Document(page_content=doc["text"], metadata=doc["metadata"]) for doc in data["documents"]]
+        index.lengths = data["lengths"]
+        index.postings = data["postings"]
+        index.finish()
+        return index
+
+
+def line_documents(path: str) -> List[Document]:
+    """One document per non-empty line, so each example URL can be retrieved on its own"""
+    with open(path) as text_file:
+        return [
+            Document(page_content=line.strip(), metadata={"source": path, "line": number})
+            for number, line in enumerate(text_file, start=1) if line.strip()
+        ]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Document]], k: int = 60,
+                           limit: Optional[int] = None) -> List[Document]:
+    """
+    Merge ranked lists with reciprocal rank fusion: each document scores
+    sum(1 / (k + rank)) over the lists it appears in. Documents are identified
+    by their text, so a chunk found by both retrievers is counted once.
+    """
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc.page_content
+            documents.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    fused = sorted(scores, key=lambda key: -scores[key])
+    return [documents[key] for key in fused[:limit]]
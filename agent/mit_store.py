@@ -0,0 +1,391 @@
+import os
+import re
+import json
+from urllib.parse import urlsplit, parse_qsl
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+# /api/node/mo/uni/tn-X.json -> uni/tn-X
+MO_PATH_RE = re.compile(r"^/api/(?:node/)?mo/(.+)\.json$")
+# /api/node/class/topology/pod-1/l1PhysIf.json -> (topology/pod-1, l1PhysIf)
+CLASS_PATH_RE = re.compile(r"^/api/(?:node/)?class/(?:(.+)/)?([A-Za-z0-9]+)\.json$")
+
+# Query parameters the local evaluator understands; anything else falls back to the APIC
+SUPPORTED_PARAMS = {
+  "query-target", "target-subtree-class", "query-target-filter",
+  "rsp-subtree", "rsp-subtree-class", "rsp-subtree-include",
+  "order-by", "page", "page-size",
+}
+# Only these rsp-subtree-include options can be answered without the APIC
+SUPPORTED_INCLUDES = {"count", "required", "no-scoped"}
+
+
+def split_dn(dn: str) -> List[str]:
+    """Split a DN into RNs, keeping bracketed names such as phys-[eth1/1] intact"""
+    rns, depth, start = [], 0, 0
+    for index, char in enumerate(dn):
+      if char == "[":
+        depth += 1
+      elif char == "]":
+        depth -= 1
+      elif char == "/" and depth == 0:
+        rns.append(dn[start:index])
+        start = index + 1
+    rns.append(dn[start:])
+    return [rn for rn in rns if rn]
+
+
+class ManagedObject:
+    """One node of the DN tree; class_name is None for placeholders of objects not loaded"""
+    __slots__ = ("class_name", "dn", "attributes", "parent", "children")
+
+    def __init__(self, class_name: Optional[str], dn: str, attributes: dict,
+                 parent: Optional["ManagedObject"]):
+      self.class_name = class_name
+      self.dn = dn
+      self.attributes = attributes
+      self.parent = parent
+      self.children: Dict[str, "ManagedObject"] = {}
+
+    def iter_subtree(self) -> Iterator["ManagedObject"]:
+      """Every loaded descendant, depth first, excluding self"""
+      stack = list(self.children.values())
+      while stack:
+        node = stack.pop()
+        if node.class_name is not None:
+          yield node
+        stack.extend(node.children.values())
+
+    def iter_children(self) -> Iterator["ManagedObject"]:
+      return (node for node in self.children.values() if node.class_name is not None)
+
+
+class MITStore:
+    """
+    In-memory managed object store with a DN trie and a per-class index.
+
+    Objects come from APIC responses (including nested children) or a saved
+    snapshot. query() resolves the common subset of APIC REST query semantics
+    locally and returns None for anything it cannot answer exactly.
+    """
+    __slots__ = ("root", "by_dn", "by_class")
+
+    def __init__(self):
+      self.root = ManagedObject(None, "", {}, None)
+      self.by_dn: Dict[str, ManagedObject] = {}
+      self.by_class: Dict[str, Dict[str, ManagedObject]] = {}
+
+    def __len__(self) -> int:
+      return sum(len(objects) for objects in self.by_class.values())
+
+    #------------------------- loading -------------------------
+
+    @classmethod
+    def from_snapshot(cls, path: str) -> "MITStore":
+      """Load a snapshot saved by save_snapshot() or any saved APIC JSON response"""
+      store = cls()
+      with open(path) as snapshot:
+        store.load(json.load(snapshot))
+      return store
+
+    @classmethod
+    def from_env(cls) -> Optional["MITStore"]:
+      """Load the snapshot named by APIC_SNAPSHOT, if set"""
+      path = os.getenv('APIC_SNAPSHOT')
+      return cls.from_snapshot(path) if path else None
+
+    def save_snapshot(self, path: str) -> None:
+      imdata = [{node.class_name: {"attributes": node.attributes}}
+                for objects in self.by_class.values() for node in objects.values()]
+      with open(path, "w") as snapshot:
+        json.dump({"totalCount": str(len(imdata)), "imdata": imdata}, snapshot)
+
+    def load(self, response) -> int:
+      """Add every MO of an APIC response (dict with imdata, or a list of MOs)"""
+      imdata = response.get("imdata", []) if isinstance(response, dict) else response
+      count = 0
+      for mo in imdata:
+        count += self._load_mo(mo, None)
+      return count
+
+    def _load_mo(self, mo: dict, parent_dn: Optional[str]) -> int:
+      count = 0
+      for class_name, body in mo.items():
+        attributes = dict(body.get("attributes", {}))
+        dn = attributes.get("dn")
+        if not dn and parent_dn is not None and attributes.get("rn"):
+          dn = f"{parent_dn}/{attributes['rn']}"
+        if not dn:
+          continue
+        self.add(class_name, attributes, dn)
+        count += 1
+        for child in body.get("children", []):
+          count += self._load_mo(child, dn)
+      return count
+
+    def add(self, class_name: str, attributes: dict, dn: Optional[str] = None) -> ManagedObject:
+      """Insert or replace one object, creating placeholders for missing ancestors"""
+      dn = dn or attributes["dn"]
+      attributes["dn"] = dn
+      node = self.by_dn.get(dn)
+      if node is None:
+        node = self.root
+        path = []
+        for rn in split_dn(dn):
+          path.append(rn)
+          child = node.children.get(rn)
+          if child is None:
+            child = ManagedObject(None, "/".join(path), {}, node)
+            node.children[rn] = child
+            self.by_dn[child.dn] = child
+          node = child
+      elif node.class_name is not None and node.class_name != class_name:
+        self.by_class[node.class_name].pop(dn, None)
+      node.class_name = class_name
+      node.attributes = attributes
+      self.by_class.setdefault(class_name, {})[dn] = node
+      return node
+
+    def update(self, dn: str, attributes: dict) -> Optional[ManagedObject]:
+      """Merge changed attributes into an existing object"""
+      node = self.by_dn.get(dn)
+      if node is None or node.class_name is None:
+        return None
+      node.attributes.update(attributes)
+      return node
+
+    def remove(self, dn: str) -> None:
+      """Delete an object and its whole subtree"""
+      node = self.by_dn.get(dn)
+      if node is None:
+        return
+      for descendant in [node, *node.iter_subtree()]:
+        if descendant.class_name is not None:
+          self.by_class[descendant.class_name].pop(descendant.dn, None)
+      stack = [node]
+      while stack:
+        current = stack.pop()
+        self.by_dn.pop(current.dn, None)
+        stack.extend(current.children.values())
+      node.parent.children.pop(split_dn(dn)[-1], None)
+
+    def get(self, dn: str) -> Optional[ManagedObject]:
+      node = self.by_dn.get(dn)
+      return node if node is not None and node.class_name is not None else None
+
+    #------------------------- queries -------------------------
+
+    def query(self, uri: str, covered: Optional[Set[str]] = None) -> Optional[dict]:
+      """
+      Resolve a GET URI against the store.
+
+      covered limits answers to queries that only touch those classes, for partial
+      stores such as a subscription mirror. Returns None when the query uses
+      unsupported options or may reach classes outside covered.
+      """
+      parts = urlsplit(uri.strip())
+      params = dict(parse_qsl(parts.query))
+      if not set(params) <= SUPPORTED_PARAMS:
+        return None
+      includes = set(filter(None, params.get("rsp-subtree-include", "").split(",")))
+      if not includes <= SUPPORTED_INCLUDES:
+        return None
+      target = params.get("query-target", "self")
+      target_classes = set(filter(None, params.get("target-subtree-class", "").split(",")))
+      rsp_subtree = params.get("rsp-subtree", "no")
+      rsp_classes = set(filter(None, params.get("rsp-subtree-class", "").split(",")))
+      if target not in ("self", "children", "subtree") or rsp_subtree not in ("no", "children", "full"):
+        return None
+      try:
+        predicate = parse_filter(params["query-target-filter"]) if "query-target-filter" in params else None
+      except ValueError:
+        return None
+
+      mo_match = MO_PATH_RE.match(parts.path)
+      class_match = CLASS_PATH_RE.match(parts.path)
+      if mo_match:
+        base = self.by_dn.get(mo_match.group(1))
+        bases = [base] if base is not None and (base.class_name is not None or target != "self") else []
+        if covered is not None:
+          if target == "self" and (base is None or base.class_name not in covered):
+            return None
+          if target != "self" and not (target_classes and target_classes <= covered):
+            return None
+      elif class_match:
+        scope_dn, class_name = class_match.groups()
+        if covered is not None:
+          if class_name not in covered:
+            return None
+          if target != "self" and not (target_classes and target_classes <= covered):
+            return None
+        objects = self.by_class.get(class_name, {}).values()
+        if scope_dn:
+          scope = scope_dn + "/"
+          objects = [node for node in objects if node.dn.startswith(scope)]
+        bases = list(objects)
+      else:
+        return None
+      if covered is not None and rsp_subtree != "no" and not (rsp_classes and rsp_classes <= covered):
+        return None
+
+      # Resolve query-target into the list of target objects
+      if target == "self":
+        targets = bases
+      elif target == "children":
+        targets = [child for node in bases for child in node.iter_children()]
+      else:
+        targets = [item for node in bases for item in [node, *node.iter_subtree()] if item.class_name is not None]
+      if target != "self" and target_classes:
+        targets = [node for node in targets if node.class_name in target_classes]
+      if predicate is not None:
+        targets = [node for node in targets if predicate(node)]
+
+      # rsp-subtree-class + required keeps only targets that have matching descendants
+      def subtree_children(node: ManagedObject) -> List[ManagedObject]:
+        if rsp_subtree == "no":
+          return []
+        children = node.iter_children() if rsp_subtree == "children" else node.iter_subtree()
+        return [child for child in children if not rsp_classes or child.class_name in rsp_classes]
+
+      if "required" in includes and rsp_subtree != "no":
+        targets = [node for node in targets if subtree_children(node)]
+
+      if "count" in includes:
+        return {"totalCount": "1", "imdata": [{"moCount": {"attributes": {"count": str(len(targets)), "dn": ""}}}]}
+
+      targets = order_objects(targets, params.get("order-by"))
+      total = len(targets)
+      if "page-size" in params:
+        try:
+          size = int(params["page-size"])
+          page = int(params.get("page", 0))
+        except ValueError:
+          return None
+        if size < 1 or page < 0:
+          return None
+        targets = targets[page * size:(page + 1) * size]
+
+      imdata = [self._render(node, rsp_subtree, rsp_classes) for node in targets]
+      return {"totalCount": str(total), "imdata": imdata}
+
+    def _render(self, node: ManagedObject, rsp_subtree: str, rsp_classes: Set[str]) -> dict:
+      """Serialize an object the way the APIC does, with children when rsp-subtree asks for them"""
+      body = {"attributes": dict(node.attributes)}
+      if rsp_subtree != "no":
+        children = []
+        for child in node.iter_children():
+          if rsp_subtree == "full":
+            rendered = self._render(child, rsp_subtree, rsp_classes)
+            if not rsp_classes or child.class_name in rsp_classes or rendered[child.class_name].get("children"):
+              children.append(rendered)
+          elif not rsp_classes or child.class_name in rsp_classes:
+            children.append({child.class_name: {"attributes": dict(child.attributes)}})
+        if children:
+          body["children"] = children
+      return {node.class_name: body}
+
+
+def order_objects(nodes: List[ManagedObject], order_by: Optional[str]) -> List[ManagedObject]:
+    """Apply order-by=cls.attr[|asc|desc], defaulting to DN order"""
+    if not order_by:
+      return sorted(nodes, key=lambda node: node.dn)
+    field, _, direction = order_by.partition("|")
+    attribute = field.split(".", 1)[-1]
+    return sorted(nodes, key=lambda node: node.attributes.get(attribute, ""), reverse=direction == "desc")
+
+
+#------------------------- query-target-filter -------------------------
+
+FILTER_TOKEN_RE = re.compile(r'\s*(?:(?P<string>"(?:[^"\\]|\\.)*")|(?P<name>[A-Za-z0-9_.\-]+)|(?P<punct>[(),]))')
+
+
+def _tokenize(expression: str) -> List[str]:
+    tokens, position = [], 0
+    expression = expression.strip()
+    while position < len(expression):
+      match = FILTER_TOKEN_RE.match(expression, position)
+      if not match:
+        raise ValueError(f"Unexpected character in filter at {position}: {expression!r}")
+      tokens.append(match.group(match.lastgroup))
+      position = match.end()
+    return tokens
+
+
+def parse_filter(expression: str) -> Callable[[ManagedObject], bool]:
+    """Compile an APIC query-target-filter such as and(eq(fvBD.name,"a"),ne(...)) into a predicate"""
+    tokens = _tokenize(expression)
+    predicate, position = _parse_call(tokens, 0)
+    if position != len(tokens):
+      raise ValueError(f"Trailing input in filter: {expression!r}")
+    return predicate
+
+
+def _token(tokens: List[str], position: int) -> str:
+    if position >= len(tokens):
+      raise ValueError("Filter ends early")
+    return tokens[position]
+
+
+def _parse_call(tokens: List[str], position: int):
+    operator = _token(tokens, position)
+    if _token(tokens, position + 1) != "(":
+      raise ValueError(f"Expected '(' after {operator}")
+    position += 2
+    args = []
+    while _token(tokens, position) != ")":
+      if position + 1 < len(tokens) and tokens[position + 1] == "(":
+        arg, position = _parse_call(tokens, position)
+      else:
+        arg, position = _token(tokens, position), position + 1
+      args.append(arg)
+      if _token(tokens, position) == ",":
+        position += 1
+    return _build(operator, args), position + 1
+
+
+def _compare(left: str, right: str) -> int:
+    try:
+      a, b = float(left), float(right)
+    except ValueError:
+      a, b = left, right
+    return (a > b) - (a < b)
+
+
+COMPARISONS = {
+  "eq": lambda value, operand: value == operand,
+  "ne": lambda value, operand: value != operand,
+  "lt": lambda value, operand: _compare(value, operand) < 0,
+  "le": lambda value, operand: _compare(value, operand) <= 0,
+  "gt": lambda value, operand: _compare(value, operand) > 0,
+  "ge": lambda value, operand: _compare(value, operand) >= 0,
+  "wcard": lambda value, pattern: pattern.search(value) is not None,
+}
+
+
+def _build(operator: str, args: list) -> Callable[[ManagedObject], bool]:
+    if operator in ("and", "or", "not"):
+      if not all(callable(arg) for arg in args):
+        raise ValueError(f"{operator}() expects filter expressions")
+      if operator == "and":
+        return lambda node: all(arg(node) for arg in args)
+      if operator == "or":
+        return lambda node: any(arg(node) for arg in args)
+      if len(args) != 1:
+        raise ValueError("not() expects one filter expression")
+      return lambda node: not args[0](node)
+    if operator not in COMPARISONS or len(args) != 2 or callable(args[0]) or callable(args[1]):
+      raise ValueError(f"Unsupported filter {operator}()")
+    class_name, _, attribute = args[0].partition(".")
+    operand = args[1][1:-1] if args[1].startswith('"') else args[1]
+    if operator == "wcard":
+      # Compiled once here, so a bad pattern is a parse error rather than a failure per object
+      try:
+        operand = re.compile(operand)
+      except re.error as err:
+        raise ValueError(f"Invalid wcard pattern {operand!r}: {err}")
+    compare = COMPARISONS[operator]
+
+    def predicate(node: ManagedObject) -> bool:
+      if node.class_name != class_name:
+        return False
+      return compare(node.attributes.get(attribute, ""), operand)
+    return predicate
@@ -0,0 +1,123 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+# Lines that belong to examples rather than prose: URLs, JSON/XML bodies, shell and HTTP commands
+CODE_LINE_RE = re.compile(
+    r"""^\s*(?:
+        (?:URL:\s*)?(?:https?://|/api/|api/)\S*  # REST URLs
+      | [{}\[\]]                                # JSON structure
+      | "[\w\-]+"\s*:                           # JSON members
+      | </?[A-Za-z][\w:\-]*[\s>/]               # XML tags
+      | (?:curl|GET|POST|DELETE|PUT|moquery|icurl)\s  # commands
+      | [\w\-]+=\S+$                            # bare query parameters such as time-range=24h
+    )""",
+    re.VERBOSE,
+)
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_blocks(text: str) -> List[Tuple[str, str]]:
+    """Group the lines of a page into ("code", text) and ("prose", text) blocks"""
+    blocks: List[Tuple[str, List[str]]] = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        kind = "code" if CODE_LINE_RE.match(line) else "prose"
+        if blocks and blocks[-1][0] == kind:
+            blocks[-1][1].append(line)
+        else:
+            blocks.append((kind, [line]))
+    return [(kind, "\n".join(lines)) for kind, lines in blocks]
+
+
+def pack_chunks(blocks: List[Tuple[str, str]], max_chars: int) -> List[str]:
+    """
+    Pack blocks into chunks of about max_chars. Prose may be split between
+    sentences and an oversized code block between lines, but never inside a
+    line, so every example URL stays whole and next to the prose that
+    introduces it.
+    """
+    pieces: List[str] = []
+    for kind, text in blocks:
+        if len(text) <= max_chars:
+            pieces.append(text)
+        elif kind == "prose":
+            for sentence in SENTENCE_END_RE.split(text):
+                pieces.extend(sentence.splitlines() if len(sentence) > max_chars else [sentence])
+        else:
+            pieces.extend(text.splitlines())
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 1 > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _partition_pages(path: str, start: int, stop: int, max_chars: int) -> List[Tuple[str, dict]]:
+    """Worker: extract and chunk pages [start, stop) of one PDF"""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    results = []
+    for index in range(start, min(stop, len(reader.pages))):
+        text = reader.pages[index].extract_text() or ""
+        for chunk in pack_chunks(split_blocks(text), max_chars):
+            results.append((chunk, {"source": path, "page_number": index + 1}))
+    return results
+
+
+def _page_count(path: str) -> int:
+    from pypdf import PdfReader
+
+    return len(PdfReader(path).pages)
+
+
+def partition_pdf(path: str, max_workers: Optional[int] = None, pages_per_task: int = 8,
+                  max_chars: int = 1500) -> Iterator[Document]:
+    """
+    Yield the chunks of a PDF in page order, partitioning page ranges on a process pool.
+
+    Only about two tasks per worker are in flight at a time, so the caller can
+    stream chunks into embedding without the whole document being held in memory.
+    """
+    max_workers = max_workers or int(os.getenv("PARTITION_WORKERS", os.cpu_count() or 2))
+    total = _page_count(path)
+    ranges = [(start, start + pages_per_task) for start in range(0, total, pages_per_task)]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = []
+        for start, stop in ranges:
+            pending.append(executor.submit(_partition_pages, path, start, stop, max_chars))
+            if len(pending) > 2 * max_workers:
+                yield from _documents(pending.pop(0).result())
+        for future in pending:
+            yield from _documents(future.result())
+
+
+def partition_text(path: str, max_chars: int = 1500) -> Iterator[Document]:
+    """Yield the chunks of a plain text file such as example_urls.txt"""
+    with open(path) as text_file:
+        blocks = split_blocks(text_file.read())
+    yield from _documents((chunk, {"source": path}) for chunk in pack_chunks(blocks, max_chars))
+
+
+def partition_documents(paths: Iterable[str], max_chars: int = 1500) -> Iterator[Document]:
+    """Partition every file locally, PDFs in parallel, without the Unstructured API"""
+    for path in paths:
+        if path.lower().endswith(".pdf"):
+            yield from partition_pdf(path, max_chars=max_chars)
+        else:
+            yield from partition_text(path, max_chars=max_chars)
+
+
+def _documents(results: Iterable[Tuple[str, dict]]) -> Iterator[Document]:
+    for text, metadata in results:
+        yield Document(page_content=text, metadata=metadata)
@@ -0,0 +1,285 @@
+import io
+import os
+import ast
+import json
+import uuid
+import types
+import builtins
+import tempfile
+import threading
+import traceback
+import multiprocessing
+from contextlib import redirect_stdout
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits, timeouts still apply
+    resource = None
+
+
+class ResultStore:
+    """
+    Disk-backed store of tool results, addressed by short handles.
+
+    The agent process and the Python workers share the directory, so REPL code
+    can load a get_apic result by handle instead of the model pasting it back
+    as text. The oldest results are removed once max_entries is exceeded.
+    """
+    def __init__(self, directory: Optional[str] = None, max_entries: Optional[int] = None):
+        self.directory = directory or os.getenv(
+            "PYTHON_RESULTS_DIR", os.path.join(tempfile.gettempdir(), "apic_agent_results")
+        )
+        self.max_entries = max_entries or int(os.getenv("PYTHON_RESULTS_MAX", 256))
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, handle: str) -> str:
+        if not handle.startswith("res-") or not handle[4:].isalnum():
+            raise KeyError(f"Invalid result handle: {handle}")
+        return os.path.join(self.directory, f"{handle}.json")
+
+    def put(self, value: Any) -> str:
+        handle = f"res-{uuid.uuid4().hex[:10]}"
+        path = self._path(handle)
+        with open(f"{path}.tmp", "w") as result_file:
+            json.dump(value, result_file, default=str)
+        os.replace(f"{path}.tmp", path)
+        self._evict()
+        return handle
+
+    def get(self, handle: str) -> Any:
+        try:
+            with open(self._path(handle)) as result_file:
+                return json.load(result_file)
+        except FileNotFoundError:
+            raise KeyError(f"Unknown or expired result handle: {handle}") from None
+
+    def __contains__(self, handle: str) -> bool:
+        try:
+            return os.path.exists(self._path(handle))
+        except KeyError:
+            return False
+
+    def _evict(self) -> None:
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+#------------------------- worker process -------------------------
+
+# Modules python_repl code may import; they are handed over without their private names and submodules
+ALLOWED_MODULES = {
+    "bisect", "collections", "csv", "datetime", "decimal", "fractions", "functools", "heapq", "ipaddress",
+    "itertools", "json", "math", "operator", "random", "re", "statistics", "string", "textwrap", "time",
+}
+# Builtins that reach files, code objects or arbitrary attributes
+BLOCKED_BUILTINS = {
+    "open", "exec", "eval", "compile", "input", "breakpoint", "help", "exit", "quit",
+    "globals", "locals", "vars", "getattr", "setattr", "delattr", "__import__", "__loader__", "__spec__",
+}
+# Attributes that lead from a generator, coroutine or traceback to frames and their globals
+BLOCKED_ATTRIBUTES = {
+    "gi_frame", "gi_code", "cr_frame", "cr_code", "ag_frame", "ag_code", "tb_frame", "tb_next",
+    "f_back", "f_globals", "f_locals", "f_builtins", "f_code",
+}
+
+
+def _public_module(module: types.ModuleType) -> types.SimpleNamespace:
+    """The public functions, classes and constants of a module, without the modules it imported"""
+    return types.SimpleNamespace(**{
+        name: value for name, value in vars(module).items()
+        if not name.startswith("_") and not isinstance(value, types.ModuleType)
+    })
+
+
+def _restricted_builtins() -> dict:
+    modules = {}
+
+    def restricted_import(name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name not in ALLOWED_MODULES:
+            raise ImportError(f"import of {name!r} is not allowed in python_repl; "
+                              f"available modules: {', '.join(sorted(ALLOWED_MODULES))}")
+        if name not in modules:
+            modules[name] = _public_module(__import__(name))
+        return modules[name]
+
+    allowed = {name: value for name, value in vars(builtins).items() if name not in BLOCKED_BUILTINS}
+    allowed["__import__"] = restricted_import
+    return allowed
+
+
+def _check_code(tree: ast.AST) -> None:
+    """Reject private and frame attributes and dunder names, the usual ways out of the restricted builtins"""
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute) and (node.attr.startswith("_") or node.attr in BLOCKED_ATTRIBUTES):
+            raise PermissionError(f"access to attribute {node.attr!r} is not allowed in python_repl")
+        if isinstance(node, ast.Name) and node.id.startswith("__") and node.id != "__name__":
+            raise PermissionError(f"access to {node.id!r} is not allowed in python_repl")
+
+def _limit_resources(memory_mb: int) -> None:
+    if resource is None:
+        return
+    limit = memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+
+def _worker_main(conn, results_dir: str, memory_mb: int, max_output: int) -> None:
+    """Serve code execution requests until the pipe closes"""
+    _limit_resources(memory_mb)
+    store = ResultStore(results_dir)
+    loaded: "OrderedDict[str, Any]" = OrderedDict()
+    apic = {}
+
+    def load(handle: str) -> Any:
+        """The full result stored under a handle; recently used handles stay in memory"""
+        if handle not in loaded:
+            loaded[handle] = store.get(handle)
+            if len(loaded) > 16:
+                loaded.popitem(last=False)
+        loaded.move_to_end(handle)
+        return loaded[handle]
+
+    def iter_apic(uri: str):
+        if "client" not in apic:
+            from agent.apic_cluster import clients_from_env
+            apic["client"] = next(iter(clients_from_env().values()))
+        return apic["client"].iter_resource(uri)
+
+    restricted = _restricted_builtins()
+    while True:
+        try:
+            code = conn.recv()
+        except EOFError:
+            break
+        namespace = {"load": load, "save": store.put, "iter_apic": iter_apic, "__name__": "__main__",
+                     "__builtins__": restricted}
+        buffer = io.StringIO()
+        try:
+            tree = ast.parse(code)
+            _check_code(tree)
+            with redirect_stdout(buffer):
+                exec(compile(tree, "<python_repl>", "exec"), namespace)
+            output = buffer.getvalue()
+        except MemoryError:
+            output = buffer.getvalue() + "MemoryError: the code exceeded the worker memory limit"
+        except BaseException as err:
+            lines = traceback.format_exception_only(type(err), err)
+            output = buffer.getvalue() + "".join(lines)
+        if len(output) > max_output:
+            output = output[:max_output] + f"\n... output truncated ({len(output)} characters)"
+        conn.send(output)
+
+
+#------------------------- pool -------------------------
+
+class PythonWorkerPool:
+    """
+    Pool of long-lived, resource-limited Python worker processes.
+
+    Each worker runs with an address-space limit (memory_mb) and every call has
+    a wall-clock timeout; a worker that times out, dies or leaves its pipe in
+    an unknown state is killed and replaced, so one runaway snippet never takes
+    down the agent. Workers are started on first use and reused across calls,
+    keeping imports and loaded results warm. Each call gets a fresh namespace
+    with load(handle), save(value) -> handle and iter_apic(uri), builtins
+    without open, eval, exec and getattr, and imports limited to
+    ALLOWED_MODULES; private and frame attributes are rejected before the code
+    runs. These restrictions keep well-meant code on data work; they are not a
+    security boundary against hostile code, which the process limits only
+    contain in time and memory.
+    """
+    def __init__(self, results_dir: str, size: Optional[int] = None, timeout: Optional[float] = None,
+                 memory_mb: Optional[int] = None, max_output: Optional[int] = None):
+        self.results_dir = results_dir
+        self.size = size or int(os.getenv("PYTHON_WORKERS", 2))
+        self.timeout = timeout or float(os.getenv("PYTHON_TIMEOUT", 30))
+        self.memory_mb = memory_mb or int(os.getenv("PYTHON_MEMORY_MB", 1024))
+        self.max_output = max_output or int(os.getenv("PYTHON_MAX_OUTPUT", 20000))
+        # Spawned rather than forked: the agent process runs threads
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: List[tuple] = []
+        self._started = 0
+        # Signalled whenever a worker becomes idle or a slot for a new one frees up
+        self._available = threading.Condition()
+
+    def _start_worker(self):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, self.results_dir, self.memory_mb, self.max_output),
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        return process, parent_conn
+
+    def _checkout(self):
+        """An idle worker, a newly started one while fewer than size exist, or the next one to free up"""
+        with self._available:
+            while not self._idle and self._started >= self.size:
+                self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._started += 1
+        try:
+            return self._start_worker()
+        except BaseException:
+            self._release_slot()
+            raise
+
+    def _checkin(self, worker) -> None:
+        with self._available:
+            self._idle.append(worker)
+            self._available.notify()
+
+    def _release_slot(self) -> None:
+        with self._available:
+            self._started -= 1
+            # A waiting caller can start a replacement worker in the freed slot
+            self._available.notify()
+
+    def _discard(self, worker) -> None:
+        process, conn = worker
+        process.kill()
+        process.join()
+        conn.close()
+        self._release_slot()
+
+    def run(self, code: str, timeout: Optional[float] = None) -> str:
+        """Execute code in a worker and return what it printed, or the error"""
+        timeout = timeout or self.timeout
+        worker = self._checkout()
+        process, conn = worker
+        try:
+            conn.send(code)
+            if not conn.poll(timeout):
+                self._discard(worker)
+                return f"Error: execution timed out after {timeout:g} seconds"
+            output = conn.recv()
+        except (EOFError, OSError):
+            self._discard(worker)
+            return "Error: the Python worker exited (it may have exceeded its memory limit)"
+        except Exception as err:
+            # E.g. an answer that failed to unpickle: the pipe may be out of step, so the worker is not reused
+            self._discard(worker)
+            return f"Error: the Python worker failed ({type(err).__name__}: {err}) and was replaced"
+        except BaseException:
+            self._discard(worker)
+            raise
+        self._checkin(worker)
+        return output
+
+    def close(self) -> None:
+        with self._available:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            self._discard(worker)
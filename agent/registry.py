@@ -0,0 +1,116 @@
+import os
+import threading
+
+# Process-wide clients, created on first use and shared by every Streamlit session and rerun.
+# Heavy libraries are imported inside the factories, so importing this module (or a tool
+# module that uses it) costs nothing until a client is actually needed.
+_shared = {}
+_shared_lock = threading.RLock()
+
+
+def shared(name: str, factory):
+    """Return the named shared object, creating it exactly once even under concurrent calls"""
+    resource = _shared.get(name)
+    if resource is None:
+        with _shared_lock:
+            resource = _shared.get(name)
+            if resource is None:
+                resource = _shared[name] = factory()
+    return resource
+
+
+def register(name: str, resource) -> None:
+    """Install a shared object directly, e.g. a fake model in benchmarks"""
+    with _shared_lock:
+        _shared[name] = resource
+
+
+def discard(name: str) -> None:
+    """Drop a shared object so the next use builds it again, e.g. after new credentials were saved"""
+    with _shared_lock:
+        resource = _shared.pop(name, None)
+    # A mapping of resources (e.g. the clients of every fabric) is closed member by member
+    for item in resource.values() if isinstance(resource, dict) else [resource]:
+        for method in ("close", "stop"):
+            if hasattr(item, method):
+                getattr(item, method)()
+                break
+
+
+def deferred_tools(namespace: dict, *functions):
+    """
+    Module __getattr__ that turns functions into LangChain tools on first access.
+
+    Building a tool imports langchain_core's runnables and tracers (with
+    langsmith), most of a second, so tool modules define plain functions, pass
+    them here and bind the result to __getattr__. The functions leave the
+    module namespace; `from module import name` then returns the tool, built
+    on that first import.
+    """
+    pending = {function.__name__: function for function in functions}
+    for name in pending:
+        del namespace[name]
+
+    def __getattr__(name: str):
+        if name not in pending:
+            raise AttributeError(f"module {namespace['__name__']!r} has no attribute {name!r}")
+        from langchain_core.tools import tool
+        with _shared_lock:
+            if name not in namespace:
+                namespace[name] = tool(pending[name])
+        return namespace[name]
+
+    return __getattr__
+
+
+def get_fabric_clients():
+    """One client per fabric (a cluster client for fabrics with several controllers), by fabric name"""
+    from agent.apic_cluster import clients_from_env
+    return shared("fabric_clients", clients_from_env)
+
+
+def get_apic_client():
+    """Client of the first fabric, used by every tool, with the MIT mirror for APIC_MIRROR_CLASSES attached"""
+    def create():
+        from agent.apic_mirror import MITMirror
+        client = next(iter(get_fabric_clients().values()))
+        # Serve repeated reads of the classes in APIC_MIRROR_CLASSES from a local mirror; on a
+        # cluster it subscribes through the first controller
+        _shared["apic_mirror"] = MITMirror.from_env(getattr(client, "primary", client))
+        return client
+    return shared("apic_client", create)
+
+
+def get_batch_runner():
+    """Background event loop and async session that get_apic_batch sends its requests through"""
+    from agent.async_apic_client import AsyncBatchRunner
+    return shared("apic_batch_runner", lambda: AsyncBatchRunner(get_apic_client()))
+
+
+def get_result_store():
+    """Store of get_apic results, keyed by the handles python_repl code loads"""
+    from agent.python_workers import ResultStore
+    return shared("result_store", ResultStore)
+
+
+def get_worker_pool():
+    """Sandboxed worker processes running python_repl code, started on the first call"""
+    from agent.python_workers import PythonWorkerPool
+    return shared("worker_pool", lambda: PythonWorkerPool(get_result_store().directory))
+
+
+def get_chat_model():
+    """Chat model behind the agent and the documentation RAG tool"""
+    def create():
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(
+            model="qwen-plus", api_key=os.getenv("ALIBABA_API_KEY"),
+            base_url="https://dashscope-intl.aliyuncs.com/compatible-mode/v1",
+        )
+    return shared("llm", create)
+
+
+def get_tool_executor():
+    """Bounded executor that applies per-tool concurrency limits, timeouts and cancellation to the agent's tools"""
+    from agent.tool_executor import ToolExecutor
+    return shared("tool_executor", ToolExecutor)
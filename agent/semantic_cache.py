@@ -0,0 +1,124 @@
+import os
+import re
+import json
+import threading
+import numpy as np
+from typing import List, Optional
+
+
+def entity_tokens(query: str) -> List[str]:
+    """
+    Tokens that name specific objects: quoted strings, numbers and mixed-case or
+    digit-bearing words (PROD, node-101, fvBD). Two queries only share an answer
+    when these match, so "tenant PROD" never reuses the answer for "tenant DEV".
+    """
+    quoted = re.findall(r"['\"]([^'\"]+)['\"]", query)
+    words = re.findall(r"[A-Za-z0-9_\-./]+", query)
+    specific = [
+        word for word in words
+        if re.search(r"\d", word) or re.search(r"[A-Z]", word[1:]) or (word.isupper() and len(word) > 1)
+    ]
+    return sorted(set(quoted + specific))
+
+
+class SemanticCache:
+    """
+    Cache of generated answers keyed by query embedding.
+
+    A lookup returns the answer of the most similar cached query when its cosine
+    similarity reaches the threshold and its entity tokens match. Entries are
+    evicted least recently used first and the cache is persisted to disk after
+    every change, so it survives restarts.
+    """
+    def __init__(self, path: Optional[str] = None, threshold: Optional[float] = None,
+                 max_entries: Optional[int] = None):
+        self.path = path if path is not None else os.getenv("RAG_CACHE_PATH", "agent/content/rag_cache.npz")
+        self.threshold = threshold or float(os.getenv("RAG_CACHE_THRESHOLD", 0.95))
+        self.max_entries = max_entries or int(os.getenv("RAG_CACHE_MAX_ENTRIES", 512))
+        self._vectors: Optional[np.ndarray] = None
+        # One dict per row of _vectors: query, entities, answer, last_used
+        self._entries: List[dict] = []
+        self._clock = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self.path and os.path.exists(self.path):
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, query: str, vector: List[float]) -> Optional[str]:
+        """Return the cached answer for a sufficiently similar query, or None"""
+        query_vector = _unit(vector)
+        entities = entity_tokens(query)
+        with self._lock:
+            if self._vectors is not None and self._vectors.shape[1] == query_vector.shape[0]:
+                similarities = self._vectors @ query_vector
+                for row in np.argsort(-similarities)[:5]:
+                    if similarities[row] < self.threshold:
+                        break
+                    entry = self._entries[row]
+                    if entry["entities"] == entities:
+                        self._clock += 1
+                        entry["last_used"] = self._clock
+                        self.hits += 1
+                        return entry["answer"]
+            self.misses += 1
+            return None
+
+    def store(self, query: str, vector: List[float], answer: str) -> None:
+        """Add an answer, evicting the least recently used entry when full"""
+        query_vector = _unit(vector)
+        with self._lock:
+            if self._vectors is not None and self._vectors.shape[1] != query_vector.shape[0]:
+                # The embedding model changed; old vectors are not comparable
+                self._vectors, self._entries = None, []
+            self._clock += 1
+            entry = {"query": query, "entities": entity_tokens(query), "answer": answer, "last_used": self._clock}
+            if self._vectors is None:
+                self._vectors = query_vector[None, :]
+                self._entries = [entry]
+            elif len(self._entries) >= self.max_entries:
+                oldest = min(range(len(self._entries)), key=lambda row: self._entries[row]["last_used"])
+                self._vectors[oldest] = query_vector
+                self._entries[oldest] = entry
+            else:
+                self._vectors = np.vstack([self._vectors, query_vector])
+                self._entries.append(entry)
+            if self.path:
+                self._save()
+
+    def load(self) -> None:
+        with np.load(self.path, allow_pickle=False) as data:
+            vectors = data["vectors"]
+            entries = json.loads(str(data["entries"]))
+        with self._lock:
+            self._vectors = vectors if len(entries) else None
+            self._entries = entries
+            self._clock = max((entry["last_used"] for entry in entries), default=0)
+
+    def _save(self) -> None:
+        """Write atomically so a crash never leaves a truncated cache file"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.path}.tmp.npz"
+        np.savez(temporary, vectors=self._vectors, entries=np.array(json.dumps(self._entries)))
+        os.replace(temporary, self.path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def _unit(vector: List[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
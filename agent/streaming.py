@@ -0,0 +1,42 @@
+from typing import Any, Iterator, Tuple
+
+from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
+
+# Node of create_react_agent whose model output is shown to the user; the RAG tool's
+# own LLM call streams from the tools node and is not
+AGENT_NODE = "agent"
+TOOLS_NODE = "tools"
+
+
+def stream_events(graph, inputs: dict, config: dict) -> Iterator[Tuple[str, Any]]:
+    """
+    Run one agent turn and yield what the user should see, as it happens:
+
+        ("token", text)          a piece of the agent's reply
+        ("tool_call", call)      the agent asked for a tool ({"name", "args", "id"})
+        ("tool_result", message) a tool returned (ToolMessage)
+        ("answer", text)         the complete final reply
+
+    Tokens come from the graph's messages stream, so they arrive while the
+    model is still generating; tool calls and results come from the updates
+    stream as each node finishes.
+    """
+    for mode, chunk in graph.stream(inputs, config, stream_mode=["messages", "updates"]):
+        if mode == "messages":
+            message, metadata = chunk
+            if (metadata.get("langgraph_node") == AGENT_NODE and isinstance(message, AIMessageChunk)
+                    and isinstance(message.content, str) and message.content):
+                yield "token", message.content
+            continue
+        for node, update in chunk.items():
+            # Other nodes (e.g. the context hook rewriting old tool results) are not new progress
+            if node not in (AGENT_NODE, TOOLS_NODE) or not isinstance(update, dict):
+                continue
+            for message in update.get("messages", []):
+                if isinstance(message, ToolMessage):
+                    yield "tool_result", message
+                elif isinstance(message, AIMessage) and message.tool_calls:
+                    for call in message.tool_calls:
+                        yield "tool_call", call
+                elif isinstance(message, AIMessage):
+                    yield "answer", message.content
@@ -0,0 +1,154 @@
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import patch_config
+from langchain_core.tools import BaseTool, StructuredTool, ToolException
+
+# Calls of one tool allowed in flight at once, unless TOOL_CONCURRENCY says otherwise
+DEFAULT_TOOL_LIMIT = 4
+# python_repl has one worker process per call in flight; more would only queue on the pool.
+# Configuration writes run one at a time, so two batches in one step never interleave their diffs and commits
+DEFAULT_TOOL_LIMITS = {"python_repl": int(os.getenv("PYTHON_WORKERS", 2)), "post_apic_batch": 1}
+# How often waiting calls look for a cancelled turn, in seconds
+POLL_INTERVAL = 0.1
+
+
+def parse_tool_settings(value: str) -> Dict[str, float]:
+    """Parse "get_apic=8,python_repl=2" into a tool -> number mapping"""
+    settings = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, number = item.partition("=")
+        settings[name.strip()] = float(number)
+    return settings
+
+
+class ToolExecutor:
+    """
+    Runs the agent's tool calls on a bounded thread pool.
+
+    The graph's tool node already starts the calls of one step together; the
+    tools wrapped here add a per-tool concurrency limit (so a step with ten
+    get_apic calls does not open ten requests to the controller at once),
+    a per-call timeout after which the call returns an error to the agent,
+    and cancellation: when a turn is aborted, calls of that conversation that
+    are still queued or running return at once instead of being waited for.
+    A timed-out or cancelled call keeps its slot until its thread finishes.
+    """
+    def __init__(self, max_workers: Optional[int] = None, limits: Optional[Dict[str, int]] = None,
+                 timeouts: Optional[Dict[str, float]] = None, default_timeout: Optional[float] = None):
+        self.max_workers = max_workers or int(os.getenv("TOOL_MAX_WORKERS", 8))
+        self.limits = dict(DEFAULT_TOOL_LIMITS)
+        self.limits.update(parse_tool_settings(os.getenv("TOOL_CONCURRENCY", "")))
+        self.limits.update(limits or {})
+        self.timeouts = parse_tool_settings(os.getenv("TOOL_TIMEOUTS", ""))
+        self.timeouts.update(timeouts or {})
+        self.default_timeout = default_timeout or float(os.getenv("TOOL_TIMEOUT", 60))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool")
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        # thread_id -> event set when the turn running in that conversation is aborted
+        self._turns: Dict[Optional[str], threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, tool: BaseTool) -> BaseTool:
+        """A tool with the same name, description and arguments that runs through this executor"""
+        def call(config: RunnableConfig, callbacks=None, **kwargs):
+            # callbacks is the child manager of the wrapper's run, so the wrapped tool reports beneath it
+            return self.run(tool, kwargs, patch_config(config, callbacks=callbacks) if callbacks else config)
+
+        return StructuredTool.from_function(
+            func=call, name=tool.name, description=tool.description, args_schema=tool.args_schema,
+            handle_tool_error=True,
+        )
+
+    def _semaphore(self, name: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            semaphore = self._semaphores.get(name)
+            if semaphore is None:
+                limit = int(self.limits.get(name, DEFAULT_TOOL_LIMIT))
+                semaphore = self._semaphores[name] = threading.BoundedSemaphore(max(1, limit))
+            return semaphore
+
+    def _turn(self, config: Optional[RunnableConfig]) -> threading.Event:
+        thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+        with self._lock:
+            return self._turns.get(thread_id) or threading.Event()
+
+    @contextmanager
+    def turn(self, thread_id: Optional[str]) -> Iterator[threading.Event]:
+        """
+        Scope one agent turn of a conversation. If the block is left by an
+        exception (including the generator being closed or the page being
+        stopped), the turn's outstanding tool calls are cancelled.
+        """
+        event = threading.Event()
+        with self._lock:
+            self._turns[thread_id] = event
+        try:
+            yield event
+        except BaseException:
+            event.set()
+            raise
+        finally:
+            with self._lock:
+                if self._turns.get(thread_id) is event:
+                    del self._turns[thread_id]
+
+    def cancel(self, thread_id: Optional[str]) -> None:
+        """Cancel the running turn of a conversation, e.g. from a stop button"""
+        with self._lock:
+            event = self._turns.get(thread_id)
+        if event is not None:
+            event.set()
+
+    def run(self, tool: BaseTool, args: dict, config: Optional[RunnableConfig] = None):
+        cancelled = self._turn(config)
+        timeout = self.timeouts.get(tool.name, self.default_timeout)
+        deadline = time.monotonic() + timeout
+        semaphore = self._semaphore(tool.name)
+        while not semaphore.acquire(timeout=POLL_INTERVAL):
+            self._check(tool.name, cancelled, deadline, timeout)
+        try:
+            # The copied context keeps the tool's span as the parent of spans opened by the call
+            context = contextvars.copy_context()
+            future = self._pool.submit(context.run, self._invoke, tool, args, config)
+        except BaseException:
+            semaphore.release()
+            raise
+        future.add_done_callback(lambda _: semaphore.release())
+        while True:
+            try:
+                return future.result(timeout=POLL_INTERVAL)
+            except FutureTimeout:
+                try:
+                    self._check(tool.name, cancelled, deadline, timeout)
+                except ToolException:
+                    future.cancel()
+                    raise
+
+    @staticmethod
+    def _invoke(tool: BaseTool, args: dict, config: Optional[RunnableConfig]):
+        """
+        Call the tool through invoke, so it validates its arguments and reports
+        to the callbacks as a child of the wrapper; tools with only a coroutine
+        run it on their own event loop in the pool thread.
+        """
+        if isinstance(tool, StructuredTool) and tool.func is None and tool.coroutine is not None:
+            return asyncio.run(tool.ainvoke(args, config))
+        return tool.invoke(args, config)
+
+    @staticmethod
+    def _check(name: str, cancelled: threading.Event, deadline: float, timeout: float) -> None:
+        if cancelled.is_set():
+            raise ToolException(f"{name} was cancelled because the agent step was aborted")
+        if time.monotonic() >= deadline:
+            raise ToolException(f"{name} timed out after {timeout:g}s")
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
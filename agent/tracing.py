@@ -0,0 +1,371 @@
+import os
+import json
+import time
+import uuid
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Histogram buckets of span durations, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation; attributes are exported with it when it ends"""
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "attributes", "start", "start_time",
+                 "duration", "status")
+
+    def __init__(self, tracer: "Tracer", name: str, parent: Optional["Span"] = None, **attributes):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes: Dict[str, Any] = dict(attributes)
+        self.start = time.perf_counter()
+        self.start_time = time.time()
+        self.duration: Optional[float] = None
+        self.status = "ok"
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def add(self, name: str, value: float) -> None:
+        """Accumulate a numeric attribute, e.g. bytes over several reads"""
+        self.attributes[name] = self.attributes.get(name, 0) + value
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self.start
+        if error is not None:
+            self.status = "error"
+            self.attributes["error"] = f"{type(error).__name__}: {error}"
+        self.tracer.export(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start_time,
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class Metrics:
+    """Prometheus-style counters and histograms, rendered in the text exposition format"""
+    def __init__(self, buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counters: Dict[Tuple[str, tuple], float] = {}
+        # (name, labels) -> [bucket counts..., sum, count]
+        self.histograms: Dict[Tuple[str, tuple], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.setdefault(key, [0] * (len(self.buckets) + 2))
+            histogram[bisect.bisect_left(self.buckets, value)] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"{name}{_labels(labels)} {value:g}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', f'{bound:g}'),))} {cumulative:g}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {histogram[-1]:g}")
+                lines.append(f"{name}_sum{_labels(labels)} {histogram[-2]:g}")
+                lines.append(f"{name}_count{_labels(labels)} {histogram[-1]:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+class Tracer:
+    """
+    Records spans to a JSONL file and aggregates them into metrics.
+
+    Every finished span is appended as one JSON line to path (if set; the
+    file is opened once and kept open) and counted in apic_agent_span_duration_seconds{span=...}. Numeric token and
+    byte attributes are also added to their own counters. Spans nest through a
+    context variable, so a span opened inside a tool call, including in
+    asyncio tasks and copied thread contexts, becomes a child of that call.
+    """
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.metrics = Metrics()
+        self._file_lock = threading.Lock()
+        self._file = None
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        return cls(os.getenv("TRACE_FILE") or None)
+
+    def current(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def start_span(self, name: str, parent: Optional[Span] = None, **attributes) -> Span:
+        """Start a span that the caller ends explicitly (callback style)"""
+        return Span(self, name, parent if parent is not None else _current_span.get(), **attributes)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """Time the enclosed block as a child of the current span"""
+        span = self.start_span(name, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as err:
+            span.end(err)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def annotate(self, **attributes) -> None:
+        """Add attributes to the current span, if any"""
+        span = _current_span.get()
+        if span is not None:
+            span.set(**attributes)
+
+    def export(self, span: Span) -> None:
+        self.metrics.observe("apic_agent_span_duration_seconds", span.duration, span=span.name)
+        self.metrics.inc("apic_agent_spans_total", span=span.name, status=span.status)
+        for attribute in ("prompt_tokens", "completion_tokens", "bytes"):
+            value = span.attributes.get(attribute)
+            if isinstance(value, (int, float)):
+                self.metrics.inc(f"apic_agent_{attribute}_total", value, span=span.name)
+        for attribute, metric in (("ttft_ms", "time_to_first_token"), ("first_output_ms", "time_to_first_output")):
+            value = span.attributes.get(attribute)
+            if isinstance(value, (int, float)):
+                self.metrics.observe(f"apic_agent_{metric}_seconds", value / 1000, span=span.name)
+        if self.path:
+            line = json.dumps(span.to_dict(), default=str)
+            with self._file_lock:
+                if self._file is None:
+                    # Line buffered, so every span is on disk as soon as it ends
+                    self._file = open(self.path, "a", buffering=1)
+                self._file.write(line + "\n")
+
+    def close(self) -> None:
+        """Close the span file; the next span reopens it"""
+        with self._file_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def serve_metrics(self, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """Serve /metrics in a background thread; calling it again returns the running server"""
+        if self._server is not None:
+            return self._server
+        metrics = self.metrics
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server
+
+
+tracer = Tracer.from_env()
+
+
+#------------------------- HTTP connection timing -------------------------
+
+class _TimedConnectionMixin:
+    """Record TCP connect and TLS handshake times on the current span"""
+    def _new_conn(self):
+        start = time.perf_counter()
+        sock = super()._new_conn()
+        tracer.annotate(connect_ms=round((time.perf_counter() - start) * 1000, 3), new_connection=True)
+        return sock
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        span = tracer.current()
+        if span is not None and "connect_ms" in span.attributes and isinstance(self, HTTPSConnection):
+            total = (time.perf_counter() - start) * 1000
+            span.set(tls_ms=round(total - span.attributes["connect_ms"], 3))
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TracedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose new connections report connect and TLS times to the current span"""
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+#------------------------- LangChain callbacks -------------------------
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Turns LangChain/LangGraph callbacks into spans: one per graph step
+    (agent / tools node), tool call and LLM call. LLM spans carry prompt and
+    completion tokens and, when the model streams, the time to first token.
+    """
+    def __init__(self, tracer: Tracer = tracer):
+        self.tracer = tracer
+        # run id -> span of that run, or of the nearest traced ancestor
+        self.spans: Dict[Any, Span] = {}
+        self.owned = set()
+        self.first_token: Dict[Any, bool] = {}
+        # Span that was current before a tool started, restored when it ends
+        self.previous: Dict[Any, Optional[Span]] = {}
+
+    def _start(self, run_id, parent_run_id, name: str, **attributes) -> Span:
+        parent = self.spans.get(parent_run_id)
+        span = self.tracer.start_span(name, parent=parent, **attributes)
+        self.spans[run_id] = span
+        self.owned.add(run_id)
+        return span
+
+    def _end(self, run_id, error: Optional[BaseException] = None) -> None:
+        span = self.spans.pop(run_id, None)
+        if run_id in self.owned:
+            self.owned.discard(run_id)
+            span.end(error)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        step = (metadata or {}).get("langgraph_node")
+        name = kwargs.get("name") or (serialized or {}).get("name", "chain")
+        if parent_run_id is None:
+            self._start(run_id, None, "agent.run", graph=name)
+        elif step and name == step:
+            self._start(run_id, parent_run_id, "agent.step", node=step, step=(metadata or {}).get("langgraph_step"))
+        else:
+            # Intermediate runnables are not spans; their children attach to the nearest span
+            parent = self.spans.get(parent_run_id)
+            if parent is not None:
+                self.spans[run_id] = parent
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        span = self._start(run_id, parent_run_id, "tool.call", tool=(serialized or {}).get("name") or kwargs.get("name"))
+        # Spans opened inside the tool (APIC requests, embeddings) become its children
+        self.previous[run_id] = _current_span.get()
+        _current_span.set(span)
+
+    def _tool_done(self, run_id, error=None):
+        self._end(run_id, error)
+        if run_id in self.previous:
+            _current_span.set(self.previous.pop(run_id))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        span = self.spans.get(run_id)
+        if span is not None:
+            span.set(output_chars=len(str(output)))
+        self._tool_done(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._tool_done(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        model = (kwargs.get("invocation_params") or {}).get("model") or (kwargs.get("invocation_params") or {}).get("model_name")
+        self._start(run_id, parent_run_id, "llm.call", model=model, messages=sum(len(batch) for batch in messages))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, "llm.call", prompts=len(prompts))
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        span = self.spans.get(run_id)
+        if span is not None and run_id not in self.first_token:
+            self.first_token[run_id] = True
+            span.set(ttft_ms=round((time.perf_counter() - span.start) * 1000, 3))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        span = self.spans.get(run_id)
+        if span is not None:
+            span.set(**llm_usage(response))
+        self.first_token.pop(run_id, None)
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.first_token.pop(run_id, None)
+        self._end(run_id, error)
+
+
+def llm_usage(response) -> dict:
+    """Prompt and completion token counts of an LLMResult or an AIMessage"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None and getattr(response, "generations", None):
+        message = getattr(response.generations[0][0], "message", None)
+        usage = getattr(message, "usage_metadata", None)
+    if usage:
+        return {"prompt_tokens": usage.get("input_tokens", 0), "completion_tokens": usage.get("output_tokens", 0)}
+    token_usage = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+    if token_usage:
+        return {"prompt_tokens": token_usage.get("prompt_tokens", 0),
+                "completion_tokens": token_usage.get("completion_tokens", 0)}
+    return {}
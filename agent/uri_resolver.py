@@ -0,0 +1,296 @@
+import re
+import json
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+EXAMPLE_LINE_RE = re.compile(r"^URL:\s*(/api/\S+?),\s*Name:\s*(.*)$")
+CLASS_URL_RE = re.compile(r"^/api/(?:node/)?class/(\w+)\.json")
+CAMEL_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+WORD_RE = re.compile(r"[A-Za-z0-9]+")
+
+# DN templates of the objects a question can name
+DN_TEMPLATES = {
+    "fvTenant": "uni/tn-{tenant}",
+    "fvAp": "uni/tn-{tenant}/ap-{ap}",
+    "fvAEPg": "uni/tn-{tenant}/ap-{ap}/epg-{epg}",
+    "fvBD": "uni/tn-{tenant}/BD-{bd}",
+    "fvCtx": "uni/tn-{tenant}/ctx-{vrf}",
+    "l3extOut": "uni/tn-{tenant}/out-{l3out}",
+    "vzBrCP": "uni/tn-{tenant}/brc-{contract}",
+    "fabricPod": "topology/pod-{pod}",
+    "fabricNode": "topology/pod-{pod}/node-{node}",
+}
+
+# Entity kind -> (class, phrases that introduce its name in a question)
+ENTITY_KINDS = {
+    "tenant": ("fvTenant", r"tenants?"),
+    "ap": ("fvAp", r"(?:application profiles?|app profiles?|aps?)"),
+    "epg": ("fvAEPg", r"(?:epgs?|endpoint groups?)"),
+    "bd": ("fvBD", r"(?:bds?|bridge domains?)"),
+    "vrf": ("fvCtx", r"(?:vrfs?|contexts?|ctx)"),
+    "l3out": ("l3extOut", r"(?:l3outs?|l3 outs?)"),
+    "contract": ("vzBrCP", r"contracts?"),
+    "pod": ("fabricPod", r"pods?"),
+    "node": ("fabricNode", r"(?:nodes?|switch(?:es)?|leaf|leafs|leaves|spines?)"),
+}
+
+# Extra names of classes, on top of the names listed in example_urls.txt
+CLASS_ALIASES = {
+    "fvBD": ["bd", "bridge domain"],
+    "fvAEPg": ["epg", "endpoint group"],
+    "fvCtx": ["vrf", "context"],
+    "fvAp": ["application profile", "app profile"],
+    "l3extOut": ["l3out", "l3 out"],
+    "fabricNode": ["node", "switch", "leaf", "spine"],
+}
+
+# Query modifiers: trigger words (singular) -> (parameter, value)
+FAULTS = ("rsp-subtree-include", "faults")
+COUNT = ("rsp-subtree-include", "count")
+MODIFIERS = [
+    ({"health", "healthscore", "score"}, ("rsp-subtree-include", "health")),
+    ({"fault"}, FAULTS),
+    ({"count", "many", "number"}, COUNT),
+    ({"children", "child"}, ("query-target", "children")),
+]
+MODIFIER_WORDS = {word for triggers, _ in MODIFIERS for word in triggers}
+
+# Requests the resolver never answers: writes and open-ended troubleshooting go through RAG
+UNSUPPORTED_WORDS = {"create", "delete", "remove", "add", "configure", "update", "modify", "why", "troubleshoot"}
+FILLER_WORDS = {
+    "a", "all", "an", "and", "api", "are", "by", "do", "does", "each", "every", "for", "from", "get", "give",
+    "how", "i", "in", "information", "info", "is", "its", "list", "me", "my", "of", "on", "please", "rest",
+    "retrieve", "show", "the", "their", "to", "under", "url", "using", "what", "which", "with", "fabric",
+    "details", "can", "there", "named", "called", "query", "fetch", "object", "status",
+}
+# Tenants every fabric has, accepted as names even in lower case
+BUILTIN_TENANTS = {"common", "infra", "mgmt"}
+# Attribute a class query filters on for a named object that has no DN (names by default)
+FILTER_ATTRIBUTES = {"fabricNode": "id", "fabricPod": "id"}
+# A node DN built on an assumed pod 1 may be wrong on a multi-pod fabric; it costs as much confidence as an unexplained word
+ASSUMED_POD_FACTOR = 0.75
+
+
+def singular(word: str) -> str:
+    word = word.lower()
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("ches", "shes", "xes", "sses")):
+        return word[:-2]
+    # Short plurals count too (BDs, APs, EPGs)
+    if len(word) > 2 and word.endswith("s") and not word.endswith(("ss", "us")):
+        return word[:-1]
+    return word
+
+
+# Filler words as words() returns them ("does" -> "doe", "its" -> "it")
+FILLER_TOKENS = {singular(word) for word in FILLER_WORDS}
+
+
+def words(text: str) -> List[str]:
+    return [singular(word) for word in WORD_RE.findall(text)]
+
+
+def is_entity_value(value: str, quoted: bool) -> bool:
+    """Names given without quotes must look like identifiers (PROD, web-01, 101), not prose"""
+    return quoted or value in BUILTIN_TENANTS or bool(re.search(r"[\dA-Z_\-]", value))
+
+
+@dataclass
+class Resolution:
+    url: str
+    confidence: float
+    class_name: Optional[str] = None
+    entities: Dict[str, str] = field(default_factory=dict)
+    basis: str = ""
+
+    def answer(self) -> str:
+        """The resolution in the JSON shape the RAG prompt asks the LLM for"""
+        return json.dumps({
+            "api_endpoint": self.url,
+            "technical_basis": self.basis,
+            "complexity_estimate": "medium" if "/class/" in self.url and "query-target-filter" not in self.url else "low",
+            "security_note": "Requires an authenticated APIC session token; always use HTTPS",
+            "alternative_endpoints": [],
+        }, indent=4)
+
+
+class URIResolver:
+    """
+    Rule-based resolver from a natural-language request to an APIC URL.
+
+    The class names of example_urls.txt, class aliases, DN templates and query
+    modifiers are compiled once into lookup tables. A request is resolved by
+    extracting named objects (tenant PROD, node 101), matching the remaining
+    words against class names, and filling in a class or DN-scoped URL. The
+    confidence is low when the request names no known class or object, or more
+    than one class matches equally, so the caller can fall back to RAG.
+    """
+    def __init__(self, examples_path: Optional[str] = "agent/content/docs/example_urls.txt"):
+        # class -> example URL, and name token sets -> class
+        self.class_urls: Dict[str, str] = {}
+        self.names: List[Tuple[frozenset, str]] = []
+        self.entity_res = {
+            kind: re.compile(
+                rf"\b{phrase}\s+(?:named\s+|called\s+)?(?:(['\"])([^'\"]+)\1|([A-Za-z0-9_.:\-]+))", re.IGNORECASE
+            )
+            for kind, (_, phrase) in ENTITY_KINDS.items()
+        }
+        if examples_path:
+            self._load_examples(examples_path)
+        for class_name, aliases in CLASS_ALIASES.items():
+            for alias in aliases:
+                self._add_name(alias, class_name)
+        for class_name in DN_TEMPLATES:
+            self.class_urls.setdefault(class_name, f"/api/node/class/{class_name}.json")
+        # Query words are lowercased and singularized, so class names are looked up the same way
+        self.class_lookup = {singular(class_name): class_name for class_name in self.class_urls}
+
+    def _load_examples(self, path: str) -> None:
+        with open(path) as examples_file:
+            for line in examples_file:
+                match = EXAMPLE_LINE_RE.match(line.strip())
+                if not match:
+                    continue
+                url, name = match.groups()
+                class_match = CLASS_URL_RE.match(url)
+                if not class_match or "?" in url:
+                    continue
+                class_name = class_match.group(1)
+                self.class_urls.setdefault(class_name, url)
+                # Unnamed entries are known by their class name without the package prefix (fvSubnet -> Subnet)
+                self._add_name(name or " ".join(CAMEL_RE.findall(class_name)[1:]), class_name)
+
+    def _add_name(self, name: str, class_name: str) -> None:
+        tokens = frozenset(word for word in words(name) if word not in FILLER_TOKENS)
+        if tokens and (tokens, class_name) not in self.names:
+            self.names.append((tokens, class_name))
+
+    def extract_entities(self, query: str) -> Tuple[Dict[str, str], str]:
+        """Named objects in the query, and the query with those mentions removed"""
+        entities = {}
+        remaining = query
+        for kind, entity_re in self.entity_res.items():
+            for match in entity_re.finditer(query):
+                value = match.group(2) or match.group(3).rstrip(".,?")
+                if kind in ("node", "pod") and not value.isdigit():
+                    continue
+                if kind not in entities and is_entity_value(value, bool(match.group(2))):
+                    entities[kind] = value
+                    remaining = remaining.replace(match.group(0), " ")
+        return entities, remaining
+
+    def match_class(self, tokens: Set[str]) -> Tuple[Optional[str], float, Set[str]]:
+        """Best class for the words of a request: (class, score, words used)"""
+        # An exact class name such as fvRsCons wins outright
+        for token in tokens:
+            if token in self.class_lookup:
+                return self.class_lookup[token], 1.0, {token}
+        best: List[Tuple[float, int, str, frozenset]] = []
+        for name_tokens, class_name in self.names:
+            matched = name_tokens & tokens
+            if matched:
+                best.append((len(matched) / len(name_tokens), len(matched), class_name, matched))
+        if not best:
+            return None, 0.0, set()
+        best.sort(key=lambda item: (-item[0], -item[1]))
+        score, count, class_name, matched = best[0]
+        rivals = {item[2] for item in best if item[0] == score and item[1] == count}
+        if len(rivals) > 1:
+            score /= 2
+        return class_name, score, set(matched)
+
+    def resolve(self, query: str) -> Optional[Resolution]:
+        all_words = set(words(query))
+        if all_words & UNSUPPORTED_WORDS:
+            return None
+        entities, remaining = self.extract_entities(query)
+        tokens = {word for word in words(remaining) if word not in FILLER_TOKENS}
+        # Words such as "faults" are modifiers unless they complete a class name (Fault Summary)
+        class_name, score, used = self.match_class(tokens - MODIFIER_WORDS)
+        with_modifiers = self.match_class(tokens)
+        if with_modifiers[1] == 1.0 and with_modifiers[2] & MODIFIER_WORDS:
+            class_name, score, used = with_modifiers
+        modifiers = self._modifiers(tokens - used)
+        leftover = tokens - used - MODIFIER_WORDS
+
+        scope_class, dn = self._deepest_dn(entities)
+        assumed_pod = False
+        if "node" in entities and "pod" not in entities:
+            if class_name in (None, "fabricNode"):
+                # Node IDs are unique across pods, so find the node by ID rather than guess its pod
+                class_name, score = "fabricNode", score if class_name else 1.0
+                scope_class, dn = None, None
+            else:
+                scope_class, dn = self._deepest_dn({**entities, "pod": "1"})
+                assumed_pod = scope_class == "fabricNode"
+        if class_name is None and dn is None:
+            return None
+        if class_name is None and dn is not None and FAULTS in modifiers:
+            # rsp-subtree-include=faults on the object alone only returns the faults raised on it
+            url = f"/api/node/mo/{dn}.json"
+            # Other includes (health) do not apply to fault objects: each dropped one counts as an unexplained word
+            dropped = [param for param in modifiers if param[0] == "rsp-subtree-include" and param not in (FAULTS, COUNT)]
+            score = 0.75 ** len(dropped)
+            modifiers = [("query-target", "subtree"), ("target-subtree-class", "faultInst")] + [
+                param for param in modifiers if param[0] not in ("query-target", "rsp-subtree-include") or param == COUNT
+            ]
+            target, basis = "faultInst", f"Subtree query for the faults under {dn}"
+        elif class_name is None or class_name == scope_class:
+            url, basis = f"/api/node/mo/{dn}.json", f"Managed object query on {dn}"
+            target, score = scope_class, 1.0 if class_name is None or score == 1.0 else score
+        elif dn is not None:
+            url = f"/api/node/mo/{dn}.json"
+            modifiers = [("query-target", "subtree"), ("target-subtree-class", class_name)] + [
+                param for param in modifiers if param[0] != "query-target"
+            ]
+            target, basis = class_name, f"Subtree query for {class_name} objects under {dn}"
+        else:
+            url, target = self.class_urls[class_name], class_name
+            basis = f"Class query for {class_name}"
+            unplaced = {kind: value for kind, value in entities.items() if ENTITY_KINDS[kind][0] == class_name}
+            if unplaced:
+                # The named object lacks the parents needed for its DN, so filter the class by name (or ID) instead
+                value = next(iter(unplaced.values()))
+                attribute = FILTER_ATTRIBUTES.get(class_name, "name")
+                modifiers.append(("query-target-filter", f'eq({class_name}.{attribute},"{value}")'))
+                basis = f"Class query for {class_name} filtered by {attribute}"
+            elif entities:
+                score *= 0.5
+
+        # Unexplained words mean the request asks for more than the resolver understood
+        confidence = score * (0.75 ** len(leftover))
+        if assumed_pod:
+            confidence *= ASSUMED_POD_FACTOR
+            basis += " (pod 1 assumed)"
+        return Resolution(
+            url=self._with_params(url, modifiers), confidence=round(confidence, 3),
+            class_name=target, entities=entities, basis=basis,
+        )
+
+    def _deepest_dn(self, entities: Dict[str, str]) -> Tuple[Optional[str], Optional[str]]:
+        """The class and DN of the most specific object whose template the entities fill"""
+        best = (None, None)
+        for class_name, template in DN_TEMPLATES.items():
+            names = re.findall(r"{(\w+)}", template)
+            if all(name in entities for name in names) and (best[1] is None or template.count("/") > best[1].count("/")):
+                best = (class_name, template.format(**entities))
+        return best
+
+    @staticmethod
+    def _modifiers(tokens: Set[str]) -> List[Tuple[str, str]]:
+        params = []
+        for triggers, param in MODIFIERS:
+            if tokens & triggers and param not in params:
+                params.append(param)
+        return params
+
+    @staticmethod
+    def _with_params(url: str, params: List[Tuple[str, str]]) -> str:
+        merged: Dict[str, List[str]] = {}
+        for name, value in params:
+            merged.setdefault(name, []).append(value)
+        if not merged:
+            return url
+        query = "&".join(f"{name}={','.join(values)}" for name, values in merged.items())
+        return f"{url}{'&' if '?' in url else '?'}{query}"
@@ -0,0 +1,272 @@
+import os
+import json
+import mmap
+import threading
+import numpy as np
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+INDEX_FILE = "index.json"
+META_FILE = "meta.jsonl"
+OFFSETS_FILE = "meta.off"
+SCALES_FILE = "scales.f32"
+IVF_FILE = "ivf.npz"
+DELETED_FILE = "deleted.npy"
+VECTOR_FILES = {"float32": "vectors.f32", "int8": "vectors.i8"}
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Vector store kept on local disk, for air-gapped labs and tests.
+
+    Embeddings are L2-normalized and stored row by row in a memory-mapped float32
+    matrix, or as int8 with one float32 scale per row when quantize="int8".
+    Texts and metadata live in a JSONL sidecar with a memory-mapped table of line
+    offsets, so only the records of returned hits are ever parsed. Search is an
+    exact NumPy top-k, or an inverted-file (IVF) probe after build_ivf(); rows
+    added after the IVF was built are still scanned exactly. Deleted rows are
+    tombstoned and skipped; adding an id that is already stored tombstones its
+    old row, so adds are upserts. Opening an index only maps the files, so
+    startup cost does not grow with its size: the id -> row index used by
+    upserts and deletes is built on the first write.
+    """
+    def __init__(self, path: str, embedding: Embeddings, quantize: Optional[str] = None,
+                 nprobe: Optional[int] = None):
+        self.path = path
+        self.embedding = embedding
+        self.quantize = quantize or os.getenv("LOCAL_INDEX_QUANTIZE") or None
+        self.nprobe = nprobe or int(os.getenv("LOCAL_INDEX_NPROBE", 8))
+        self.dim: Optional[int] = None
+        self.count = 0
+        self._vectors = None
+        self._scales = None
+        self._offsets = None
+        self._meta = None
+        self._ivf = None
+        self._deleted = np.zeros(0, dtype=np.int64)
+        # id -> live row, built on first use by _row_index
+        self._rows: Optional[Dict[str, int]] = None
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(self._file(INDEX_FILE)):
+            self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    @property
+    def dtype(self) -> str:
+        return "int8" if self.quantize == "int8" else "float32"
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    #------------------------- persistence -------------------------
+
+    def _load(self) -> None:
+        with open(self._file(INDEX_FILE)) as index_file:
+            info = json.load(index_file)
+        self.dim, self.count = info["dim"], info["count"]
+        self.quantize = info.get("quantize")
+        self._map()
+        if os.path.exists(self._file(IVF_FILE)):
+            with np.load(self._file(IVF_FILE)) as ivf:
+                self._ivf = {name: ivf[name] for name in ivf.files}
+        if os.path.exists(self._file(DELETED_FILE)):
+            self._deleted = np.load(self._file(DELETED_FILE))
+
+    def _map(self) -> None:
+        """(Re)open the memory maps after the files changed"""
+        if self._meta is not None:
+            self._meta.close()
+        if not self.count:
+            self._vectors = self._scales = self._offsets = self._meta = None
+            return
+        self._vectors = np.memmap(self._file(VECTOR_FILES[self.dtype]), dtype=self.dtype,
+                                  mode="r", shape=(self.count, self.dim))
+        if self.dtype == "int8":
+            self._scales = np.memmap(self._file(SCALES_FILE), dtype=np.float32, mode="r", shape=(self.count,))
+        # count + 1 offsets: record i spans offsets[i]:offsets[i + 1] of the JSONL file
+        self._offsets = np.memmap(self._file(OFFSETS_FILE), dtype=np.int64, mode="r", shape=(self.count + 1,))
+        with open(self._file(META_FILE), "rb") as meta_file:
+            self._meta = mmap.mmap(meta_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def record(self, row: int) -> dict:
+        """The {"id", "text", "metadata"} record of one row"""
+        return json.loads(self._meta[self._offsets[row]:self._offsets[row + 1]])
+
+    def _document(self, row: int) -> Document:
+        record = self.record(row)
+        return Document(page_content=record["text"], metadata=record["metadata"])
+
+    def _row_index(self) -> Dict[str, int]:
+        """The id -> row map of live rows, read from the records once per opened index"""
+        if self._rows is None:
+            deleted = set(self._deleted.tolist())
+            self._rows = {self.record(row)["id"]: row for row in range(self.count) if row not in deleted}
+        return self._rows
+
+    def _tombstone(self, rows: List[int]) -> None:
+        if rows:
+            self._deleted = np.union1d(self._deleted, np.asarray(rows, dtype=np.int64))
+            np.save(self._file(DELETED_FILE), self._deleted)
+
+    def _write_info(self) -> None:
+        with open(self._file(INDEX_FILE), "w") as index_file:
+            json.dump({"dim": self.dim, "count": self.count, "quantize": self.quantize}, index_file)
+
+    #------------------------- writing -------------------------
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        vectors = np.asarray(self.embedding.embed_documents(texts), dtype=np.float32)
+        return self.add_vectors(vectors, texts, metadatas, ids)
+
+    def add_vectors(self, vectors: np.ndarray, texts: List[str], metadatas: Optional[List[dict]] = None,
+                    ids: Optional[List[str]] = None) -> List[str]:
+        """Append pre-computed embeddings with their texts, replacing rows stored under the same ids"""
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        metadatas = metadatas or [{} for _ in texts]
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+            ids = ids or [str(self.count + offset) for offset in range(len(texts))]
+            rows = self._row_index()
+            with open(self._file(VECTOR_FILES[self.dtype]), "ab") as vector_file:
+                if self.dtype == "int8":
+                    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+                    np.round(vectors / scales[:, None]).astype(np.int8).tofile(vector_file)
+                    with open(self._file(SCALES_FILE), "ab") as scales_file:
+                        scales.astype(np.float32).tofile(scales_file)
+                else:
+                    vectors.tofile(vector_file)
+            offsets = []
+            with open(self._file(META_FILE), "ab") as meta_file:
+                position = meta_file.tell()
+                for doc_id, text, metadata in zip(ids, texts, metadatas):
+                    line = (json.dumps({"id": doc_id, "text": text, "metadata": metadata}, default=str) + "\n").encode()
+                    meta_file.write(line)
+                    position += len(line)
+                    offsets.append(position)
+            with open(self._file(OFFSETS_FILE), "ab") as offsets_file:
+                if self.count == 0:
+                    offsets.insert(0, 0)
+                np.asarray(offsets, dtype=np.int64).tofile(offsets_file)
+            replaced = []
+            for row, doc_id in enumerate(ids, start=self.count):
+                if doc_id in rows:
+                    replaced.append(rows[doc_id])
+                rows[doc_id] = row
+            self.count += len(texts)
+            self._write_info()
+            self._tombstone(replaced)
+            self._map()
+        return ids
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   path: Optional[str] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> "LocalVectorStore":
+        store = cls(path or os.getenv("LOCAL_INDEX_DIR", "agent/content/index"), embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Tombstone the rows with these ids; they are skipped by every search"""
+        if not ids:
+            return False
+        with self._lock:
+            rows = self._row_index()
+            self._tombstone([rows.pop(doc_id) for doc_id in set(ids) if doc_id in rows])
+        return True
+
+    #------------------------- IVF -------------------------
+
+    def build_ivf(self, nlist: Optional[int] = None, iterations: int = 10, seed: int = 0) -> None:
+        """Cluster the rows with k-means so searches only scan the nprobe closest lists"""
+        with self._lock:
+            matrix = self._dense(np.arange(self.count))
+            nlist = nlist or max(1, int(np.sqrt(self.count)))
+            rng = np.random.default_rng(seed)
+            centroids = matrix[rng.choice(self.count, size=min(nlist, self.count), replace=False)]
+            for _ in range(iterations):
+                assignment = np.argmax(matrix @ centroids.T, axis=1)
+                for cluster in range(len(centroids)):
+                    members = matrix[assignment == cluster]
+                    if len(members):
+                        centroids[cluster] = members.mean(axis=0)
+                centroids = _normalize(centroids)
+            assignment = np.argmax(matrix @ centroids.T, axis=1)
+            order = np.argsort(assignment, kind="stable")
+            offsets = np.searchsorted(assignment[order], np.arange(len(centroids) + 1))
+            self._ivf = {"centroids": centroids, "rows": order.astype(np.int64),
+                         "offsets": offsets.astype(np.int64), "count": np.array(self.count)}
+            np.savez(self._file(IVF_FILE), **self._ivf)
+
+    #------------------------- searching -------------------------
+
+    def _dense(self, rows: np.ndarray) -> np.ndarray:
+        """Materialize the given rows as float32"""
+        if self.dtype == "int8":
+            return self._vectors[rows].astype(np.float32) * self._scales[rows][:, None]
+        return np.asarray(self._vectors[rows])
+
+    def _candidates(self, query: np.ndarray) -> Optional[np.ndarray]:
+        """Rows to score for this query, or None for an exhaustive scan"""
+        if self._ivf is None:
+            return None
+        centroids, rows, offsets = self._ivf["centroids"], self._ivf["rows"], self._ivf["offsets"]
+        probes = np.argsort(-(centroids @ query))[:self.nprobe]
+        candidates = [rows[offsets[probe]:offsets[probe + 1]] for probe in probes]
+        indexed = int(self._ivf["count"])
+        # Rows appended after the IVF was built are not in any list yet
+        candidates.append(np.arange(indexed, self.count))
+        return np.concatenate(candidates)
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        if not self.count:
+            return []
+        query = _normalize(np.asarray(embedding, dtype=np.float32)[None, :])[0]
+        rows = self._candidates(query)
+        if rows is None:
+            if self.dtype == "int8":
+                scores = (self._vectors @ query) * self._scales
+            else:
+                scores = self._vectors @ query
+            rows = np.arange(self.count)
+        else:
+            scores = self._dense(rows) @ query
+        if len(self._deleted):
+            scores = np.where(np.isin(rows, self._deleted), -np.inf, scores)
+        k = min(k, len(rows) - int(np.isinf(scores).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self._document(int(rows[i])), float(scores[i])) for i in top]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities in [-1, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
@@ -0,0 +1,143 @@
+import re
+import json
+import time
+from typing import Any, Callable, Iterator, List, Optional, Union
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from agent.embeddings import HashingEmbeddings
+
+HANDLE_RE = re.compile(r"res-[0-9a-f]+")
+
+# A step is a fixed reply or a function of the conversation so far
+Step = Union[AIMessage, Callable[[List[BaseMessage]], AIMessage]]
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Chat model that replays a fixed script, for driving create_react_agent
+    through a known sequence of tool calls without a network. The script wraps
+    around, so every agent turn replays it from the start. latency_ms stands in
+    for the provider's response time; replies carry usage metadata estimated
+    at four characters per token so token accounting can be exercised.
+    When streamed, replies arrive word by word and tool calls in the last chunk.
+    """
+    script: List[Any]
+    latency_ms: float = 0.0
+    position: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs) -> "ScriptedChatModel":
+        return self
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs) -> ChatResult:
+        step = self.script[self.position % len(self.script)]
+        self.position += 1
+        message = step(messages) if callable(step) else step.model_copy()
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        prompt_chars = sum(len(str(m.content)) for m in messages)
+        completion_chars = len(str(message.content)) + len(json.dumps(message.tool_calls))
+        message.usage_metadata = {
+            "input_tokens": prompt_chars // 4,
+            "output_tokens": completion_chars // 4,
+            "total_tokens": (prompt_chars + completion_chars) // 4,
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        message = self._generate(messages, stop, **kwargs).generations[0].message
+        content = message.content if isinstance(message.content, str) else ""
+        for word in re.findall(r"\S+\s*|\s+", content):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word))
+            if run_manager:
+                run_manager.on_llm_new_token(word, chunk=chunk)
+            yield chunk
+        calls = [{"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": index}
+                 for index, call in enumerate(message.tool_calls)]
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=calls,
+                                                         usage_metadata=message.usage_metadata))
+
+
+def tool_call(name: str, args: dict, call_id: str) -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": call_id, "type": "tool_call"}])
+
+
+def last_handle(messages: List[BaseMessage]) -> Optional[str]:
+    """The result handle in the most recent tool message"""
+    for message in reversed(messages):
+        if isinstance(message, ToolMessage):
+            match = HANDLE_RE.search(str(message.content))
+            return match.group(0) if match else None
+    return None
+
+
+def agent_turn_script(question: str, uri: str) -> List[Step]:
+    """RAG lookup -> get_apic -> python_repl over the result handle -> final answer"""
+    def analyse(messages: List[BaseMessage]) -> AIMessage:
+        code = f"data = load({last_handle(messages)!r})\nprint(len(data['imdata']))"
+        return tool_call("python_repl", {"input": code}, "call-3")
+
+    return [
+        tool_call("query_and_retrieve_document", {"query": question}, "call-1"),
+        tool_call("get_apic", {"uri": uri, "fields": ["name"]}, "call-2"),
+        analyse,
+        AIMessage(content="Benchmark answer: the objects were counted."),
+    ]
+
+
+def fan_out_script(uris: List[str]) -> List[Step]:
+    """One step calling get_apic for every URI at once -> final answer"""
+    calls = [{"name": "get_apic", "args": {"uri": uri, "fields": ["name"]}, "id": f"call-{index}", "type": "tool_call"}
+             for index, uri in enumerate(uris)]
+    return [AIMessage(content="", tool_calls=calls), AIMessage(content="Benchmark answer: all tenants read.")]
+
+
+def rag_answer_model(latency_ms: float = 0.0) -> ScriptedChatModel:
+    """Stand-in for the RAG tool's LLM, always answering in the prompt's JSON format"""
+    answer = json.dumps({
+        "api_endpoint": "/api/node/class/fvBD.json",
+        "technical_basis": "Class query for bridge domains",
+        "complexity_estimate": "low",
+        "security_note": "Requires an authenticated session",
+        "alternative_endpoints": [],
+    })
+    return ScriptedChatModel(script=[AIMessage(content=answer)], latency_ms=latency_ms)
+
+
+def deterministic_embeddings(dim: int = 768) -> HashingEmbeddings:
+    return HashingEmbeddings(dim=dim)
+
+
+def write_pdf(path: str, pages: List[List[str]]) -> None:
+    """Write a minimal PDF with one text line per entry of every page, for exercising the PDF partitioner"""
+    def escape(line: str) -> str:
+        return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        stream = ("BT /F1 10 Tf 12 TL 72 760 Td " + " ".join(f"({escape(line)}) Tj T*" for line in lines) + " ET").encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % kid for kid in kids), len(kids))
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as pdf_file:
+        pdf_file.write(out)
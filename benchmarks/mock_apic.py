@@ -0,0 +1,349 @@
+import json
+import time
+import base64
+import random
+import socket
+import struct
+import hashlib
+import argparse
+import threading
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl, urlencode
+from typing import List, Optional, Set
+
+from agent.mit_store import MITStore, SUPPORTED_PARAMS, SUPPORTED_INCLUDES
+
+# Appended to Sec-WebSocket-Key to compute Sec-WebSocket-Accept (RFC 6455)
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def generate_mit(scale: int, seed: int = 0) -> MITStore:
+    """
+    Build a MIT of about scale objects shaped like a real fabric: tenants with
+    VRFs, bridge domains, subnets, application profiles, EPGs and their BD
+    relations, faults, plus one fabric node (with a health score) per 500 objects.
+    The same scale and seed always produce the same tree.
+    """
+    rng = random.Random(seed)
+    store = MITStore()
+    store.add("polUni", {"dn": "uni", "status": ""})
+    nodes = max(4, scale // 500)
+    for node_id in range(101, 101 + nodes):
+        dn = f"topology/pod-1/node-{node_id}"
+        store.add("fabricNode", {
+            "dn": dn, "id": str(node_id), "name": f"leaf{node_id}", "role": "spine" if node_id % 10 == 0 else "leaf",
+            "fabricSt": rng.choice(["active"] * 9 + ["inactive"]), "model": "N9K-C93180YC-FX",
+        })
+        store.add("healthInst", {"dn": f"{dn}/health", "cur": str(rng.randint(60, 100))})
+    tenant = 0
+    while len(store) < scale:
+        name = f"tenant{tenant:04d}"
+        tn = f"uni/tn-{name}"
+        store.add("fvTenant", {"dn": tn, "name": name, "descr": f"Benchmark tenant {tenant}"})
+        for vrf in range(2):
+            store.add("fvCtx", {"dn": f"{tn}/ctx-vrf{vrf}", "name": f"vrf{vrf}", "pcEnfPref": "enforced"})
+        for bd in range(20):
+            bd_dn = f"{tn}/BD-bd{bd:02d}"
+            store.add("fvBD", {
+                "dn": bd_dn, "name": f"bd{bd:02d}", "arpFlood": rng.choice(["yes", "no"]),
+                "unicastRoute": "yes", "mac": f"00:22:BD:F8:{bd:02X}:{tenant % 256:02X}",
+            })
+            store.add("fvSubnet", {"dn": f"{bd_dn}/subnet-[10.{tenant % 256}.{bd}.1/24]", "ip": f"10.{tenant % 256}.{bd}.1/24"})
+        for ap in range(2):
+            ap_dn = f"{tn}/ap-app{ap}"
+            store.add("fvAp", {"dn": ap_dn, "name": f"app{ap}"})
+            for epg in range(20):
+                epg_dn = f"{ap_dn}/epg-epg{epg:02d}"
+                store.add("fvAEPg", {"dn": epg_dn, "name": f"epg{epg:02d}", "pcTag": str(16000 + epg), "isAttrBasedEPg": "no"})
+                store.add("fvRsBd", {"dn": f"{epg_dn}/rsbd", "tnFvBDName": f"bd{epg % 20:02d}"})
+        for fault in range(10):
+            store.add("faultInst", {
+                "dn": f"{tn}/BD-bd{fault:02d}/fault-F{1000 + fault}", "code": f"F{1000 + fault}",
+                "severity": rng.choice(["critical", "major", "minor", "warning"]), "descr": "Benchmark fault",
+            })
+        tenant += 1
+    return store
+
+
+class MockAPIC:
+    """
+    Local HTTP server answering APIC REST reads from a generated MIT.
+
+    Login and refresh return a token cookie, and other requests must carry
+    a token that was issued and not yet expired with expire_tokens(); class
+    and MO queries are evaluated by MITStore.query (options it does not support are dropped).
+    Every request sleeps latency_ms plus up to jitter_ms to stand in for the
+    network and the controller. With max_concurrent set, a GET arriving while
+    that many are being answered gets a 429, like a throttling controller.
+    With fail_status set, every request but login and refresh is answered
+    with that status, like a controller that is up but failing.
+
+    Reads with subscription=yes also return a subscriptionId, and /socket<token>
+    accepts websocket connections; notify() pushes change events over them,
+    as the APIC does for subscribed classes.
+    """
+    def __init__(self, store: MITStore, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0, max_concurrent: Optional[int] = None,
+                 fail_status: Optional[int] = None):
+        self.store = store
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.max_concurrent = max_concurrent
+        self.fail_status = fail_status
+        self.requests = 0
+        self.throttled = 0
+        self.in_flight = 0
+        self.subscriptions = 0
+        self.logins = 0
+        self.refreshes = 0
+        # TCP connections accepted, to tell reused keep-alive connections from new ones
+        self.connections = 0
+        self.tokens: Set[str] = set()
+        self._lock = threading.Lock()
+        # Open websocket connections and the lock serializing frames written to them
+        self._websockets: List[socket.socket] = []
+        self._ws_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockAPIC":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.drop_websockets()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockAPIC":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _delay(self) -> None:
+        delay = self.latency_ms + random.random() * self.jitter_ms
+        if delay:
+            time.sleep(delay / 1000)
+
+    def expire_tokens(self) -> None:
+        """Invalidate every issued token, as a controller does when sessions time out"""
+        with self._lock:
+            self.tokens.clear()
+
+    def notify(self, *mos: dict) -> None:
+        """Push one event with these objects (attributes carrying a created/modified/deleted status) to every websocket"""
+        frame = _text_frame(json.dumps({"subscriptionId": [str(self.subscriptions)], "imdata": list(mos)}))
+        with self._ws_lock:
+            for connection in self._websockets:
+                connection.sendall(frame)
+
+    def drop_websockets(self) -> None:
+        """Cut every websocket connection, as a controller restart would"""
+        with self._ws_lock:
+            connections, self._websockets = self._websockets, []
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def answer(self, path_and_query: str) -> Optional[dict]:
+        """Evaluate a GET against the store, dropping options the local evaluator does not support"""
+        parts = urlsplit(path_and_query)
+        params = [(key, value) for key, value in parse_qsl(parts.query) if key in SUPPORTED_PARAMS]
+        params = [
+            (key, ",".join(item for item in value.split(",") if item in SUPPORTED_INCLUDES))
+            if key == "rsp-subtree-include" else (key, value)
+            for key, value in params
+        ]
+        params = [(key, value) for key, value in params if value]
+        return self.store.query(f"{parts.path}?{urlencode(params)}" if params else parts.path)
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately; without this, delayed ACKs add ~40 ms per request
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                with mock._lock:
+                    mock.connections += 1
+
+            def _send(self, status: int, body: dict, cookie: Optional[str] = None):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                if cookie:
+                    self.send_header("Set-Cookie", f"APIC-cookie={cookie}; Path=/")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _fail(self):
+                status = mock.fail_status
+                self._send(status, {"imdata": [{"error": {"attributes": {"code": str(status), "text": "Controller failing"}}}]})
+
+            def _websocket(self):
+                """Complete the websocket handshake, then hold the connection until the client closes it"""
+                key = self.headers.get("Sec-WebSocket-Key", "")
+                accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+                self.send_response(101)
+                self.send_header("Upgrade", "websocket")
+                self.send_header("Connection", "Upgrade")
+                self.send_header("Sec-WebSocket-Accept", accept)
+                self.end_headers()
+                self.wfile.flush()
+                self.close_connection = True
+                with mock._ws_lock:
+                    mock._websockets.append(self.connection)
+                try:
+                    while True:
+                        opcode = self._read_frame()
+                        if opcode is None:
+                            return
+                        if opcode == 0x8:
+                            with mock._ws_lock:
+                                self.connection.sendall(b"\x88\x00")
+                            return
+                except OSError:
+                    pass
+                finally:
+                    with mock._ws_lock:
+                        if self.connection in mock._websockets:
+                            mock._websockets.remove(self.connection)
+
+            def _read_frame(self) -> Optional[int]:
+                """Read and discard one client frame, returning its opcode (None once the connection is gone)"""
+                header = self.rfile.read(2)
+                if len(header) < 2:
+                    return None
+                length = header[1] & 0x7F
+                if length == 126:
+                    length = struct.unpack("!H", self.rfile.read(2))[0]
+                elif length == 127:
+                    length = struct.unpack("!Q", self.rfile.read(8))[0]
+                # Client frames are always masked
+                self.rfile.read(length + (4 if header[1] & 0x80 else 0))
+                return header[0] & 0x0F
+
+            def _login(self):
+                token = f"token-{random.getrandbits(64):016x}"
+                with mock._lock:
+                    mock.tokens.add(token)
+                attributes = {"token": token, "refreshTimeoutSeconds": "600"}
+                self._send(200, {"totalCount": "1", "imdata": [{"aaaLogin": {"attributes": attributes}}]}, token)
+
+            def _forbidden(self):
+                self._send(403, {"imdata": [{"error": {"attributes": {"code": "403", "text": "Token was invalid"}}}]})
+
+            def _authorized(self) -> bool:
+                cookies = SimpleCookie(self.headers.get("Cookie", ""))
+                token = cookies["APIC-cookie"].value if "APIC-cookie" in cookies else None
+                with mock._lock:
+                    return token in mock.tokens
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with mock._lock:
+                    mock.requests += 1
+                mock._delay()
+                if self.path.startswith("/api/aaaLogin"):
+                    with mock._lock:
+                        mock.logins += 1
+                    return self._login()
+                if mock.fail_status:
+                    return self._fail()
+                if not self._authorized():
+                    return self._forbidden()
+                self._send(200, {"totalCount": "0", "imdata": []})
+
+            def do_GET(self):
+                if self.path.startswith("/socket") and self.headers.get("Upgrade", "").lower() == "websocket":
+                    return self._websocket()
+                with mock._lock:
+                    mock.requests += 1
+                    throttled = mock.max_concurrent is not None and mock.in_flight >= mock.max_concurrent
+                    if throttled:
+                        mock.throttled += 1
+                    else:
+                        mock.in_flight += 1
+                if throttled:
+                    return self._send(429, {"imdata": [{"error": {"attributes": {"code": "429", "text": "Too many requests"}}}]})
+                try:
+                    self._answer_get()
+                finally:
+                    with mock._lock:
+                        mock.in_flight -= 1
+
+            def _answer_get(self):
+                mock._delay()
+                if self.path.startswith("/api/aaaRefresh"):
+                    if not self._authorized():
+                        return self._forbidden()
+                    with mock._lock:
+                        mock.refreshes += 1
+                    return self._login()
+                if mock.fail_status:
+                    return self._fail()
+                if not self._authorized():
+                    return self._forbidden()
+                if self.path.startswith("/api/subscriptionRefresh"):
+                    return self._send(200, {"totalCount": "0", "imdata": []})
+                result = mock.answer(self.path)
+                if result is None:
+                    return self._send(400, {"imdata": [{"error": {"attributes": {"code": "400", "text": "Unsupported query"}}}]})
+                if ("subscription", "yes") in parse_qsl(urlsplit(self.path).query):
+                    with mock._lock:
+                        mock.subscriptions += 1
+                        result = {**result, "subscriptionId": str(mock.subscriptions)}
+                self._send(200, result)
+
+        return Handler
+
+
+def _text_frame(text: str) -> bytes:
+    """Unmasked websocket text frame, as a server sends them"""
+    payload = text.encode()
+    if len(payload) < 126:
+        header = struct.pack("!BB", 0x81, len(payload))
+    elif len(payload) < 1 << 16:
+        header = struct.pack("!BBH", 0x81, 126, len(payload))
+    else:
+        header = struct.pack("!BBQ", 0x81, 127, len(payload))
+    return header + payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a mock APIC with a generated MIT")
+    parser.add_argument("--scale", type=int, default=10000, help="number of managed objects")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--max-concurrent", type=int, default=None, help="answer GETs beyond this many in flight with 429")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+    store = generate_mit(args.scale)
+    server = MockAPIC(store, args.latency_ms, args.jitter_ms, port=args.port, max_concurrent=args.max_concurrent).start()
+    print(f"Mock APIC with {len(store)} objects on {server.base_url}")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+"""
+Offline benchmarks for cold start, the APIC client, the RAG tool and full agent turns.
+
+    python -m benchmarks.run --scale 10000 --latency-ms 2 --iterations 50 --output baseline.json
+    python -m benchmarks.run --scenarios apic --baseline baseline.json
+
+Everything runs against a local mock APIC, a scripted chat model and hashing
+embeddings, so results are comparable across machines and runs without any
+network access or API keys.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from benchmarks.mock_apic import MockAPIC, generate_mit
+from benchmarks import fakes
+
+RAG_QUESTIONS = [
+    "Which query parameter limits the response to a subtree class?",
+    "How do I subscribe to changes of a managed object?",
+    "How can I page through a large class query?",
+    "How do I filter a class query on an attribute value?",
+]
+
+# What a cold process pays before it can serve its first page or tool call
+STARTUP_TARGETS = {
+    "startup.apic_client": "import agent.apic_client",
+    "startup.rest_tool": "import agent.agent_rest_tool",
+    "startup.rag_tool": "import agent.agent_rag_tool",
+    "startup.registry_client": "from agent.registry import get_apic_client; get_apic_client()",
+    "startup.main": "import main",
+}
+# Median cold time each startup target must stay under; main exits non-zero when one does not
+STARTUP_BUDGET_SECONDS = 1.0
+
+
+def max_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)
+
+
+def measure(name: str, fn: Callable[[], object], iterations: int, warmup: int = 2,
+            concurrency: int = 1, items: Optional[Callable[[object], int]] = None) -> dict:
+    """
+    Time fn over iterations calls (after warmup) and report latency percentiles,
+    throughput and the peak Python allocation of one extra traced call.
+    items counts the work done by one call (e.g. MOs read), for an items/s rate.
+    """
+    for _ in range(warmup):
+        fn()
+    latencies: List[float] = []
+    counts: List[int] = []
+
+    def timed(_):
+        start = time.perf_counter()
+        result = fn()
+        latencies.append(time.perf_counter() - start)
+        if items is not None:
+            counts.append(items(result))
+
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(timed, range(iterations)))
+    else:
+        for index in range(iterations):
+            timed(index)
+    elapsed = time.perf_counter() - start
+
+    # Allocation tracing slows calls down, so it gets its own call
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    result = {
+        "scenario": name,
+        "iterations": iterations,
+        "concurrency": concurrency,
+        **latency_stats(latencies),
+        "throughput_per_s": round(iterations / elapsed, 2),
+        "peak_alloc_mb": round(peak / 1024 / 1024, 2),
+        "max_rss_mb": max_rss_mb(),
+    }
+    if counts:
+        result["items_per_s"] = round(sum(counts) / elapsed, 1)
+    return result
+
+
+def latency_stats(seconds: List[float]) -> dict:
+    milliseconds = np.asarray(seconds) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(milliseconds, 50)), 3),
+        "p99_ms": round(float(np.percentile(milliseconds, 99)), 3),
+        "mean_ms": round(float(milliseconds.mean()), 3),
+    }
+
+
+#------------------------- scenarios -------------------------
+
+def apic_scenarios(server: MockAPIC, iterations: int) -> List[dict]:
+    from agent.apic_cache import ResponseCache
+    from agent.apic_client import APICClient
+    from agent.apic_cluster import create_client
+    from agent.apic_control import is_error
+    from agent.async_apic_client import AsyncAPICClient, AsyncBatchRunner
+
+    client = APICClient()
+    results = []
+
+    client.cache = ResponseCache(default_ttl=0)
+    results.append(measure("apic.get_mo", lambda: client.get_resource("/api/node/mo/uni/tn-tenant0000.json"), iterations))
+    results.append(measure(
+        "apic.get_class_uncached", lambda: client.get_resource("/api/node/class/fvBD.json"), max(5, iterations // 5),
+        items=lambda response: len(response["imdata"]),
+    ))
+    results.append(measure(
+        "apic.get_class_concurrent", lambda: client.get_resource("/api/node/mo/uni/tn-tenant0000.json?query-target=children"),
+        iterations, concurrency=8,
+    ))
+    results.append(measure(
+        "apic.iter_class", lambda: sum(1 for _ in client.iter_resource("/api/node/class/fvAEPg.json", page_size=1000)),
+        max(3, iterations // 10), items=lambda count: count,
+    ))
+
+    client.cache = ResponseCache(default_ttl=300)
+    results.append(measure("apic.get_class_cached", lambda: client.get_resource("/api/node/class/fvBD.json"), iterations))
+
+    uris = [f"/api/node/mo/uni/tn-tenant0000/BD-bd{bd:02d}.json" for bd in range(20)]
+
+    async def fetch_all():
+        async with AsyncAPICClient.from_client(client) as async_client:
+            async_client.cache = None
+            return await async_client.get_many(uris)
+
+    results.append(measure("apic.async_batch_20", lambda: asyncio.run(fetch_all()), max(5, iterations // 2)))
+
+    # The same batch through the long-lived loop and session get_apic_batch uses
+    client.cache = ResponseCache(default_ttl=0)
+    runner = AsyncBatchRunner(client)
+    results.append(measure("apic.batch_runner_20", lambda: runner.get_many(uris), max(5, iterations // 2)))
+    runner.close()
+
+    # A controller that answers 429 beyond 4 concurrent reads, hit by 16 threads; items/s counts successful reads
+    with MockAPIC(server.store, max(server.latency_ms, 5.0), server.jitter_ms, max_concurrent=4) as throttling:
+        throttled_client = APICClient(base_url=throttling.base_url)
+        throttled_client.cache = ResponseCache(default_ttl=0)
+        result = measure(
+            "apic.throttled_concurrent_16",
+            lambda: throttled_client.get_resource("/api/node/mo/uni/tn-tenant0000.json"),
+            iterations, concurrency=16, items=lambda response: 0 if is_error(response) else 1,
+        )
+        result["throttled_429"] = throttling.throttled
+        result["concurrency_limit"] = round(throttled_client.control.limiter.limit, 2)
+        results.append(result)
+
+    # Clusters of 1 to 3 controllers that each serve 2 reads at a time in 40 ms, hit by 16 threads. The mock
+    # controllers share this process (and its GIL) with the client, so each one's capacity is kept far below
+    # what the process can serve; otherwise every cluster size measures the same CPU ceiling, not the spreading
+    for size in (1, 2, 3):
+        servers = [
+            MockAPIC(server.store, max(server.latency_ms, 40.0), server.jitter_ms, max_concurrent=2).start()
+            for _ in range(size)
+        ]
+        cluster = create_client([member.base_url for member in servers])
+        cluster.cache = ResponseCache(default_ttl=0)
+        result = measure(
+            f"apic.cluster_{size}_concurrent_16",
+            lambda: cluster.get_resource("/api/node/mo/uni/tn-tenant0000.json"),
+            iterations, concurrency=16, items=lambda response: 0 if is_error(response) else 1,
+        )
+        result["throttled_429"] = sum(member.throttled for member in servers)
+        results.append(result)
+        cluster.close()
+        for member in servers:
+            member.stop()
+    return results
+
+
+def cold_run(code: str) -> dict:
+    """Run code in a fresh interpreter and return its wall time (excluding interpreter start-up) and max RSS"""
+    script = (
+        "import time, resource; start = time.perf_counter()\n"
+        f"{code}\n"
+        "print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+    )
+    completed = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True)
+    if completed.returncode != 0:
+        lines = completed.stderr.strip().splitlines()
+        raise ImportError(lines[-1] if lines else f"exit status {completed.returncode}")
+    seconds, rss = completed.stdout.split()[-2:]
+    return {"seconds": float(seconds), "rss_kb": int(rss)}
+
+
+def startup_scenarios(iterations: int) -> List[dict]:
+    """Cold import and client construction times, each in a new process, as after a deploy or worker restart"""
+    if resource is None:
+        raise ImportError("the startup scenarios need the resource module")
+    results = []
+    for name, code in STARTUP_TARGETS.items():
+        try:
+            runs = [cold_run(code) for _ in range(iterations)]
+        except ImportError as err:
+            print(f"Skipping {name}: {err}")
+            continue
+        stats = latency_stats([run["seconds"] for run in runs])
+        results.append({
+            "scenario": name,
+            "iterations": iterations,
+            **stats,
+            "max_rss_mb": round(max(run["rss_kb"] for run in runs) / 1024, 1),
+            "within_budget": stats["p50_ms"] <= STARTUP_BUDGET_SECONDS * 1000,
+        })
+    return results
+
+
+def mit_scenarios(scale: int, iterations: int) -> List[dict]:
+    store = generate_mit(scale)
+    return [
+        measure("mit.class_query", lambda: store.query("/api/node/class/fvBD.json?query-target-filter=eq(fvBD.arpFlood,\"yes\")"),
+                iterations),
+        measure("mit.subtree_query", lambda: store.query(
+            "/api/node/mo/uni/tn-tenant0000.json?query-target=subtree&target-subtree-class=fvAEPg"), iterations),
+    ]
+
+
+def prepare_rag(workdir: str) -> None:
+    """Point the RAG tool at a local index in workdir, built from the bundled documentation"""
+    os.environ.update({
+        "VECTOR_BACKEND": "local",
+        "EMBEDDING_BACKEND": "hash",
+        "PARTITION_MODE": "local",
+        "LOCAL_INDEX_DIR": os.path.join(workdir, "index"),
+        "KEYWORD_INDEX_PATH": os.path.join(workdir, "keyword_index.json"),
+        "RAG_CACHE_PATH": "",
+        # Measure retrieval and generation, not the answer cache
+        "RAG_CACHE_THRESHOLD": "1.01",
+    })
+
+
+def rag_scenarios(workdir: str, iterations: int, llm_latency_ms: float) -> List[dict]:
+    import agent.agent_rag_tool as rag
+    from agent.registry import register
+
+    docs = rag.load_pdf_pages(file_path=[
+        "agent/content/docs/cisco-apic-rest-api-configuration-guide-42x-and-later.pdf",
+        "agent/content/docs/example_urls.txt",
+    ])
+    start = time.perf_counter()
+    rag.embedding_and_saving(index_name="benchmark", docs=docs)
+    ingest = {"scenario": "rag.ingest", "iterations": 1, "seconds": round(time.perf_counter() - start, 3),
+              "max_rss_mb": max_rss_mb()}
+
+    register("llm", fakes.rag_answer_model(llm_latency_ms))
+    questions = iter(RAG_QUESTIONS * (iterations + 10))
+    resolver = rag.get_uri_resolver()
+    return [
+        ingest,
+        measure("rag.resolver", lambda: resolver.resolve("show bridge domain PROD-DB in tenant PROD"), iterations),
+        measure("rag.keyword_search", lambda: rag.get_keyword_index().search(RAG_QUESTIONS[0], k=10), iterations),
+        measure("rag.query", lambda: rag.query_and_retrieve_document.invoke({"query": next(questions)}), iterations),
+    ]
+
+
+def agent_scenarios(iterations: int, llm_latency_ms: float) -> List[dict]:
+    from langgraph.prebuilt import create_react_agent
+    import agent.agent_rag_tool as rag
+    from agent.agent_rest_tool import get_apic, python_repl
+    from agent.registry import discard, get_tool_executor, shared
+    from agent.streaming import stream_events
+
+    shared("llm", lambda: fakes.rag_answer_model(llm_latency_ms))
+    script = fakes.agent_turn_script("Which query parameter limits the response to a subtree class?",
+                                     "/api/node/class/fvBD.json")
+    model = fakes.ScriptedChatModel(script=script, latency_ms=llm_latency_ms)
+    graph = create_react_agent(model, [get_apic, rag.query_and_retrieve_document, python_repl])
+
+    def turn():
+        model.position = 0
+        return graph.invoke({"messages": [("user", "Count the bridge domains")]})
+
+    def first_output():
+        # Stop at the first thing the UI would show; closing the stream ends the turn
+        model.position = 0
+        events = stream_events(graph, {"messages": [("user", "Count the bridge domains")]}, {})
+        try:
+            return next(events)
+        finally:
+            events.close()
+
+    # Eight independent reads in one step, through the same executor as the app
+    executor = get_tool_executor()
+    fan_out = fakes.ScriptedChatModel(script=fakes.fan_out_script(
+        [f"/api/node/mo/uni/tn-tenant{tenant:04d}.json?query-target=children" for tenant in range(8)]
+    ), latency_ms=llm_latency_ms)
+    fan_out_graph = create_react_agent(fan_out, [executor.wrap(get_apic)])
+
+    def fan_out_turn():
+        fan_out.position = 0
+        return fan_out_graph.invoke({"messages": [("user", "List the children of every tenant")]})
+
+    try:
+        return [measure("agent.turn", turn, iterations), measure("agent.first_output", first_output, iterations),
+                measure("agent.parallel_tools_8", fan_out_turn, iterations)]
+    finally:
+        discard("worker_pool")
+
+
+SCENARIOS = ("startup", "mit", "apic", "rag", "agent")
+
+
+def compare(results: List[dict], baseline_path: str) -> None:
+    with open(baseline_path) as baseline_file:
+        baseline = {item["scenario"]: item for item in json.load(baseline_file)["results"]}
+    print(f"\nChange against {baseline_path}:")
+    for result in results:
+        before = baseline.get(result["scenario"])
+        if before is None or "p50_ms" not in result or "p50_ms" not in before:
+            continue
+        deltas = [f"{metric} {100 * (result[metric] - before[metric]) / before[metric]:+.1f}%"
+                  for metric in ("p50_ms", "p99_ms") if before[metric]]
+        print(f"  {result['scenario']:<28} {'  '.join(deltas)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the APIC agent")
+    parser.add_argument("--scale", type=int, default=10000, help="managed objects in the mock APIC (1k to 500k)")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="latency injected into every mock APIC request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="latency of every fake LLM call")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma-separated subset of {SCENARIOS}")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results written earlier with --output")
+    args = parser.parse_args()
+    selected = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+
+    start = time.perf_counter()
+    store = generate_mit(args.scale)
+    print(f"Generated {len(store)} managed objects in {time.perf_counter() - start:.1f}s")
+    server = MockAPIC(store, args.latency_ms, args.jitter_ms).start()
+    os.environ.update({"APIC_BASE_URL": server.base_url, "APIC_USERNAME": "admin", "APIC_PASSWORD": "benchmark"})
+    os.environ.pop("APIC_SNAPSHOT", None)
+    os.environ.pop("APIC_MIRROR_CLASSES", None)
+    workdir = tempfile.mkdtemp(prefix="apic_agent_bench_")
+    prepare_rag(workdir)
+
+    results: List[dict] = []
+    try:
+        for name in selected:
+            try:
+                if name == "startup":
+                    results += startup_scenarios(max(3, args.iterations // 10))
+                elif name == "mit":
+                    results += mit_scenarios(args.scale, args.iterations)
+                elif name == "apic":
+                    results += apic_scenarios(server, args.iterations)
+                elif name == "rag":
+                    results += rag_scenarios(workdir, args.iterations, args.llm_latency_ms)
+                elif name == "agent":
+                    results += agent_scenarios(max(5, args.iterations // 5), args.llm_latency_ms)
+                else:
+                    parser.error(f"unknown scenario {name!r}")
+            except ImportError as err:
+                print(f"Skipping {name}: {err}")
+    finally:
+        server.stop()
+
+    print(f"\n{'scenario':<28}{'p50 ms':>10}{'p99 ms':>10}{'ops/s':>10}{'items/s':>12}{'peak MB':>9}{'rss MB':>8}")
+    for result in results:
+        if "p50_ms" not in result:
+            print(f"{result['scenario']:<28}{result['seconds']:>9.3f}s")
+            continue
+        print(f"{result['scenario']:<28}{result['p50_ms']:>10.3f}{result['p99_ms']:>10.3f}"
+              f"{result.get('throughput_per_s', ''):>10}{result.get('items_per_s', ''):>12}"
+              f"{result.get('peak_alloc_mb', ''):>9}{result['max_rss_mb'] or '':>8}")
+
+    report = {
+        "config": {key: getattr(args, key) for key in ("scale", "latency_ms", "jitter_ms", "llm_latency_ms", "iterations")},
+        "python": sys.version.split()[0],
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    if args.baseline:
+        compare(results, args.baseline)
+    over_budget = [result["scenario"] for result in results if result.get("within_budget") is False]
+    if over_budget:
+        sys.exit(f"Over the {STARTUP_BUDGET_SECONDS:g}s startup budget: {', '.join(over_budget)}")
+
+
+if __name__ == "__main__":
+    main()
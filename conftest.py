@@ -0,0 +1,53 @@
+import socket
+
+import pytest
+
+from agent.mit_store import MITStore
+
+
+@pytest.fixture
+def store() -> MITStore:
+    """A small tenant tree: two BDs (one with a subnet and a fault), an AP with an EPG, and a leaf node"""
+    store = MITStore()
+    store.add("polUni", {"dn": "uni"})
+    store.add("fvTenant", {"dn": "uni/tn-PROD", "name": "PROD"})
+    store.add("fvBD", {"dn": "uni/tn-PROD/BD-web", "name": "web", "arpFlood": "yes"})
+    store.add("fvBD", {"dn": "uni/tn-PROD/BD-db", "name": "db", "arpFlood": "no"})
+    store.add("fvSubnet", {"dn": "uni/tn-PROD/BD-web/subnet-[10.0.0.1/24]", "ip": "10.0.0.1/24"})
+    store.add("faultInst", {"dn": "uni/tn-PROD/BD-web/fault-F1000", "code": "F1000", "severity": "major"})
+    store.add("fvAp", {"dn": "uni/tn-PROD/ap-app", "name": "app"})
+    store.add("fvAEPg", {"dn": "uni/tn-PROD/ap-app/epg-front", "name": "front"})
+    store.add("fabricNode", {"dn": "topology/pod-1/node-101", "id": "101", "name": "leaf101"})
+    return store
+
+
+@pytest.fixture(scope="session")
+def generated_mit() -> MITStore:
+    from benchmarks.mock_apic import generate_mit
+
+    return generate_mit(1000)
+
+
+@pytest.fixture
+def mock_apic_factory(generated_mit):
+    """Start mock APIC servers over the generated MIT (keyword arguments go to MockAPIC); all are stopped afterwards"""
+    from benchmarks.mock_apic import MockAPIC
+
+    servers = []
+
+    def start(**kwargs):
+        servers.append(MockAPIC(generated_mit, **kwargs).start())
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def refused_url() -> str:
+    """URL of a local port nothing listens on"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
@@ -1,22 +1,7 @@
+# Heavy dependencies (LangGraph, LangChain, the model and tool clients) are imported inside
+# get_agent(), so Streamlit can render the page before they are loaded
+from agent.tracing import TracingCallbackHandler, tracer
 
-# from langchain.agents import AgentExecutor, create_react_agent
-#Using the langgrapgh agent executor
-from langgraph.prebuilt import create_react_agent
-
-from langchain import hub
-from langchain_core.prompts import PromptTemplate
-from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI
-
-from agent.apic_client import APICClient
-from agent.agent_rest_tool import get_apic, python_repl
-from agent.agent_rag_tool import query_and_retrieve_document
-
-
-client = APICClient()
-model = ChatOpenAI(model="qwen-plus", api_key=client.api_key, base_url="https://dashscope-intl.aliyuncs.com/compatible-mode/v1")
-
-tools  = [get_apic, query_and_retrieve_document, python_repl]
 
 template = """
 # Role Definition
@@ -80,10 +65,18 @@ strict security protocols.
       - JSON → CSV/Table
       - Data normalization
 
-→ **Security Restrictions**:
-   - Blocked: File system access, network calls, module imports
-   - Memory limit: 128MB per operation
-   - Timeout: 15 seconds execution
+→ **Restrictions**:
+   - Imports: only bisect, collections, csv, datetime, decimal, fractions, functools, heapq, ipaddress,
+     itertools, json, math, operator, random, re, statistics, string, textwrap and time
+   - Not available: open() and files, eval/exec, getattr, private (_name) attributes
+   - Get APIC data with load(handle) or iter_apic(uri), never over the network yourself
+   - Memory and time are limited per call (PYTHON_MEMORY_MB, PYTHON_TIMEOUT); the worker is restarted when exceeded
+
+## ▶️ Step 4: Configuration Changes (`post_apic_batch`)
+→ **Change Protocol**:
+   1. Call with dry_run=true first and show the user the create/modify/delete diff
+   2. Commit (dry_run=false) only after the user confirms the diff
+   3. Put every object of one change in a single call, so it is applied as one APIC transaction
 
 # Error Management Protocol
 1. Vietnamese Error Messages (for end users):
@@ -138,21 +131,49 @@ Final Output:
 2. Input Sanitization:
    - Validate all API paths
    - Block SQL/XPATH injection patterns
-
-Question:
-{messages}
 """
-prompt_template = PromptTemplate(template=template, input_variables=["messages"])
 
 
-def print_stream(graph, inputs, config):
-    for s in agent.stream(inputs, config, stream_mode="values"):
-        messages = s["messages"][-1]
-        if isinstance(messages, tuple):
-            print(messages)
-        else:
-            messages.pretty_print()
-    return messages.content
+def stream_response(graph, inputs, config, started):
+    """
+    Render one agent turn into the page as it is produced: reply tokens as they are
+    generated, and each tool call as a status box that completes when its result arrives.
+    The time from started (when the query was submitted) to the first visible output is
+    recorded on the ui.turn span and in the time-to-first-output metric.
+    """
+    from agent.streaming import stream_events
+    from agent.registry import get_tool_executor
+
+    # Leaving the turn early (an error, or the user stopping the page) cancels its outstanding tool calls
+    with tracer.span("ui.turn") as span, get_tool_executor().turn(config["configurable"]["thread_id"]):
+        output, text, answer = st.empty(), "", ""
+        calls = {}
+        for kind, value in stream_events(graph, inputs, config):
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 3)
+            if "first_output_ms" not in span.attributes:
+                span.set(first_output_ms=elapsed_ms)
+            if kind == "token":
+                if "first_token_ms" not in span.attributes:
+                    span.set(first_token_ms=elapsed_ms)
+                text += value
+                output.markdown(text + "▌")
+            elif kind == "tool_call":
+                # Text written before a tool call stays above its status box
+                output.markdown(text)
+                status = calls[value["id"]] = st.status(f"🔧 Running `{value['name']}`...")
+                status.json(value["args"])
+                output, text = st.empty(), ""
+            elif kind == "tool_result":
+                status = calls.get(value.tool_call_id)
+                if status is not None:
+                    failed = value.status == "error"
+                    status.update(label=f"{'❌' if failed else '✅'} `{value.name}`", state="error" if failed else "complete",
+                                  expanded=False)
+            elif kind == "answer":
+                answer = value
+                output.markdown(answer)
+        span.set(tool_calls=len(calls))
+    return answer
 
 
 #----------------------------------------------------------
@@ -161,25 +182,47 @@ def print_stream(graph, inputs, config):
 import streamlit as st
 from dotenv import set_key, load_dotenv
 import os
-#Build the chat memory to agent
-from langgraph.checkpoint.memory import MemorySaver
+import time
+import uuid
 
-# Cache memory checkpointer so that it is created once throughout the session.
+# Cache the checkpointer and the agent so that they are created once and shared by every session
+# and rerun. Conversations are kept apart by thread_id; CHECKPOINT_BACKEND picks in-memory or SQLite storage.
 @st.cache_resource
 def get_memory():
-    return MemorySaver()
-
-memory = get_memory()
+    #Build the chat memory to agent
+    from agent.checkpoints import create_checkpointer
+    return create_checkpointer()
 
-# Create the Langgraph agent with the cached checkpointer.
-agent = create_react_agent(model, tools, prompt=prompt_template, checkpointer=memory)
-
-
-# Assign a unique thread_id for the user session
+@st.cache_resource
+def get_agent():
+    # from langchain.agents import AgentExecutor, create_react_agent
+    #Using the langgrapgh agent executor
+    from langgraph.prebuilt import create_react_agent
+
+    from agent.registry import get_chat_model, get_tool_executor
+    from agent.agent_rest_tool import get_apic, get_apic_batch, get_apic_fabrics, post_apic_batch, python_repl
+    from agent.agent_rag_tool import query_and_retrieve_document
+
+    # Independent calls of one step run concurrently, within per-tool limits and timeouts
+    executor = get_tool_executor()
+    tools = [executor.wrap(t) for t in (get_apic, get_apic_batch, get_apic_fabrics, post_apic_batch,
+                                          query_and_retrieve_document, python_repl)]
+    from agent.context import context_hook
+    # The hook puts the system prompt ahead of the bounded history, so every call of a turn shares the
+    # same cacheable prefix; a note on dropped turns is appended to the prompt rather than sent separately
+    return create_react_agent(get_chat_model(), tools, pre_model_hook=context_hook(template),
+                              checkpointer=get_memory())
+
+
+# Assign a unique thread_id for the user session, kept in the URL so a reload resumes the conversation
 if "thread_id" not in st.session_state:
-    st.session_state.thread_id = "unique_session_id"  # Could also use a generated UUID
+    st.session_state.thread_id = st.query_params.get("thread") or uuid.uuid4().hex
+    st.query_params["thread"] = st.session_state.thread_id
 
-config = {"configurable": {"thread_id": st.session_state.thread_id}}
+# Spans of every agent step, tool call and LLM call go to TRACE_FILE and the metrics endpoint
+config = {"configurable": {"thread_id": st.session_state.thread_id}, "callbacks": [TracingCallbackHandler()]}
+if os.getenv("METRICS_PORT"):
+    tracer.serve_metrics(int(os.getenv("METRICS_PORT")))
 
 # Initialize chat message history in session_state
 if "messages" not in st.session_state:
@@ -196,6 +239,13 @@ def save_to_env(apic_ip, username, password):
     set_key(".env", "APIC_BASE_URL", apic_ip)
     set_key(".env", "APIC_USERNAME", username)
     set_key(".env", "APIC_PASSWORD", password)
+    os.environ.update({"APIC_BASE_URL": apic_ip, "APIC_USERNAME": username, "APIC_PASSWORD": password})
+    # The next tool call logs in to the new controller
+    from agent.registry import discard
+    discard("apic_mirror")
+    discard("apic_batch_runner")
+    discard("apic_client")
+    discard("fabric_clients")
     st.success("✅ Credentials saved successfully to `.env` file!")
 
 # Main function for the Streamlit app
@@ -253,19 +303,19 @@ def main():
         if query.strip() == "":
             st.warning("⚠️ Please enter a query.")
         else:
-            # Simulate agent invocation
-            with st.spinner("⏳ Processing your query..."):
-                try:
-                    #Config the chat memory
-                    inputs = {"messages": [("user", query)]}
-                    # Generate a response from the agent
-                    response = print_stream(agent, inputs, config)
-                    st.success("✅ Query executed successfully!")
-                    st.subheader("🔍 Response:")
-                    st.write(response)
-                    #st.code(output, language="plaintext")  # Display response in a code block
-                except Exception as e:
-                    st.error(f"❌ An error occurred: {str(e)}")
+            try:
+                started = time.perf_counter()
+                #Config the chat memory
+                inputs = {"messages": [("user", query)]}
+                # The agent is built on the first query of the process
+                with st.spinner("⏳ Processing your query..."):
+                    graph = get_agent()
+                st.subheader("🔍 Response:")
+                # Stream the response into the page as the agent produces it
+                stream_response(graph, inputs, config, started)
+                st.success("✅ Query executed successfully!")
+            except Exception as e:
+                st.error(f"❌ An error occurred: {str(e)}")
 
 # Run the Streamlit app
 if __name__ == "__main__":
@@ -0,0 +1,149 @@
+import json
+
+import pytest
+import requests
+
+from agent.apic_batch import WriteBatch
+from agent.apic_cache import ResponseCache
+from agent.apic_client import APICClient
+from agent.registry import discard, register
+
+TENANT = "uni/tn-tenant0000"
+
+
+def test_build_wraps_objects_in_their_common_ancestor():
+    batch = WriteBatch(client=None)
+    batch.add({"fvBD": {"attributes": {"dn": f"{TENANT}/BD-web", "arpFlood": "yes"}}})
+    batch.add({"fvAEPg": {"attributes": {"name": "front"}}}, uri=f"/api/mo/{TENANT}/ap-app/epg-front.json")
+    uri, payload = batch.build()
+    assert uri == f"/api/mo/{TENANT}.json"
+    tenant = payload["fvTenant"]
+    assert tenant["attributes"] == {"dn": TENANT, "status": "modified"}
+    bd, ap = tenant["children"]
+    assert bd["fvBD"]["attributes"]["arpFlood"] == "yes"
+    assert ap["fvAp"]["attributes"]["status"] == "modified"
+    assert ap["fvAp"]["children"][0]["fvAEPg"]["attributes"]["dn"] == f"{TENANT}/ap-app/epg-front"
+
+
+def test_single_object_is_posted_to_its_parent():
+    batch = WriteBatch(client=None)
+    batch.add({"fvTenant": {"attributes": {"dn": TENANT, "status": "deleted"}}})
+    uri, payload = batch.build()
+    assert uri == "/api/mo/uni.json"
+    assert payload["polUni"]["children"][0]["fvTenant"]["attributes"]["status"] == "deleted"
+
+
+def test_repeated_writes_to_one_object_are_merged():
+    batch = WriteBatch(client=None)
+    batch.add({"fvBD": {"attributes": {"dn": f"{TENANT}/BD-web", "arpFlood": "yes"}}})
+    batch.add({"fvBD": {"attributes": {"dn": f"{TENANT}/BD-web", "descr": "web"}}})
+    assert len(batch) == 1
+    assert batch.objects[f"{TENANT}/BD-web"][1]["attributes"] == {"dn": f"{TENANT}/BD-web", "arpFlood": "yes", "descr": "web"}
+
+
+@pytest.mark.parametrize("payloads", [
+    [{"fvBD": {"attributes": {"name": "web"}}}],
+    [{"fvTenant": {"attributes": {"dn": TENANT}}}, {"fabricNode": {"attributes": {"dn": "topology/pod-1/node-101"}}}],
+])
+def test_invalid_batches_are_rejected(payloads):
+    batch = WriteBatch(client=None)
+    with pytest.raises(ValueError):
+        for payload in payloads:
+            batch.add(payload)
+        batch.build()
+
+
+def test_diff_against_the_controller(mock_apic_factory, generated_mit):
+    client = APICClient(base_url=mock_apic_factory().base_url)
+    batch = client.batch()
+    batch.add({"fvBD": {"attributes": {"dn": f"{TENANT}/BD-bd00", "descr": "web"}}})
+    batch.add({"fvBD": {"attributes": {"dn": f"{TENANT}/BD-bd01", "name": "bd01"}}})
+    batch.add({"fvBD": {"attributes": {"dn": f"{TENANT}/BD-new", "name": "new"}}})
+    batch.add({"fvBD": {"attributes": {"dn": f"{TENANT}/BD-bd02", "status": "deleted"}}})
+    result = batch.diff()
+    actions = {item["dn"].rsplit("/", 1)[-1]: item for item in result["objects"]}
+    assert actions["BD-bd00"]["action"] == "modify"
+    assert actions["BD-bd00"]["changes"] == {"descr": {"old": None, "new": "web"}}
+    assert actions["BD-bd01"]["action"] == "unchanged"
+    assert actions["BD-new"]["action"] == "create"
+    assert actions["BD-bd02"]["action"] == "delete"
+    # A dry run writes nothing
+    assert len(batch) == 4
+
+
+def test_commit_posts_once_and_invalidates_the_cache(mock_apic_factory):
+    server = mock_apic_factory()
+    client = APICClient(base_url=server.base_url)
+    client.cache = ResponseCache(default_ttl=60)
+    client.get_resource(f"/api/node/mo/{TENANT}/BD-bd00.json")
+    sent = server.requests
+    batch = client.batch()
+    batch.add({"fvBD": {"attributes": {"dn": f"{TENANT}/BD-bd00", "descr": "web"}}})
+    batch.add({"fvBD": {"attributes": {"dn": f"{TENANT}/BD-bd01", "descr": "db"}}})
+    result = batch.commit()
+    assert result["success"] and [item["status"] for item in result["objects"]] == ["ok", "ok"]
+    assert server.requests == sent + 1
+    assert client.cache.stats()["entries"] == 0
+    assert len(batch) == 0
+
+
+class RejectingClient:
+    """Client whose APIC rejects every POST with an error naming one object"""
+    base_url = "https://apic"
+
+    def __init__(self, dn):
+        self.dn = dn
+        self.cache = ResponseCache(default_ttl=60)
+
+    def _request(self, method, full_url, **kwargs):
+        response = requests.Response()
+        response.status_code = 400
+        error = {"code": "103", "text": f"Property arpFlood of {self.dn} failed validation"}
+        response._content = json.dumps({"imdata": [{"error": {"attributes": error}}]}).encode()
+        return response
+
+
+def test_failed_commit_points_at_the_culprit():
+    batch = WriteBatch(RejectingClient(f"{TENANT}/BD-bd01"))
+    for name in ("bd00", "bd01"):
+        batch.add({"fvBD": {"attributes": {"dn": f"{TENANT}/BD-{name}", "arpFlood": "maybe"}}})
+    result = batch.commit()
+    assert not result["success"] and "failed validation" in result["error"]
+    assert [item["status"] for item in result["objects"]] == ["rolled-back", "failed"]
+
+
+#------------------------- post_apic_batch tool -------------------------
+
+@pytest.fixture
+def tool_client(mock_apic_factory):
+    """The mock APIC installed as the client the agent's tools use"""
+    server = mock_apic_factory()
+    client = APICClient(base_url=server.base_url)
+    client.cache = ResponseCache(default_ttl=0)
+    register("apic_client", client)
+    yield server
+    discard("apic_client")
+
+
+def test_post_apic_batch_dry_run_returns_the_diff(tool_client):
+    from agent.agent_rest_tool import post_apic_batch
+
+    payloads = [{"fvBD": {"attributes": {"dn": f"{TENANT}/BD-bd00", "descr": "web"}}}]
+    result = post_apic_batch.invoke({"payloads": payloads, "dry_run": True})
+    assert "success" not in result
+    assert [item["action"] for item in result["objects"]] == ["modify"]
+    assert result["objects"][0]["changes"] == {"descr": {"old": None, "new": "web"}}
+
+
+def test_post_apic_batch_commits_and_reports_invalid_payloads(tool_client):
+    from agent.agent_rest_tool import post_apic_batch
+
+    payloads = [{"fvBD": {"attributes": {"dn": f"{TENANT}/BD-bd{index:02d}", "descr": "web"}}} for index in range(3)]
+    sent = tool_client.requests
+    result = post_apic_batch.invoke({"payloads": payloads})
+    assert result["success"] and [item["status"] for item in result["objects"]] == ["ok"] * 3
+    # One transaction for the three objects (plus the login of a new client)
+    assert tool_client.requests - sent <= 2
+    # A payload without a dn comes back as an error for the agent instead of raising
+    result = post_apic_batch.invoke({"payloads": [{"fvBD": {"attributes": {"name": "web"}}}]})
+    assert result["success"] is False and result["error"]
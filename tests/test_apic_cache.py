@@ -0,0 +1,97 @@
+import json
+import time
+
+from agent.apic_cache import ResponseCache, deletes_subtree, payload_classes
+
+
+def body(*dns):
+    return json.dumps({"totalCount": str(len(dns)), "imdata": [{"fvBD": {"attributes": {"dn": dn}}} for dn in dns]}).encode()
+
+
+def cache_of(*uris):
+    cache = ResponseCache(max_bytes=1 << 20, default_ttl=60)
+    for uri in uris:
+        cache.put(uri, body("uni/tn-a/BD-x"))
+    return cache
+
+
+def cached(cache, uri):
+    return cache._entries.get(cache.make_key(uri)) is not None
+
+
+def test_equivalent_uris_share_an_entry():
+    cache = cache_of("/api/node/class/fvBD.json?page=0&page-size=10")
+    assert cache.get("/api/node/class/fvBD.json?page-size=10&page=0") is not None
+    assert cache.stats()["hits"] == 1
+
+
+def test_get_returns_an_independent_copy():
+    cache = cache_of("/api/node/class/fvBD.json")
+    first = cache.get("/api/node/class/fvBD.json")
+    first["imdata"][0]["fvBD"]["attributes"]["dn"] = "changed"
+    first["imdata"].clear()
+    assert cache.get("/api/node/class/fvBD.json")["imdata"][0]["fvBD"]["attributes"]["dn"] == "uni/tn-a/BD-x"
+
+
+def test_entries_expire_with_the_class_ttl():
+    cache = ResponseCache(max_bytes=1 << 20, default_ttl=60, class_ttls={"faultInst": 0.05})
+    cache.put("/api/node/class/faultInst.json", body())
+    cache.put("/api/node/class/fvBD.json", body())
+    time.sleep(0.06)
+    assert cache.get("/api/node/class/faultInst.json") is None
+    assert cache.get("/api/node/class/fvBD.json") is not None
+
+
+def test_lru_eviction_bounds_the_size():
+    data = body("uni/tn-a/BD-x")
+    cache = ResponseCache(max_bytes=len(data) * 2, default_ttl=60)
+    cache.put("/api/node/mo/uni/tn-a.json", data)
+    cache.put("/api/node/mo/uni/tn-b.json", data)
+    cache.get("/api/node/mo/uni/tn-a.json")
+    cache.put("/api/node/mo/uni/tn-c.json", data)
+    assert cached(cache, "/api/node/mo/uni/tn-a.json") and not cached(cache, "/api/node/mo/uni/tn-b.json")
+    assert cache.stats()["evictions"] == 1
+
+
+def test_subscriptions_are_not_cacheable():
+    assert not ResponseCache(default_ttl=60).cacheable("/api/class/fvBD.json?subscription=yes")
+    assert not ResponseCache(default_ttl=0).cacheable("/api/class/fvBD.json")
+
+
+def test_write_invalidates_overlapping_dns_and_written_classes():
+    cache = cache_of(
+        "/api/node/mo/uni/tn-a.json", "/api/node/mo/uni/tn-a/BD-x.json", "/api/node/mo/uni.json?query-target=subtree",
+        "/api/node/mo/uni/tn-b.json", "/api/node/class/fvBD.json", "/api/node/class/fvAEPg.json",
+    )
+    cache.invalidate_write("/api/node/mo/uni/tn-a/BD-x.json", {"fvBD": {"attributes": {"descr": "new"}}})
+    assert not cached(cache, "/api/node/mo/uni/tn-a.json")
+    assert not cached(cache, "/api/node/mo/uni/tn-a/BD-x.json")
+    assert not cached(cache, "/api/node/mo/uni.json?query-target=subtree")
+    assert not cached(cache, "/api/node/class/fvBD.json")
+    assert cached(cache, "/api/node/mo/uni/tn-b.json")
+    assert cached(cache, "/api/node/class/fvAEPg.json")
+
+
+def test_delete_invalidates_class_queries_of_descendants():
+    cache = cache_of("/api/node/class/fvBD.json", "/api/node/class/fvAEPg.json", "/api/node/class/topology/pod-1/fabricNode.json")
+    stale = cache.invalidate_write("/api/node/mo/uni/tn-a.json", {"fvTenant": {"attributes": {"status": "deleted"}}})
+    assert stale == 2
+    assert not cached(cache, "/api/node/class/fvBD.json")
+    assert not cached(cache, "/api/node/class/fvAEPg.json")
+    # Class queries scoped to another subtree are not affected
+    assert cached(cache, "/api/node/class/topology/pod-1/fabricNode.json")
+
+
+def test_write_outside_an_mo_clears_everything():
+    cache = cache_of("/api/node/class/fvBD.json", "/api/node/mo/uni/tn-b.json")
+    assert cache.invalidate_write("/api/node/class/fvBD.json", {}) == 2
+    assert cache.stats()["entries"] == 0 and cache.total_bytes == 0
+
+
+def test_payload_helpers():
+    payload = {"fvTenant": {"attributes": {"name": "a"}, "children": [
+        {"fvBD": {"attributes": {"name": "x"}, "children": [{"fvSubnet": {"attributes": {"status": "deleted"}}}]}},
+    ]}}
+    assert payload_classes(payload) == {"fvTenant", "fvBD", "fvSubnet"}
+    assert deletes_subtree(payload)
+    assert not deletes_subtree({"fvTenant": {"attributes": {"status": "created,modified"}}})
@@ -0,0 +1,185 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+import pytest
+import requests
+
+from agent.apic_cache import ResponseCache
+from agent.apic_client import TOKEN_REFRESH_MARGIN, APICClient
+from agent.apic_control import is_error
+
+TENANTS = [f"/api/node/mo/uni/tn-tenant{index:04d}.json" for index in range(16)]
+
+
+@pytest.fixture
+def client_of():
+    """Build APICClients without response caching; their sessions are closed afterwards"""
+    clients = []
+
+    def build(server, **kwargs):
+        clients.append(APICClient(base_url=server.base_url, **kwargs))
+        clients[-1].cache = ResponseCache(default_ttl=0)
+        return clients[-1]
+
+    yield build
+    for client in clients:
+        client.close()
+
+
+#------------------------- pooled transport -------------------------
+
+def test_sequential_calls_reuse_one_connection(client_of, mock_apic_factory):
+    server = mock_apic_factory()
+    client = client_of(server)
+    assert all(not is_error(client.get_resource(uri)) for uri in TENANTS)
+    assert server.requests == len(TENANTS) + 1
+    assert server.connections == 1
+
+
+def test_concurrent_calls_stay_within_the_pool(client_of, mock_apic_factory):
+    server = mock_apic_factory(latency_ms=20)
+    client = client_of(server, pool_size=4)
+    with ThreadPoolExecutor(max_workers=16) as callers:
+        results = list(callers.map(client.get_resource, TENANTS * 2))
+    assert all(not is_error(result) for result in results)
+    assert server.connections <= 4
+    assert client.control.limiter.in_flight == 0
+
+
+#------------------------- tokens -------------------------
+
+def test_token_is_refreshed_shortly_before_it_expires(client_of, mock_apic_factory):
+    server = mock_apic_factory()
+    client = client_of(server)
+    assert not is_error(client.get_resource(TENANTS[0]))
+    client.token_expiry = time.monotonic() + TOKEN_REFRESH_MARGIN - 1
+    assert not is_error(client.get_resource(TENANTS[1]))
+    assert (server.logins, server.refreshes) == (1, 1)
+    # The refreshed token lasts for the lifetime the controller announced
+    assert client.token_expiry > time.monotonic() + 500
+
+
+def test_failed_refresh_falls_back_to_a_login(client_of, mock_apic_factory):
+    server = mock_apic_factory()
+    client = client_of(server)
+    client._ensure_token()
+    server.expire_tokens()
+    client.token_expiry = time.monotonic()
+    assert not is_error(client.get_resource(TENANTS[0]))
+    assert (server.logins, server.refreshes) == (2, 0)
+
+
+def test_rejected_token_logs_in_again_once(client_of, mock_apic_factory):
+    server = mock_apic_factory(latency_ms=10)
+    client = client_of(server, pool_size=8)
+    client._ensure_token()
+    server.expire_tokens()
+    with ThreadPoolExecutor(max_workers=8) as callers:
+        results = list(callers.map(client.get_resource, TENANTS))
+    assert all(not is_error(result) for result in results)
+    # Every caller that was rejected retries, but only the first logs in again
+    assert server.logins == 2
+
+
+def test_rejected_token_on_a_write_logs_in_again(client_of, mock_apic_factory):
+    server = mock_apic_factory()
+    client = client_of(server)
+    client._ensure_token()
+    server.expire_tokens()
+    assert not is_error(client.post_resouce("/api/mo/uni.json", {"fvTenant": {"attributes": {"name": "t"}}}))
+    assert server.logins == 2
+
+
+#------------------------- paging -------------------------
+
+@pytest.fixture
+def sent_pages(monkeypatch):
+    """Record the query parameters of every GET an APICClient sends"""
+    pages = []
+    request = APICClient._request
+
+    def spy(self, method, full_url, **kwargs):
+        pages.append(dict(parse_qsl(urlsplit(full_url).query)))
+        return request(self, method, full_url, **kwargs)
+
+    monkeypatch.setattr(APICClient, "_request", spy)
+    return pages
+
+
+def dns(mos):
+    return [next(iter(mo.values()))["attributes"]["dn"] for mo in mos]
+
+
+def test_iter_resource_pages_through_a_class_in_dn_order(client_of, mock_apic_factory, generated_mit, sent_pages):
+    client = client_of(mock_apic_factory())
+    mos = list(client.iter_resource("/api/node/class/fvBD.json", page_size=7))
+    expected = dns(generated_mit.query("/api/node/class/fvBD.json")["imdata"])
+    assert len(expected) == 160
+    assert dns(mos) == sorted(expected)
+    # 22 full pages and a short last one that ends the iteration
+    assert [page["page"] for page in sent_pages] == [str(index) for index in range(23)]
+    assert all(page["order-by"] == "fvBD.dn" and page["page-size"] == "7" for page in sent_pages)
+
+
+def test_iter_resource_stops_at_the_total_count(client_of, mock_apic_factory, sent_pages):
+    client = client_of(mock_apic_factory())
+    assert len(list(client.iter_resource("/api/node/class/fvBD.json", page_size=8))) == 160
+    # The last page is full, but totalCount says there is nothing after it
+    assert len(sent_pages) == 20
+
+
+def test_iter_resource_orders_subtree_queries_by_the_target_class(client_of, mock_apic_factory, sent_pages):
+    client = client_of(mock_apic_factory())
+    uri = "/api/node/mo/uni/tn-tenant0000.json?query-target=children&target-subtree-class=fvBD"
+    assert len(list(client.iter_resource(uri, page_size=6))) == 20
+    assert {page["order-by"] for page in sent_pages} == {"fvBD.dn"}
+    assert sent_pages[0]["query-target"] == "children"
+
+
+def test_iter_resource_keeps_the_callers_order_and_drops_its_paging(client_of, mock_apic_factory, sent_pages):
+    client = client_of(mock_apic_factory())
+    mos = list(client.iter_resource("/api/node/class/fvBD.json?order-by=fvBD.dn|desc&page=3&page-size=2", page_size=50))
+    assert dns(mos) == sorted(dns(mos), reverse=True) and len(mos) == 160
+    assert sent_pages[0] == {"order-by": "fvBD.dn|desc", "page": "0", "page-size": "50"}
+
+
+def test_iter_resource_halves_pages_over_the_memory_cap(client_of, mock_apic_factory, generated_mit, sent_pages):
+    client = client_of(mock_apic_factory())
+    # Room for a page of up to three BDs: pages of eight and four go over the cap
+    cap = len(json.dumps(generated_mit.query("/api/node/class/fvBD.json?page=0&page-size=3")))
+    mos = list(client.iter_resource("/api/node/class/fvBD.json", page_size=8, max_page_bytes=cap))
+    assert dns(mos) == sorted(dns(generated_mit.query("/api/node/class/fvBD.json")["imdata"]))
+    sizes = [int(page["page-size"]) for page in sent_pages]
+    assert sizes[:3] == [8, 4, 2] and set(sizes[3:]) == {2}
+    # Pages that went over the cap were requested again from the same offset
+    assert [int(page["page"]) * size for page, size in zip(sent_pages, sizes)][:4] == [0, 0, 0, 2]
+
+
+def test_iter_resource_fetches_single_objects_past_the_cap(client_of, mock_apic_factory, sent_pages):
+    client = client_of(mock_apic_factory())
+    mos = list(client.iter_resource("/api/node/class/fvBD.json", page_size=4, max_page_bytes=10))
+    # No page fits, so it falls back to one object per page, which is never capped
+    assert len(mos) == 160
+    assert [page["page-size"] for page in sent_pages[:3]] == ["4", "2", "1"]
+
+
+def test_iter_resource_raises_http_errors(client_of, mock_apic_factory, monkeypatch):
+    monkeypatch.setenv("APIC_MAX_RETRIES", "0")
+    client = client_of(mock_apic_factory(fail_status=503))
+    with pytest.raises(requests.exceptions.HTTPError):
+        next(client.iter_resource("/api/node/class/fvBD.json"))
+
+
+#------------------------- errors -------------------------
+
+def test_failed_calls_are_logged_not_printed(client_of, mock_apic_factory, caplog, capsys, monkeypatch):
+    monkeypatch.setenv("APIC_MAX_RETRIES", "0")
+    server = mock_apic_factory(fail_status=502)
+    client = client_of(server)
+    with caplog.at_level("WARNING", logger="agent.apic_client"):
+        assert client.get_resource(TENANTS[0])["error"]["status"] == 502
+        assert client.post_resouce("/api/mo/uni.json", {})["error"]["status"] == 502
+    assert caplog.text.count("HTTP error: 502") == 2
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,248 @@
+import time
+
+import pytest
+import requests
+
+from agent import apic_cluster
+from agent.apic_cache import ResponseCache
+from agent.apic_cluster import APICCluster, _refused, merge_fabric_results
+from agent.apic_control import is_error
+from agent.async_apic_client import AsyncBatchRunner
+
+TENANT = "/api/node/mo/uni/tn-tenant0000.json"
+
+
+@pytest.fixture
+def cluster_of(monkeypatch):
+    """Build APICClusters with fast retries; their probes are stopped afterwards"""
+    monkeypatch.setenv("APIC_MAX_RETRIES", "1")
+    monkeypatch.setenv("APIC_RETRY_BASE", "0.01")
+    clusters = []
+
+    def build(*urls, **kwargs):
+        clusters.append(APICCluster(list(urls), **kwargs))
+        return clusters[-1]
+
+    yield build
+    for cluster in clusters:
+        cluster.close()
+
+
+def prefer(cluster, index):
+    """Make controller index the first choice for reads"""
+    for position, controller in enumerate(cluster.controllers):
+        controller.latency = 0.001 if position == index else 1.0
+
+
+#------------------------- read order -------------------------
+
+def test_reads_prefer_the_lowest_expected_wait(cluster_of):
+    cluster = cluster_of("http://a", "http://b", "http://c")
+    a, b, c = cluster.controllers
+    a.latency, b.latency, c.latency = 0.05, 0.01, 0.02
+    assert cluster._read_order() == [b, c, a]
+    # Requests in flight multiply the expected wait
+    b.in_flight = 9
+    assert cluster._read_order() == [c, a, b]
+    # Ejected controllers come last, soonest probe first
+    c.ejected, c.retry_at = True, 10.0
+    a.ejected, a.retry_at = True, 5.0
+    assert cluster._read_order() == [b, a, c]
+    assert cluster.reader() is b.client
+
+
+def test_writes_keep_configured_order(cluster_of):
+    cluster = cluster_of("http://a", "http://b", "http://c")
+    a, b, c = cluster.controllers
+    c.latency = 0.001
+    assert cluster._write_order() == [a, b, c]
+    a.ejected = True
+    assert cluster._write_order() == [b, c, a]
+
+
+#------------------------- read failover -------------------------
+
+def test_throttled_read_fails_over_without_ejecting(cluster_of, mock_apic_factory):
+    throttling, healthy = mock_apic_factory(max_concurrent=0), mock_apic_factory()
+    cluster = cluster_of(throttling.base_url, healthy.base_url)
+    prefer(cluster, 0)
+    assert not is_error(cluster.get_resource(TENANT))
+    assert throttling.throttled == 1
+    assert not cluster.controllers[0].ejected
+
+
+@pytest.mark.parametrize("status", [502, 503, 504])
+def test_failing_read_fails_over_and_ejects(cluster_of, mock_apic_factory, status):
+    failing, healthy = mock_apic_factory(fail_status=status), mock_apic_factory()
+    cluster = cluster_of(failing.base_url, healthy.base_url)
+    prefer(cluster, 0)
+    assert not is_error(cluster.get_resource(TENANT))
+    assert cluster.controllers[0].ejected
+    assert not cluster.controllers[1].ejected
+    # The ejected controller is not asked again while it is out
+    sent = failing.requests
+    assert not is_error(cluster.get_resource("/api/node/mo/uni/tn-tenant0001.json"))
+    assert failing.requests == sent
+
+
+def test_refused_read_fails_over(cluster_of, mock_apic_factory, refused_url):
+    healthy = mock_apic_factory()
+    cluster = cluster_of(refused_url, healthy.base_url)
+    prefer(cluster, 0)
+    assert not is_error(cluster.get_resource(TENANT))
+    assert cluster.controllers[0].ejected
+
+
+def test_refused_is_decided_by_the_exception_type(refused_url):
+    with pytest.raises(requests.exceptions.ConnectionError) as refused:
+        requests.get(refused_url, timeout=5)
+    assert _refused(refused.value)
+    # The message alone does not make an error a refused connection
+    assert not _refused(requests.exceptions.ConnectionError("Connection refused by a proxy after sending"))
+    assert not _refused(requests.exceptions.ReadTimeout("NewConnectionError"))
+
+
+def test_bad_request_is_not_failed_over(cluster_of, mock_apic_factory):
+    first, second = mock_apic_factory(), mock_apic_factory()
+    cluster = cluster_of(first.base_url, second.base_url)
+    prefer(cluster, 0)
+    assert cluster.get_resource("/api/node/class/fvBD.json?query-target-filter=eq(")["error"]["status"] == 400
+    assert second.requests == 0
+
+
+#------------------------- writes -------------------------
+
+def test_write_is_retried_on_a_refused_connection(cluster_of, mock_apic_factory, refused_url):
+    healthy = mock_apic_factory()
+    cluster = cluster_of(refused_url, healthy.base_url)
+    assert not is_error(cluster.post_resouce("/api/mo/uni.json", {"fvTenant": {"attributes": {"name": "t"}}}))
+    assert cluster.controllers[0].ejected
+    assert healthy.requests > 0
+
+
+def test_write_is_not_retried_on_an_error_response(cluster_of, mock_apic_factory):
+    failing, healthy = mock_apic_factory(fail_status=502), mock_apic_factory()
+    cluster = cluster_of(failing.base_url, healthy.base_url)
+    assert cluster.post_resouce("/api/mo/uni.json", {"fvTenant": {"attributes": {"name": "t"}}})["error"]["status"] == 502
+    assert healthy.requests == 0
+
+
+def test_write_is_not_retried_after_it_was_sent(cluster_of, mock_apic_factory):
+    slow, healthy = mock_apic_factory(), mock_apic_factory()
+    cluster = cluster_of(slow.base_url, healthy.base_url, timeout=0.2)
+    cluster.controllers[0].client._ensure_token()
+    # The write reaches the controller but the answer times out: it may have been applied
+    slow.latency_ms = 500
+    assert is_error(cluster.post_resouce("/api/mo/uni.json", {"fvTenant": {"attributes": {"name": "t"}}}))
+    assert healthy.requests == 0
+
+
+#------------------------- ejection and probes -------------------------
+
+def test_ejection_backoff_doubles_up_to_the_maximum(cluster_of):
+    controller = cluster_of("http://a").controllers[0]
+    backoffs = [APICCluster._backoff(controller) for _ in range(8)]
+    assert backoffs == [5.0, 10.0, 20.0, 40.0, 80.0, 120.0, 120.0, 120.0]
+    assert controller.retry_at > time.monotonic() + 100
+
+
+def test_probe_returns_a_controller_to_service(cluster_of, mock_apic_factory, monkeypatch):
+    monkeypatch.setattr(apic_cluster, "EJECT_SECONDS", 0.05)
+    server = mock_apic_factory()
+    cluster = cluster_of(server.base_url)
+    controller = cluster.controllers[0]
+    cluster._eject(controller, RuntimeError("test"))
+    assert controller.ejected
+    controller.probe.join(timeout=5)
+    assert not controller.ejected and controller.failures == 0
+
+
+def test_close_stops_the_probes(cluster_of, refused_url, monkeypatch):
+    monkeypatch.setattr(apic_cluster, "EJECT_SECONDS", 0.05)
+    cluster = cluster_of(refused_url)
+    controller = cluster.controllers[0]
+    cluster._eject(controller, RuntimeError("test"))
+    time.sleep(0.2)
+    assert controller.probe.is_alive() and controller.ejected
+    cluster.close()
+    controller.probe.join(timeout=5)
+    assert not controller.probe.is_alive()
+
+
+#------------------------- batches -------------------------
+
+def test_batch_is_spread_over_the_controllers(cluster_of, mock_apic_factory):
+    servers = [mock_apic_factory() for _ in range(3)]
+    cluster = cluster_of(*(server.base_url for server in servers))
+    cluster.cache = None
+    runner = AsyncBatchRunner(cluster)
+    try:
+        uris = [f"/api/node/mo/uni/tn-tenant{index:04d}.json" for index in range(12)]
+        results = runner.get_many(uris)
+    finally:
+        runner.close()
+    assert all(not is_error(result) for result in results.values())
+    assert all(server.requests >= 4 for server in servers)
+
+
+def test_batch_fails_over_from_a_failing_controller(cluster_of, mock_apic_factory):
+    failing, healthy = mock_apic_factory(fail_status=503), mock_apic_factory()
+    cluster = cluster_of(failing.base_url, healthy.base_url)
+    cluster.cache = None
+    runner = AsyncBatchRunner(cluster)
+    try:
+        results = runner.get_many([f"/api/node/mo/uni/tn-tenant{index:04d}.json" for index in range(6)])
+    finally:
+        runner.close()
+    assert all(not is_error(result) for result in results.values())
+    assert cluster.controllers[0].ejected
+
+
+#------------------------- fabrics -------------------------
+
+def test_merge_fabric_results():
+    merged = merge_fabric_results({
+        "dc1": {"totalCount": "1", "imdata": [{"fvTenant": {"attributes": {"dn": "uni/tn-a"}}}]},
+        "dc2": {"totalCount": "2", "imdata": [
+            {"fvTenant": {"attributes": {"dn": "uni/tn-b"}}}, {"fvTenant": {"attributes": {"dn": "uni/tn-c"}}},
+        ]},
+        "dc3": {"error": {"status": 503, "text": "down", "retryable": True}},
+        "dc4": None,
+    })
+    assert merged["totalCount"] == "3"
+    assert [mo["fvTenant"]["attributes"]["fabric"] for mo in merged["imdata"]] == ["dc1", "dc2", "dc2"]
+    assert merged["failedFabrics"] == ["dc3", "dc4"]
+    assert merged["fabricErrors"] == {"dc3": {"status": 503, "text": "down", "retryable": True}}
+    assert "failedFabrics" not in merge_fabric_results({"dc1": {"totalCount": "0", "imdata": []}})
+
+
+#------------------------- client-side limits -------------------------
+
+def test_own_rate_limit_does_not_eject_controllers(cluster_of, mock_apic_factory, monkeypatch):
+    monkeypatch.setenv("APIC_RATE_LIMIT", "1")
+    monkeypatch.setenv("APIC_RATE_BURST", "1")
+    monkeypatch.setenv("APIC_MAX_RETRIES", "0")
+    servers = [mock_apic_factory(), mock_apic_factory()]
+    cluster = cluster_of(*(server.base_url for server in servers), timeout=0.3)
+    cluster.cache = ResponseCache(default_ttl=0)
+    results = [cluster.get_resource(f"/api/node/mo/uni/tn-tenant{index:04d}.json") for index in range(4)]
+    # One token per controller, then both are out of tokens: the rest fail without reaching either
+    assert sum(not is_error(result) for result in results) == 2
+    assert all(result["error"]["sent"] is False for result in results if is_error(result))
+    assert not any(controller.ejected for controller in cluster.controllers)
+    assert all(controller.probe is None for controller in cluster.controllers)
+
+
+def test_busy_controller_passes_the_read_on(cluster_of, mock_apic_factory):
+    busy, free = mock_apic_factory(), mock_apic_factory()
+    cluster = cluster_of(busy.base_url, free.base_url, timeout=5)
+    cluster.cache = ResponseCache(default_ttl=0)
+    prefer(cluster, 0)
+    limiter = cluster.controllers[0].client.control.limiter
+    limiter.in_flight = int(limiter.limit)
+    started = time.monotonic()
+    assert not is_error(cluster.get_resource(TENANT))
+    # Sent to the free controller at once rather than after waiting for the busy one's slot
+    assert time.monotonic() - started < 1
+    assert busy.requests == 0 and free.requests > 0
+    assert not cluster.controllers[0].ejected
@@ -0,0 +1,273 @@
+import time
+import asyncio
+from email.utils import formatdate
+
+import pytest
+import requests
+
+from agent.apic_control import (
+    AdaptiveLimiter, AdmissionTimeout, CircuitBreaker, CircuitOpenError, RequestControl, TokenBucket, error_result,
+    is_error, retry_after, status_error,
+)
+
+
+@pytest.fixture
+def control(monkeypatch):
+    monkeypatch.setenv("APIC_BREAKER_FAILURES", "2")
+    monkeypatch.setenv("APIC_BREAKER_RESET", "0.2")
+    monkeypatch.setenv("APIC_MAX_RETRIES", "2")
+    monkeypatch.setenv("APIC_RETRY_BASE", "0.01")
+    monkeypatch.setenv("APIC_RETRY_MAX", "1")
+    return RequestControl("https://apic", max_in_flight=4, wait_timeout=0.2)
+
+
+#------------------------- token bucket -------------------------
+
+def test_bucket_without_rate_never_waits():
+    bucket = TokenBucket(0, 1)
+    start = time.monotonic()
+    assert all(bucket.take(0) for _ in range(1000))
+    assert time.monotonic() - start < 0.1
+
+
+def test_bucket_limits_rate_after_burst():
+    bucket = TokenBucket(50, 5)
+    start = time.monotonic()
+    for _ in range(15):
+        assert bucket.take(1)
+    # 5 tokens at once, the other 10 at 50 per second
+    assert 0.15 <= time.monotonic() - start < 0.5
+
+
+def test_bucket_gives_up_beyond_timeout():
+    bucket = TokenBucket(1, 1)
+    assert bucket.take(0)
+    assert not bucket.take(0.1)
+
+
+def test_bucket_pause_holds_every_request():
+    bucket = TokenBucket(0, 1)
+    bucket.pause(0.2)
+    assert not bucket.take(0.05)
+    start = time.monotonic()
+    assert bucket.take(1)
+    assert time.monotonic() - start >= 0.1
+
+
+#------------------------- adaptive limiter -------------------------
+
+def test_limiter_blocks_at_limit():
+    limiter = AdaptiveLimiter(2, 2)
+    assert limiter.acquire(0) and limiter.acquire(0)
+    assert not limiter.acquire(0.05)
+    limiter.release(0.01)
+    assert limiter.acquire(0)
+
+
+def test_limiter_halves_once_per_round_trip_and_grows_back():
+    limiter = AdaptiveLimiter(8, 8)
+    for _ in range(20):
+        limiter.acquire(0)
+        limiter.release(0.05)
+    assert limiter.limit == 8
+    # A burst of 429s answering the same round cuts the limit once
+    for _ in range(4):
+        limiter.acquire(0)
+        limiter.release(None, overloaded=True)
+    assert limiter.limit == 4
+    time.sleep(0.06)
+    limiter.acquire(0)
+    limiter.release(None, overloaded=True)
+    assert limiter.limit == 2
+    for _ in range(30):
+        limiter.acquire(0)
+        limiter.release(0.05)
+    assert limiter.limit == 8
+
+
+def test_limiter_cuts_on_rising_latency():
+    limiter = AdaptiveLimiter(8, 8)
+    for _ in range(50):
+        limiter.acquire(0)
+        limiter.release(0.01)
+    for _ in range(5):
+        limiter.acquire(0)
+        limiter.release(0.2)
+    assert limiter.limit < 8
+
+
+def test_limiter_never_goes_below_minimum():
+    limiter = AdaptiveLimiter(2, 2)
+    for _ in range(10):
+        limiter._last_decrease = 0.0
+        limiter.acquire(1)
+        limiter.release(None, overloaded=True)
+    assert limiter.limit == 1
+
+
+#------------------------- circuit breaker -------------------------
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(3, 10)
+    for outcome in (False, False, True, False, False):
+        assert breaker.allow()
+        breaker.record(outcome)
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker(1, 0.05)
+    breaker.record(False)
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    assert breaker.record(True) == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_breaker_failed_trial_reopens():
+    breaker = CircuitBreaker(5, 0.05)
+    for _ in range(5):
+        breaker.record(False)
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.record(False) == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_breaker_neutral_outcome_frees_the_trial():
+    breaker = CircuitBreaker(1, 0.05)
+    breaker.record(False)
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record(None)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+#------------------------- request control -------------------------
+
+def test_record_classifies_outcomes(control):
+    for status in (200, 404, 429):
+        control.admit()
+        control.record(0.01, status)
+    assert control.breaker.failures == 0
+    control.admit()
+    control.record(0.01, failed=True)
+    control.admit()
+    control.record(0.01, 503)
+    assert control.breaker.state == CircuitBreaker.OPEN
+    assert control.limiter.in_flight == 0
+    with pytest.raises(CircuitOpenError):
+        control.admit()
+
+
+def test_record_pauses_bucket_on_retry_after(control):
+    control.admit()
+    control.record(0.01, 429, {"Retry-After": "0.3"})
+    assert not control.bucket.take(0.05)
+
+
+def test_admit_times_out_without_a_slot(control):
+    for _ in range(4):
+        control.admit()
+    with pytest.raises(requests.exceptions.ConnectTimeout):
+        control.admit()
+
+
+def test_retry_delay(control):
+    delays = [control.retry_delay(attempt) for attempt in range(3)]
+    assert all(0 <= delay <= 0.01 * 2 ** attempt for attempt, delay in enumerate(delays[:2]))
+    assert delays[2] is None
+    assert control.retry_delay(0, wait=0.5) == 0.5
+    # A Retry-After longer than APIC_RETRY_MAX is reported rather than waited for
+    assert control.retry_delay(0, wait=5) is None
+
+
+def test_retry_after():
+    assert retry_after({"Retry-After": "3"}) == 3.0
+    assert 55 <= retry_after({"Retry-After": formatdate(time.time() + 60, usegmt=True)}) <= 60
+    assert retry_after({"Retry-After": "soon"}) is None
+    assert retry_after({}) is None
+    assert retry_after(None) is None
+
+
+#------------------------- structured errors -------------------------
+
+def test_status_error():
+    error = status_error(429, "429: Too many requests", 2.0, "https://apic")["error"]
+    assert error["retryable"] and error["retryAfter"] == 2.0 and error["controller"] == "https://apic"
+    assert "throttling" in error["hint"]
+    assert not status_error(400, "400: bad")["error"]["retryable"]
+
+
+def test_error_result_for_exceptions():
+    assert "keeps failing" in error_result(CircuitOpenError("open"))["error"]["hint"]
+    assert error_result(requests.exceptions.ConnectTimeout("slow"))["error"]["retryable"]
+    assert not error_result(ValueError("bad json"))["error"]["retryable"]
+    assert is_error(error_result(ValueError("x")))
+    assert not is_error({"imdata": [{"error": {"attributes": {}}}], "totalCount": "1"})
+
+
+#------------------------- clients against the mock APIC -------------------------
+
+def test_client_retries_throttled_reads_and_returns_structured_error(control, mock_apic_factory):
+    from agent.apic_client import APICClient
+
+    throttling = mock_apic_factory(max_concurrent=0)
+    client = APICClient(base_url=throttling.base_url)
+    result = client.get_resource("/api/node/class/fvTenant.json")
+    assert result["error"]["status"] == 429
+    assert result["error"]["retryable"]
+    # First attempt plus APIC_MAX_RETRIES retries, all throttled
+    assert throttling.throttled == 3
+
+
+def test_client_breaker_stops_calls_to_a_dead_controller(control, refused_url):
+    from agent.apic_client import APICClient
+
+    client = APICClient(base_url=refused_url)
+    assert client.get_resource("/api/node/class/fvTenant.json")["error"]["status"] is None
+    assert client.control.breaker.state == CircuitBreaker.OPEN
+    result = client.get_resource("/api/node/class/fvTenant.json")
+    assert "keeps failing" in result["error"]["hint"]
+
+
+def test_async_client_uses_the_shared_controls(control, mock_apic_factory):
+    from agent.apic_client import APICClient
+    from agent.async_apic_client import AsyncAPICClient
+
+    server = mock_apic_factory()
+    client = APICClient(base_url=server.base_url)
+    # Log in once, so the async clients reuse the token and every request below is a controlled GET
+    client._ensure_token()
+
+    async def fetch(uris):
+        async with AsyncAPICClient.from_client(client) as async_client:
+            async_client.cache = None
+            return await async_client.get_many(uris)
+
+    results = asyncio.run(fetch([f"/api/node/mo/uni/tn-tenant000{index}.json" for index in range(5)]))
+    assert all(not is_error(result) for result in results.values())
+    assert client.control.limiter.in_flight == 0
+
+    client.control.breaker.record(False)
+    client.control.breaker.record(False)
+    sent = server.requests
+    results = asyncio.run(fetch(["/api/node/class/fvBD.json"]))
+    assert "keeps failing" in results["/api/node/class/fvBD.json"]["error"]["hint"]
+    assert server.requests == sent
+
+
+def test_admission_timeout_is_reported_as_not_sent(control):
+    for _ in range(4):
+        control.admit()
+    with pytest.raises(AdmissionTimeout) as raised:
+        control.admit()
+    assert error_result(raised.value)["error"]["sent"] is False
+    assert "sent" not in error_result(requests.exceptions.ConnectTimeout("slow"))["error"]
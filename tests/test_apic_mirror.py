@@ -0,0 +1,102 @@
+import time
+
+import pytest
+
+from agent.apic_client import APICClient
+from agent.apic_mirror import MITMirror
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def tenant_names(response):
+    return {mo["fvTenant"]["attributes"]["name"] for mo in response["imdata"]}
+
+
+@pytest.fixture
+def mirrored(mock_apic_factory, monkeypatch):
+    """A mock APIC and a client with a mirror of fvTenant and fvBD subscribed over its websocket"""
+    monkeypatch.delenv("APIC_MIRROR_WS_URL", raising=False)
+    server = mock_apic_factory()
+    client = APICClient(base_url=server.base_url)
+    mirror = MITMirror(client, ["fvTenant", "fvBD"], refresh_interval=0.1)
+    mirror.start()
+    assert wait_for(lambda: mirror.ready)
+    yield server, client, mirror
+    mirror.stop()
+
+
+def test_bootstrap_serves_covered_queries_locally(mirrored, generated_mit):
+    server, client, mirror = mirrored
+    assert len(mirror.subscriptions) == 2
+    sent = server.requests
+    response = client.get_resource("/api/node/class/fvBD.json")
+    assert response["totalCount"] == str(len(generated_mit.by_class["fvBD"]))
+    assert server.requests == sent
+    # Classes outside the mirror still go to the controller
+    client.get_resource("/api/node/class/fvAp.json")
+    assert server.requests == sent + 1
+
+
+def test_events_update_the_mirror(mirrored):
+    server, client, mirror = mirrored
+    server.notify({"fvTenant": {"attributes": {"dn": "uni/tn-new", "name": "new", "status": "created"}}})
+    assert wait_for(lambda: "new" in tenant_names(mirror.query("/api/node/class/fvTenant.json")))
+
+    server.notify({"fvTenant": {"attributes": {"dn": "uni/tn-new", "descr": "changed", "status": "modified"}}})
+    assert wait_for(lambda: mirror.query("/api/node/mo/uni/tn-new.json")["imdata"][0]["fvTenant"]["attributes"].get("descr") == "changed")
+
+    server.notify({"fvTenant": {"attributes": {"dn": "uni/tn-new", "status": "deleted"}}})
+    assert wait_for(lambda: "new" not in tenant_names(mirror.query("/api/node/class/fvTenant.json")))
+
+
+def test_subscriptions_are_refreshed(mirrored):
+    server, client, mirror = mirrored
+    sent = server.requests
+    assert wait_for(lambda: server.requests >= sent + 4)
+    assert mirror.ready
+
+
+def test_dropped_websocket_reconnects_and_bootstraps_again(mirrored):
+    server, client, mirror = mirrored
+    subscriptions = server.subscriptions
+    server.drop_websockets()
+    assert wait_for(lambda: not mirror.ready)
+    assert mirror.query("/api/node/class/fvTenant.json") is None
+    assert wait_for(lambda: mirror.ready and server.subscriptions == subscriptions + 2)
+    assert mirror.query("/api/node/class/fvTenant.json") is not None
+
+
+def test_stop_detaches_the_mirror(mirrored):
+    server, client, mirror = mirrored
+    mirror.stop()
+    assert client.mirror is None
+    assert mirror.query("/api/node/class/fvTenant.json") is None
+
+
+def test_modified_event_for_an_unknown_object_fetches_it_in_full(mirrored):
+    server, client, mirror = mirrored
+    dn = "uni/tn-tenant0001"
+    with mirror._lock:
+        mirror.store.remove(dn)
+    server.notify({"fvTenant": {"attributes": {"dn": dn, "descr": "changed", "status": "modified"}}})
+    assert wait_for(lambda: "tenant0001" in tenant_names(mirror.query("/api/node/class/fvTenant.json")))
+    # The whole object as the controller has it, not just the changed attribute
+    attributes = mirror.query(f"/api/node/mo/{dn}.json")["imdata"][0]["fvTenant"]["attributes"]
+    assert attributes["name"] == "tenant0001" and attributes["dn"] == dn
+    assert not mirror._pending
+
+
+def test_modified_event_for_an_object_gone_from_the_controller_adds_nothing(mirrored):
+    server, client, mirror = mirrored
+    sent = server.requests
+    server.notify({"fvTenant": {"attributes": {"dn": "uni/tn-gone", "descr": "changed", "status": "modified"}}})
+    assert wait_for(lambda: server.requests > sent and not mirror._pending)
+    assert "gone" not in tenant_names(mirror.query("/api/node/class/fvTenant.json"))
+    assert mirror.ready
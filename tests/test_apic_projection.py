@@ -0,0 +1,59 @@
+import pytest
+
+from agent.apic_projection import build_filter, project, shape_uri, summarize, to_table
+
+
+def test_build_filter():
+    assert build_filter("fvBD", {"name": "web"}) == 'eq(fvBD.name,"web")'
+    assert build_filter("fabricNode", {"role": ["leaf", "spine"], "name": "~^leaf"}) == (
+        'and(or(eq(fabricNode.role,"leaf"),eq(fabricNode.role,"spine")),wcard(fabricNode.name,"^leaf"))'
+    )
+
+
+def test_shape_uri_combines_filters():
+    uri = shape_uri('/api/node/class/fvBD.json?query-target-filter=eq(fvBD.arpFlood,"yes")', {"name": "web"}, "config-only")
+    assert 'query-target-filter=and(eq(fvBD.arpFlood,"yes"),eq(fvBD.name,"web"))' in uri.replace("%22", '"')
+    assert "rsp-prop-include=config-only" in uri
+    with pytest.raises(ValueError):
+        shape_uri("/api/node/mo/uni/tn-PROD.json", {"name": "web"})
+    with pytest.raises(ValueError):
+        shape_uri("/api/node/class/fvBD.json", prop_include="everything")
+
+
+def test_project_keeps_dn_and_children():
+    response = {"imdata": [{"fvBD": {"attributes": {"dn": "uni/tn-A/BD-b", "name": "b", "mac": "x"},
+                                     "children": [{"fvSubnet": {"attributes": {"ip": "10.0.0.1/24", "scope": "private"}}}]}}]}
+    projected = project(response, ["name", "ip"])
+    body = projected["imdata"][0]["fvBD"]
+    assert body["attributes"] == {"dn": "uni/tn-A/BD-b", "name": "b"}
+    assert body["children"] == [{"fvSubnet": {"attributes": {"ip": "10.0.0.1/24"}}}]
+
+
+def test_to_table_keeps_children_in_their_own_tables():
+    response = {"totalCount": "2", "imdata": [
+        {"fabricNode": {"attributes": {"dn": "topology/pod-1/node-101", "name": "leaf101"},
+                        "children": [{"healthInst": {"attributes": {"cur": "95"}}},
+                                     {"faultInst": {"attributes": {"code": "F0532", "rn": "fault-F0532"}}}]}},
+        {"fabricNode": {"attributes": {"dn": "topology/pod-1/node-102", "name": "leaf102"},
+                        "children": [{"healthInst": {"attributes": {"cur": "80"}}}]}},
+    ]}
+    tables = to_table(response)["tables"]
+    assert tables["fabricNode"]["rows"] == [["topology/pod-1/node-101", "leaf101"], ["topology/pod-1/node-102", "leaf102"]]
+    assert tables["healthInst"] == {
+        "columns": ["parentDn", "cur"],
+        "rows": [["topology/pod-1/node-101", "95"], ["topology/pod-1/node-102", "80"]],
+    }
+    assert tables["faultInst"]["rows"] == [["topology/pod-1/node-101", "F0532", "fault-F0532"]]
+
+
+def test_summarize():
+    response = {"totalCount": "30", "imdata": [
+        {"fvBD": {"attributes": {"dn": f"uni/tn-A/BD-{index}", "arpFlood": "yes" if index % 3 else "no", "seg": str(index)}}}
+        for index in range(30)
+    ]}
+    summary = summarize(response, top_n=2)
+    bd = summary["classes"]["fvBD"]
+    assert summary["summarized"] and bd["count"] == 30
+    assert bd["value_counts"]["arpFlood"] == {"yes": 20, "no": 10}
+    assert bd["numeric"]["seg"] == {"min": 0.0, "max": 29.0, "mean": 14.5}
+    assert len(bd["sample"]["rows"]) == 2
@@ -0,0 +1,48 @@
+import asyncio
+
+from agent.apic_client import APICClient
+from agent.apic_control import is_error
+from agent.async_apic_client import AsyncBatchRunner
+
+
+def test_runner_reuses_one_session(mock_apic_factory):
+    server = mock_apic_factory()
+    runner = AsyncBatchRunner(APICClient(base_url=server.base_url))
+    try:
+        first = runner.get_many(["/api/node/class/fvTenant.json", "/api/node/class/fvBD.json"])
+        session = runner._async_clients[runner.client.base_url]._session
+        second = runner.get_many(["/api/node/mo/uni/tn-tenant0001.json"])
+        assert all(not is_error(result) for result in {**first, **second}.values())
+        assert runner._async_clients[runner.client.base_url]._session is session
+    finally:
+        runner.close()
+    runner.close()
+
+
+def test_runner_works_inside_a_running_loop(mock_apic_factory):
+    server = mock_apic_factory()
+    runner = AsyncBatchRunner(APICClient(base_url=server.base_url))
+
+    async def caller():
+        # A tool called from async code: asyncio.run would raise here
+        return runner.get_many(["/api/node/class/fvTenant.json"])
+
+    try:
+        result = asyncio.run(caller())
+        assert not is_error(result["/api/node/class/fvTenant.json"])
+    finally:
+        runner.close()
+
+
+def test_failed_reads_are_logged_not_printed(mock_apic_factory, caplog, capsys, monkeypatch):
+    monkeypatch.setenv("APIC_MAX_RETRIES", "0")
+    server = mock_apic_factory(fail_status=502)
+    runner = AsyncBatchRunner(APICClient(base_url=server.base_url))
+    try:
+        with caplog.at_level("WARNING", logger="agent.async_apic_client"):
+            result = runner.get_many(["/api/node/class/fvTenant.json"])
+    finally:
+        runner.close()
+    assert result["/api/node/class/fvTenant.json"]["error"]["status"] == 502
+    assert "HTTP error 502" in caplog.text
+    assert capsys.readouterr().out == ""
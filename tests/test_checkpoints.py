@@ -0,0 +1,123 @@
+import operator
+import time
+from typing import Annotated, TypedDict
+
+import pytest
+from langgraph.graph import END, START, StateGraph
+
+from agent import checkpoints
+from agent.checkpoints import BoundedMemorySaver, BoundedSqliteSaver
+
+
+class State(TypedDict):
+    steps: Annotated[list, operator.add]
+
+
+def build_graph(saver):
+    """One node appending a step per run; every run stores a few checkpoints"""
+    graph = StateGraph(State)
+    graph.add_node("step", lambda state: {"steps": [len(state["steps"])]})
+    graph.add_edge(START, "step")
+    graph.add_edge("step", END)
+    return graph.compile(checkpointer=saver)
+
+
+def run(graph, thread_id, times=1):
+    config = {"configurable": {"thread_id": thread_id}}
+    for _ in range(times):
+        graph.invoke({"steps": []}, config)
+    return graph.get_state(config).values.get("steps", [])
+
+
+@pytest.fixture
+def sweep_every_put(monkeypatch):
+    monkeypatch.setattr(checkpoints, "SWEEP_INTERVAL", 0.0)
+
+
+#------------------------- memory -------------------------
+
+def test_memory_compaction_keeps_the_latest_checkpoints_and_resumes():
+    saver = BoundedMemorySaver(keep=3)
+    graph = build_graph(saver)
+    assert run(graph, "a", times=6) == [0, 1, 2, 3, 4, 5]
+    stored = saver.storage["a"][""]
+    assert len(stored) < 2 * saver.keep
+    # Only blobs of the kept checkpoints remain
+    live = set()
+    for saved, _, _ in stored.values():
+        live.update(saver.serde.loads_typed(saved)["channel_versions"].items())
+    assert {key[2:] for key in saver.blobs if key[0] == "a"} <= live
+    # The compacted thread carries on from its latest state
+    assert run(graph, "a") == [0, 1, 2, 3, 4, 5, 6]
+
+
+def test_memory_evicts_least_recently_used_threads():
+    saver = BoundedMemorySaver(max_threads=2)
+    graph = build_graph(saver)
+    for thread_id in ("a", "b", "c"):
+        run(graph, thread_id)
+    assert set(saver.storage) == {"b", "c"} and list(saver._last_seen) == ["b", "c"]
+    # Using b again makes c the oldest
+    run(graph, "b")
+    run(graph, "d")
+    assert set(saver.storage) == {"b", "d"}
+    assert run(graph, "a") == [0]
+
+
+def test_memory_evicts_idle_threads(sweep_every_put):
+    saver = BoundedMemorySaver(ttl=60)
+    graph = build_graph(saver)
+    run(graph, "idle")
+    saver._last_seen["idle"] = time.time() - 120
+    run(graph, "active")
+    assert "idle" not in saver.storage and "active" in saver.storage
+    assert "idle" not in saver._puts
+
+
+#------------------------- sqlite -------------------------
+
+def checkpoint_count(saver, thread_id):
+    with saver.cursor() as cur:
+        return cur.execute("SELECT COUNT(*) FROM checkpoints WHERE thread_id = ?", (thread_id,)).fetchone()[0]
+
+
+def test_sqlite_persists_across_restarts(tmp_path):
+    path = str(tmp_path / "state" / "checkpoints.sqlite")
+    saver = BoundedSqliteSaver.from_path(path)
+    assert run(build_graph(saver), "a", times=2) == [0, 1]
+    saver.conn.close()
+
+    reopened = BoundedSqliteSaver.from_path(path)
+    assert run(build_graph(reopened), "a") == [0, 1, 2]
+    reopened.conn.close()
+
+
+def test_sqlite_compaction_keeps_the_latest_checkpoints_and_resumes(tmp_path):
+    saver = BoundedSqliteSaver.from_path(str(tmp_path / "checkpoints.sqlite"), keep=3)
+    graph = build_graph(saver)
+    assert run(graph, "a", times=6) == [0, 1, 2, 3, 4, 5]
+    assert checkpoint_count(saver, "a") < 2 * saver.keep
+    with saver.cursor() as cur:
+        orphaned = cur.execute(
+            "SELECT COUNT(*) FROM writes WHERE checkpoint_id NOT IN (SELECT checkpoint_id FROM checkpoints)"
+        ).fetchone()[0]
+    assert orphaned == 0
+    assert run(graph, "a") == [0, 1, 2, 3, 4, 5, 6]
+    saver.conn.close()
+
+
+def test_sqlite_evicts_idle_and_least_recently_used_threads(tmp_path, sweep_every_put):
+    saver = BoundedSqliteSaver.from_path(str(tmp_path / "checkpoints.sqlite"), max_threads=2, ttl=60)
+    graph = build_graph(saver)
+    for thread_id in ("a", "b", "c"):
+        run(graph, thread_id)
+    assert checkpoint_count(saver, "a") == 0
+    assert checkpoint_count(saver, "b") > 0 and checkpoint_count(saver, "c") > 0
+
+    with saver.cursor() as cur:
+        cur.execute("UPDATE thread_access SET last_seen = ? WHERE thread_id = 'b'", (time.time() - 120,))
+    run(graph, "c")
+    assert checkpoint_count(saver, "b") == 0
+    with saver.cursor() as cur:
+        assert [row[0] for row in cur.execute("SELECT thread_id FROM thread_access")] == ["c"]
+    saver.conn.close()
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from agent import context
+from agent.context import manage_context, message_tokens
+
+
+def finished_turn(index, result_size=10):
+    """A question, a get_apic call with a result of result_size characters, and the answer"""
+    call = {"name": "get_apic", "args": {"uri": f"/api/node/class/fvBD.json?n={index}"}, "id": f"call-{index}"}
+    return [
+        HumanMessage(content=f"question {index}", id=f"h{index}"),
+        AIMessage(content="", tool_calls=[call], id=f"a{index}"),
+        ToolMessage(content=json.dumps({"handle": f"r{index}", "totalCount": "1", "data": "x" * result_size}),
+                    tool_call_id=f"call-{index}", name="get_apic", id=f"t{index}"),
+        AIMessage(content=f"answer {index}", id=f"f{index}"),
+    ]
+
+
+@pytest.fixture
+def budget(monkeypatch):
+    """Room for two small finished turns"""
+    monkeypatch.setattr(context, "CONTEXT_TOKEN_BUDGET", 2 * sum(map(message_tokens, finished_turn(0))) + 5)
+
+
+def test_old_turns_are_dropped_and_the_current_turn_is_kept(budget):
+    current = [HumanMessage(content="now " + "y" * 4000, id="now")]
+    history = [message for index in range(5) for message in finished_turn(index)]
+    result = manage_context({"messages": history + current}, "PROMPT")
+    sent = result["llm_input_messages"]
+    # The current turn is sent in full even though it alone exceeds the budget
+    assert sent[-1] is current[0]
+    assert [m.content for m in sent if isinstance(m, HumanMessage)][:-1] == ["question 3", "question 4"]
+
+
+def test_dropped_turns_are_summarised_in_the_single_system_prompt(budget):
+    history = [message for index in range(5) for message in finished_turn(index)]
+    sent = manage_context({"messages": history + [HumanMessage(content="now")]}, "PROMPT")["llm_input_messages"]
+    systems = [message for message in sent if isinstance(message, SystemMessage)]
+    assert systems == [sent[0]]
+    assert sent[0].content.startswith("PROMPT\n\n3 earlier turns")
+    assert "- question 0\n  Answer: answer 0" in sent[0].content
+    assert "question 2" in sent[0].content and "question 3" not in sent[0].content
+
+
+def test_nothing_dropped_sends_the_prompt_alone():
+    history = finished_turn(0) + [HumanMessage(content="now")]
+    sent = manage_context({"messages": history}, "PROMPT")["llm_input_messages"]
+    assert sent[0].content == "PROMPT"
+    assert sent[1:] == history
+
+
+def test_large_results_of_finished_turns_are_evicted(budget):
+    history = finished_turn(0, result_size=5000) + finished_turn(1)
+    current = finished_turn(2, result_size=5000)[:3]
+    result = manage_context({"messages": history + current})
+    # Only the finished turn's large result is replaced, under the same id
+    assert [message.id for message in result["messages"]] == ["t0"]
+    stub = json.loads(result["messages"][0].content)
+    assert stub["handle"] == "r0" and "evicted" in stub
+    assert result["llm_input_messages"][-1] is current[-1]
+
+
+def test_the_prefix_is_stable_within_a_turn(budget):
+    history = [message for index in range(5) for message in finished_turn(index)]
+    turn = finished_turn(5, result_size=20000)
+    prefixes = []
+    # One model call per step of the turn, while its messages (and a large tool result) accumulate
+    for step in (1, 3, 4):
+        sent = manage_context({"messages": history + turn[:step]}, "PROMPT")["llm_input_messages"]
+        prefixes.append(sent[:len(sent) - step])
+    assert prefixes[0] == prefixes[1] == prefixes[2]
+    assert prefixes[0][0].content.startswith("PROMPT")
@@ -0,0 +1,32 @@
+from agent.embeddings import CachedQueryEmbeddings, HashingEmbeddings, normalize_query
+
+
+class RecordingEmbeddings(HashingEmbeddings):
+    def __init__(self):
+        super().__init__(dim=16)
+        self.queries = []
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return super().embed_query(text)
+
+
+def test_normalize_query():
+    assert normalize_query("  Show  fvBD objects?  ") == "show fvbd objects"
+
+
+def test_embeds_the_original_text_and_caches_by_normalized_key():
+    inner = RecordingEmbeddings()
+    embeddings = CachedQueryEmbeddings(inner)
+    first = embeddings.embed_query("List the fvRsCons of EPG web?")
+    assert inner.queries == ["List the fvRsCons of EPG web?"]
+    assert embeddings.embed_query("list the fvrscons of  epg web") == first
+    assert inner.queries == ["List the fvRsCons of EPG web?"]
+    assert (embeddings.hits, embeddings.misses) == (1, 1)
+
+
+def test_cache_is_bounded():
+    embeddings = CachedQueryEmbeddings(RecordingEmbeddings(), max_entries=2)
+    for text in ("a b", "c d", "e f", "a b"):
+        embeddings.embed_query(text)
+    assert embeddings.misses == 4
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+from langchain_core.documents import Document
+
+from agent.ingest import IngestionPipeline, chunk_id, clean_metadata
+from agent.vector_store import LocalVectorStore
+from benchmarks.fakes import deterministic_embeddings
+
+
+def chunks(source, *texts):
+    return [Document(page_content=text, metadata={"source": source, "page": index}) for index, text in enumerate(texts)]
+
+
+GUIDE = chunks("guide.pdf", "Tenants hold bridge domains.", "Bridge domains hold subnets.", "EPGs join bridge domains.")
+URLS = chunks("example_urls.txt", "/api/node/class/fvTenant.json", "/api/node/class/fvBD.json")
+
+
+class FlakyStore(LocalVectorStore):
+    """LocalVectorStore that fails the batches containing any of the texts in fail_on"""
+    fail_on = set()
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        if self.fail_on & set(texts):
+            raise RuntimeError("embedding quota exceeded")
+        return super().add_texts(texts, metadatas=metadatas, ids=ids, **kwargs)
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    """Build pipelines over one index and manifest, as successive runs of the ingestion would"""
+    def build(store_class=LocalVectorStore, **kwargs):
+        store = store_class(str(tmp_path / "index"), deterministic_embeddings(64))
+        return IngestionPipeline(store, str(tmp_path / "manifest.json"), batch_size=2, max_workers=1, **kwargs)
+    return build
+
+
+def stored_texts(store):
+    return sorted(store.record(row)["text"] for row in store._row_index().values())
+
+
+def test_unchanged_files_are_skipped(pipeline):
+    first = pipeline()
+    assert first.run(GUIDE + URLS) == {"chunks": 5, "skipped": 0, "added": 5, "deleted": 0, "failed": 0}
+    # A later run, e.g. after a restart, reads the manifest and embeds nothing
+    second = pipeline()
+    assert second.run(GUIDE + URLS) == {"chunks": 5, "skipped": 5, "added": 0, "deleted": 0, "failed": 0}
+    assert second.vector_store.count == 5
+
+
+def test_changed_file_replaces_only_its_own_chunks(pipeline):
+    pipeline().run(GUIDE + URLS)
+    edited = chunks("guide.pdf", "Tenants hold bridge domains.", "Bridge domains hold one or more subnets.")
+    # Only the edited source is ingested again; the URLs are left alone
+    stats = pipeline().run(edited)
+    assert stats == {"chunks": 2, "skipped": 1, "added": 1, "deleted": 2, "failed": 0}
+    store = pipeline().vector_store
+    assert stored_texts(store) == sorted([doc.page_content for doc in edited + URLS])
+
+
+def test_interrupted_run_resumes_where_it_stopped(pipeline, monkeypatch):
+    monkeypatch.setattr(FlakyStore, "fail_on", {URLS[0].page_content})
+    interrupted = pipeline(FlakyStore)
+    stats = interrupted.run(GUIDE + URLS)
+    # Batches of two: the second one, holding GUIDE[2] and URLS[0], fails
+    assert stats["added"] == 3 and stats["failed"] == 1
+    # The batches that landed are checkpointed
+    with open(interrupted.manifest_path) as manifest_file:
+        assert set(json.load(manifest_file)["chunks"]) == {chunk_id(doc) for doc in GUIDE[:2] + URLS[1:]}
+
+    monkeypatch.setattr(FlakyStore, "fail_on", set())
+    resumed = pipeline(FlakyStore).run(GUIDE + URLS)
+    assert resumed == {"chunks": 5, "skipped": 3, "added": 2, "deleted": 0, "failed": 0}
+    assert stored_texts(pipeline().vector_store) == sorted(doc.page_content for doc in GUIDE + URLS)
+
+
+def test_identical_chunks_are_stored_once(pipeline):
+    duplicated = GUIDE + chunks("copy.pdf", GUIDE[0].page_content)
+    stats = pipeline().run(duplicated)
+    assert stats["chunks"] == 3 and stats["added"] == 3
+
+
+def test_metadata_is_flattened_for_every_backend():
+    metadata = {"source": "guide.pdf", "page": 3, "score": 0.5, "tags": ["a", "b"], "coordinates": {"x": 1}, "mixed": [1]}
+    assert clean_metadata(metadata) == {"source": "guide.pdf", "page": 3, "score": 0.5, "tags": ["a", "b"]}
@@ -0,0 +1,34 @@
+from langchain_core.documents import Document
+
+from agent.keyword_index import BM25Index, apic_tokens, reciprocal_rank_fusion
+
+TEXTS = [
+    "Use target-subtree-class to limit a subtree query to fvBD objects",
+    "A contract is consumed through fvRsCons under the EPG",
+    "Page through large class queries with page and page-size",
+]
+
+
+def test_tokens_keep_whole_names_and_their_parts():
+    tokens = apic_tokens("fvRsCons target-subtree-class")
+    assert {"fvrscons", "fv", "rs", "cons", "target-subtree-class", "subtree"} <= set(tokens)
+
+
+def test_incremental_index_matches_a_batch_build(tmp_path):
+    incremental = BM25Index()
+    for text in TEXTS:
+        incremental.add(Document(page_content=text))
+    incremental.finish()
+    batch = BM25Index.from_documents(Document(page_content=text) for text in TEXTS)
+    assert incremental.search("fvRsCons contract") == batch.search("fvRsCons contract")
+    assert incremental.search("fvRsCons contract")[0][0].page_content == TEXTS[1]
+
+    incremental.save(str(tmp_path / "index.json"))
+    loaded = BM25Index.load(str(tmp_path / "index.json"))
+    assert [doc.page_content for doc, _ in loaded.search("page-size")] == [TEXTS[2]]
+
+
+def test_reciprocal_rank_fusion_counts_shared_documents_once():
+    a, b, c = (Document(page_content=text) for text in TEXTS)
+    fused = reciprocal_rank_fusion([[a, b], [b, c]])
+    assert [doc.page_content for doc in fused] == [TEXTS[1], TEXTS[0], TEXTS[2]]
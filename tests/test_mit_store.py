@@ -0,0 +1,92 @@
+import pytest
+
+from agent.mit_store import parse_filter, split_dn
+
+
+def dns(response):
+    return [body["attributes"]["dn"] for mo in response["imdata"] for body in mo.values()]
+
+
+def test_split_dn_keeps_bracketed_names():
+    assert split_dn("topology/pod-1/node-101/sys/phys-[eth1/1]") == ["topology", "pod-1", "node-101", "sys", "phys-[eth1/1]"]
+
+
+def test_class_query(store):
+    response = store.query("/api/node/class/fvBD.json")
+    assert response["totalCount"] == "2"
+    assert dns(response) == ["uni/tn-PROD/BD-db", "uni/tn-PROD/BD-web"]
+
+
+def test_mo_query_subtree_with_class(store):
+    response = store.query("/api/node/mo/uni/tn-PROD.json?query-target=subtree&target-subtree-class=fvBD,fvAEPg")
+    assert sorted(dns(response)) == ["uni/tn-PROD/BD-db", "uni/tn-PROD/BD-web", "uni/tn-PROD/ap-app/epg-front"]
+
+
+def test_rsp_subtree_children(store):
+    response = store.query("/api/node/mo/uni/tn-PROD/BD-web.json?rsp-subtree=children&rsp-subtree-class=faultInst")
+    children = response["imdata"][0]["fvBD"]["children"]
+    assert [list(child) for child in children] == [["faultInst"]]
+
+
+def test_filter_and_paging(store):
+    response = store.query('/api/node/class/fvBD.json?query-target-filter=eq(fvBD.arpFlood,"yes")')
+    assert dns(response) == ["uni/tn-PROD/BD-web"]
+    response = store.query("/api/node/class/fvBD.json?page=1&page-size=1")
+    assert response["totalCount"] == "2"
+    assert dns(response) == ["uni/tn-PROD/BD-web"]
+
+
+def test_count(store):
+    response = store.query("/api/node/class/fvBD.json?rsp-subtree-include=count")
+    assert response["imdata"][0]["moCount"]["attributes"]["count"] == "2"
+
+
+def test_unsupported_options_fall_through(store):
+    assert store.query("/api/node/class/fvBD.json?rsp-subtree-include=health") is None
+    assert store.query("/api/node/class/fvBD.json?time-range=24h") is None
+
+
+def test_covered_class_query(store):
+    assert store.query("/api/node/class/fvBD.json", covered={"fvBD"})["totalCount"] == "2"
+    assert store.query("/api/node/class/fvBD.json", covered={"fvTenant"}) is None
+    # The targets of a children/subtree query must be covered too, not just the queried class
+    uri = "/api/node/class/fvTenant.json?query-target=subtree&target-subtree-class=fvAp"
+    assert store.query(uri, covered={"fvTenant"}) is None
+    assert dns(store.query(uri, covered={"fvTenant", "fvAp"})) == ["uni/tn-PROD/ap-app"]
+    assert store.query("/api/node/class/fvTenant.json?query-target=children", covered={"fvTenant"}) is None
+
+
+def test_covered_mo_query(store):
+    assert store.query("/api/node/mo/uni/tn-PROD.json", covered={"fvTenant"}) is not None
+    assert store.query("/api/node/mo/uni/tn-PROD.json?query-target=children", covered={"fvTenant"}) is None
+
+
+@pytest.mark.parametrize("uri", [
+    '/api/node/class/fvBD.json?query-target-filter=and(eq(fvBD.name,"web")',
+    "/api/node/class/fvBD.json?query-target-filter=eq(",
+    '/api/node/class/fvBD.json?query-target-filter=wcard(fvBD.name,"[")',
+    '/api/node/class/fvBD.json?query-target-filter=not(eq(fvBD.name,"a"),eq(fvBD.name,"b"))',
+    "/api/node/class/fvBD.json?page-size=abc",
+    "/api/node/class/fvBD.json?page-size=0",
+])
+def test_malformed_queries_return_none(store, uri):
+    assert store.query(uri) is None
+
+
+@pytest.mark.parametrize("expression, names", [
+    ('eq(fvBD.name,"web")', ["web"]),
+    ('ne(fvBD.name,"web")', ["db"]),
+    ('or(eq(fvBD.name,"web"),eq(fvBD.name,"db"))', ["db", "web"]),
+    ('and(eq(fvBD.arpFlood,"yes"),wcard(fvBD.name,"^w"))', ["web"]),
+    ('not(eq(fvBD.name,"web"))', ["db"]),
+])
+def test_parse_filter(store, expression, names):
+    predicate = parse_filter(expression)
+    bds = store.by_class["fvBD"].values()
+    assert sorted(node.attributes["name"] for node in bds if predicate(node)) == names
+
+
+@pytest.mark.parametrize("expression", ["eq(fvBD.name", "eq(fvBD.name,\"a\") x", "wcard(fvBD.name,\"(\")", "foo(a,b)", "eq(a)"])
+def test_parse_filter_rejects_malformed(expression):
+    with pytest.raises(ValueError):
+        parse_filter(expression)
@@ -0,0 +1,60 @@
+import pytest
+
+from agent.pdf_partition import pack_chunks, partition_documents, partition_pdf, split_blocks
+from benchmarks.fakes import write_pdf
+
+TENANT_URL = "URL: /api/node/mo/uni/tn-PROD.json?query-target=children&target-subtree-class=fvBD"
+PAGES = [
+    ["Tenants hold bridge domains.", "List the bridge domains of a tenant with:", TENANT_URL, "The reply lists every BD."],
+    ["A class query returns every object of one class.", "GET /api/node/class/fvBD.json"],
+    ["Faults (faultInst) are raised on managed objects."],
+]
+
+
+@pytest.fixture
+def guide(tmp_path):
+    path = str(tmp_path / "guide.pdf")
+    write_pdf(path, PAGES)
+    return path
+
+
+def test_lines_are_grouped_into_prose_and_code_blocks():
+    text = "\n".join(PAGES[0] + ["{", '"fvTenant": {}', "}", "time-range=24h"])
+    assert split_blocks(text) == [
+        ("prose", "Tenants hold bridge domains.\nList the bridge domains of a tenant with:"),
+        ("code", TENANT_URL),
+        ("prose", "The reply lists every BD."),
+        ("code", '{\n"fvTenant": {}\n}\ntime-range=24h'),
+    ]
+
+
+def test_chunks_never_split_a_line():
+    blocks = split_blocks("\n".join(PAGES[0]))
+    chunks = pack_chunks(blocks, max_chars=40)
+    # Only a single line longer than max_chars makes a longer chunk
+    assert all(len(chunk) <= 40 or chunk in PAGES[0] for chunk in chunks)
+    assert TENANT_URL in chunks and "\n".join(chunks) == "\n".join(PAGES[0])
+    # Everything fits in one chunk when there is room
+    assert pack_chunks(blocks, max_chars=1500) == ["\n".join(PAGES[0])]
+
+
+def test_pdf_chunks_come_in_page_order_with_their_page_numbers(guide):
+    docs = list(partition_pdf(guide, max_workers=2, pages_per_task=1))
+    assert [doc.metadata for doc in docs] == [{"source": guide, "page_number": page} for page in (1, 2, 3)]
+    assert [doc.page_content for doc in docs] == ["\n".join(lines) for lines in PAGES]
+
+
+def test_small_chunks_keep_the_url_next_to_its_introduction(guide):
+    docs = list(partition_pdf(guide, max_workers=1, max_chars=160))
+    first_page = [doc.page_content for doc in docs if doc.metadata["page_number"] == 1]
+    assert len(first_page) == 2
+    assert first_page[0].endswith(f"with:\n{TENANT_URL}")
+
+
+def test_documents_mix_pdfs_and_text_files(guide, tmp_path):
+    urls = tmp_path / "example_urls.txt"
+    urls.write_text("/api/node/class/fvTenant.json\n\n/api/node/class/fvBD.json\n")
+    docs = list(partition_documents([guide, str(urls)]))
+    assert [doc.metadata.get("page_number") for doc in docs] == [1, 2, 3, None]
+    assert docs[-1].page_content == "/api/node/class/fvTenant.json\n/api/node/class/fvBD.json"
+    assert docs[-1].metadata == {"source": str(urls)}
@@ -0,0 +1,115 @@
+import pickle
+import threading
+
+import pytest
+
+from agent.python_workers import PythonWorkerPool, ResultStore
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = PythonWorkerPool(str(tmp_path), size=1, timeout=10, memory_mb=512)
+    yield pool
+    pool.close()
+
+
+def test_result_store_round_trip(tmp_path):
+    store = ResultStore(str(tmp_path), max_entries=2)
+    handles = [store.put({"value": index}) for index in range(3)]
+    assert store.get(handles[-1]) == {"value": 2}
+    assert len(list(tmp_path.glob("*.json"))) == 2
+    with pytest.raises(KeyError):
+        store.get("res-missing")
+    with pytest.raises(KeyError):
+        store.get("../etc/passwd")
+
+
+def test_run_prints_and_reports_errors(pool, tmp_path):
+    handle = ResultStore(str(tmp_path)).put({"imdata": [1, 2, 3]})
+    assert pool.run(f"print(len(load({handle!r})['imdata']))") == "3\n"
+    assert "ZeroDivisionError" in pool.run("1 / 0")
+
+
+def test_timeout_kills_and_replaces_worker(pool):
+    assert "timed out" in pool.run("import time; time.sleep(30)", timeout=0.5)
+    assert pool.run("print('alive')") == "alive\n"
+
+
+def test_waiter_gets_a_new_worker_after_a_timeout(pool):
+    # The only worker is busy; the second call waits for it, and must be served once it is discarded
+    results = {}
+
+    def call(name, code, timeout=None):
+        results[name] = pool.run(code, timeout=timeout)
+
+    slow = threading.Thread(target=call, args=("slow", "import time; time.sleep(30)", 1), daemon=True)
+    slow.start()
+    while pool._started == 0:
+        threading.Event().wait(0.01)
+    waiter = threading.Thread(target=call, args=("waiter", "print('served')"), daemon=True)
+    waiter.start()
+    slow.join(timeout=20)
+    waiter.join(timeout=20)
+    assert not waiter.is_alive()
+    assert "timed out" in results["slow"]
+    assert results["waiter"] == "served\n"
+
+
+def test_dead_worker_is_replaced(pool):
+    assert pool.run("print(1)") == "1\n"
+    process, _ = pool._idle[0]
+    process.kill()
+    process.join()
+    assert "exited" in pool.run("print(1)")
+    assert pool.run("print(1 + 1)") == "2\n"
+
+
+class FailingPipe:
+    """Pipe whose next recv fails as an unpicklable answer would"""
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def recv(self):
+        self.conn.recv()
+        raise pickle.UnpicklingError("invalid load key")
+
+
+def test_worker_with_an_unreadable_answer_is_replaced(pool):
+    assert pool.run("print(1)") == "1\n"
+    process, conn = pool._idle.pop()
+    pool._idle.append((process, FailingPipe(conn)))
+    assert "UnpicklingError" in pool.run("print(1)")
+    process.join(timeout=5)
+    assert not process.is_alive()
+    assert pool.run("print(2)") == "2\n" and pool._started == 1
+
+
+@pytest.mark.parametrize("code", [
+    "open('/etc/passwd')",
+    "import os",
+    "import subprocess",
+    "from os import path",
+    "import json; json.codecs",
+    "import random; random._os",
+    "eval('1')",
+    "getattr(load, '__globals__')",
+    "().__class__.__bases__[0].__subclasses__()",
+    "print(__builtins__)",
+    "g = (x for x in [1]); g.gi_frame",
+])
+def test_escapes_from_the_restricted_namespace_fail(pool, code):
+    output = pool.run(code)
+    assert "Error" in output and "Traceback" not in output
+
+
+def test_allowed_modules_work(pool):
+    code = (
+        "import statistics, json\n"
+        "from collections import Counter\n"
+        "from datetime import timedelta\n"
+        "print(statistics.mean([1, 2, 3]), json.dumps(Counter('aab')), timedelta(seconds=60).total_seconds())"
+    )
+    assert pool.run(code) == '2 {"a": 2, "b": 1} 60.0\n'
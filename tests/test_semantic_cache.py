@@ -0,0 +1,108 @@
+import math
+
+import pytest
+
+from agent.registry import discard, register
+from agent.semantic_cache import SemanticCache, entity_tokens
+from agent.vector_store import LocalVectorStore
+from benchmarks.fakes import deterministic_embeddings, rag_answer_model
+
+BRIDGE_DOMAINS = "How do I list all bridge domains?"
+# Similarity 0.939 to BRIDGE_DOMAINS under the deterministic embeddings
+BRIDGE_DOMAINS_REWORDED = "How do I list all the bridge domains?"
+
+
+def at_angle(similarity):
+    """A unit vector with this cosine similarity to [1, 0]"""
+    return [similarity, math.sqrt(1 - similarity ** 2)]
+
+
+@pytest.mark.parametrize("similarity, hit", [(1.0, True), (0.951, True), (0.949, False), (0.5, False)])
+def test_lookup_hits_at_or_above_the_threshold(similarity, hit):
+    cache = SemanticCache(path="", threshold=0.95)
+    cache.store("list tenants", [1.0, 0.0], "answer")
+    assert (cache.lookup("list tenants", at_angle(similarity)) == "answer") is hit
+    assert cache.stats()["hits" if hit else "misses"] == 1
+
+
+def test_threshold_decides_whether_a_rewording_is_reused():
+    embeddings = deterministic_embeddings()
+    strict, loose = SemanticCache(path="", threshold=0.95), SemanticCache(path="", threshold=0.9)
+    for cache in (strict, loose):
+        cache.store(BRIDGE_DOMAINS, embeddings.embed_query(BRIDGE_DOMAINS), "bridge domains answer")
+    reworded = embeddings.embed_query(BRIDGE_DOMAINS_REWORDED)
+    assert strict.lookup(BRIDGE_DOMAINS_REWORDED, reworded) is None
+    assert loose.lookup(BRIDGE_DOMAINS_REWORDED, reworded) == "bridge domains answer"
+    # Casing and punctuation alone do not change the embedding
+    assert strict.lookup("how do i list all bridge domains", embeddings.embed_query("how do i list all bridge domains"))
+    unrelated = "How do I create a contract between EPGs?"
+    assert loose.lookup(unrelated, embeddings.embed_query(unrelated)) is None
+
+
+def test_named_objects_must_match():
+    assert entity_tokens("faults of tenant 'PROD' on node-101") == ["PROD", "node-101"]
+    cache = SemanticCache(path="", threshold=0.5)
+    cache.store("Show faults of tenant PROD", [1.0, 0.0], "PROD faults")
+    # Near-identical vectors, but another tenant
+    assert cache.lookup("Show faults of tenant DEV", [1.0, 0.0]) is None
+    assert cache.lookup("show faults of tenant PROD", at_angle(0.9)) == "PROD faults"
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticCache(path="", threshold=0.99, max_entries=2)
+    cache.store("a", [1.0, 0.0, 0.0], "A")
+    cache.store("b", [0.0, 1.0, 0.0], "B")
+    assert cache.lookup("a", [1.0, 0.0, 0.0]) == "A"
+    cache.store("c", [0.0, 0.0, 1.0], "C")
+    assert len(cache) == 2
+    assert cache.lookup("b", [0.0, 1.0, 0.0]) is None
+    assert cache.lookup("a", [1.0, 0.0, 0.0]) == "A"
+
+
+def test_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / "cache" / "answers.npz")
+    cache = SemanticCache(path=path, threshold=0.95)
+    cache.store("list tenants", [1.0, 0.0], "answer")
+    reopened = SemanticCache(path=path, threshold=0.95)
+    assert len(reopened) == 1 and reopened.lookup("list tenants", [1.0, 0.0]) == "answer"
+    # A new embedding dimension drops the entries that can no longer be compared
+    reopened.store("list tenants", [1.0, 0.0, 0.0], "answer")
+    assert len(SemanticCache(path=path)) == 1
+
+
+#------------------------- RAG tool -------------------------
+
+@pytest.fixture
+def rag(tmp_path, monkeypatch):
+    """The RAG tool over an empty local index, the deterministic embeddings and the fake answer model"""
+    import agent.agent_rag_tool as rag
+
+    monkeypatch.setattr(rag, "KEYWORD_INDEX_PATH", str(tmp_path / "keyword_index.json"))
+    # Every question goes past the URI resolver to the cache and the model
+    monkeypatch.setattr(rag, "URI_RESOLVER_THRESHOLD", float("inf"))
+    embeddings = deterministic_embeddings()
+    model = rag_answer_model()
+    resources = {
+        "embeddings": embeddings,
+        "vector_store": LocalVectorStore(str(tmp_path / "index"), embeddings),
+        "answer_cache": SemanticCache(path="", threshold=0.95),
+        "llm": model,
+    }
+    for name, resource in resources.items():
+        register(name, resource)
+    yield rag, model
+    for name in resources:
+        discard(name)
+
+
+def test_rag_tool_answers_repeated_questions_from_the_cache(rag):
+    rag, model = rag
+    ask = lambda query: rag.query_and_retrieve_document.invoke({"query": query})
+    first = ask(BRIDGE_DOMAINS)
+    assert "api_endpoint" in first and model.position == 1
+    assert ask("how do I list all bridge domains") == first
+    assert model.position == 1
+    # Below the threshold the model is asked again
+    ask(BRIDGE_DOMAINS_REWORDED)
+    assert model.position == 2
+    assert rag.get_answer_cache().stats()["hits"] == 1
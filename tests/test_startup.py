@@ -0,0 +1,29 @@
+import subprocess
+import sys
+
+# Imported on first use, never by importing the tool modules
+HEAVY_MODULES = [
+    "langsmith", "langchain_core.tools", "langchain_core.runnables", "langchain_core.prompts", "numpy",
+    "pinecone", "langchain_pinecone", "langchain_google_genai", "langchain_openai", "langchain_unstructured",
+]
+
+
+def loaded_after(code):
+    check = f"import sys\n{code}\nprint(' '.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))"
+    completed = subprocess.run([sys.executable, "-c", check], capture_output=True, text=True, check=True)
+    return completed.stdout.split()
+
+
+def test_tool_modules_import_without_heavy_dependencies():
+    assert loaded_after("import agent.agent_rest_tool, agent.agent_rag_tool") == []
+
+
+def test_tools_are_built_on_first_import():
+    loaded = loaded_after(
+        "from agent.agent_rest_tool import get_apic\n"
+        "from agent.agent_rag_tool import query_and_retrieve_document\n"
+        "assert get_apic.name == 'get_apic' and query_and_retrieve_document.name == 'query_and_retrieve_document'"
+    )
+    assert "langchain_core.tools" in loaded
+    # The RAG backends still wait for the first query
+    assert "pinecone" not in loaded and "numpy" not in loaded
@@ -0,0 +1,50 @@
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.tools import StructuredTool
+from langgraph.prebuilt import create_react_agent
+
+from agent.context import context_hook
+from agent.streaming import stream_events
+from benchmarks.fakes import ScriptedChatModel, tool_call
+
+ANSWER = "There are 160 bridge domains."
+
+
+def count_bridge_domains(tenant: str) -> str:
+    """Count the bridge domains of a tenant"""
+    return "160"
+
+
+def run_turn(tools, script, **kwargs):
+    model = ScriptedChatModel(script=script)
+    graph = create_react_agent(model, tools, **kwargs)
+    return list(stream_events(graph, {"messages": [("user", "How many bridge domains?")]}, {}))
+
+
+def test_tool_progress_comes_before_the_reply_tokens():
+    tool = StructuredTool.from_function(count_bridge_domains)
+    events = run_turn([tool], [tool_call("count_bridge_domains", {"tenant": "PROD"}, "call-1"), AIMessage(content=ANSWER)])
+    kinds = [kind for kind, _ in events]
+    assert kinds == ["tool_call", "tool_result"] + ["token"] * 5 + ["answer"]
+    assert events[0][1]["name"] == "count_bridge_domains" and events[0][1]["args"] == {"tenant": "PROD"}
+    assert isinstance(events[1][1], ToolMessage) and events[1][1].content == "160"
+    # The reply arrives word by word before the complete answer
+    tokens = [value for kind, value in events if kind == "token"]
+    assert tokens[0] == "There " and "".join(tokens) == events[-1][1] == ANSWER
+
+
+def test_tokens_of_a_model_called_inside_a_tool_are_not_shown():
+    inner = ScriptedChatModel(script=[AIMessage(content="internal retrieval answer")])
+
+    def lookup(query: str) -> str:
+        """Ask the documentation model"""
+        return inner.invoke(query).content
+
+    tool = StructuredTool.from_function(lookup)
+    events = run_turn([tool], [tool_call("lookup", {"query": "subtree"}, "call-1"), AIMessage(content=ANSWER)])
+    assert events[1][1].content == "internal retrieval answer"
+    assert "".join(value for kind, value in events if kind == "token") == ANSWER
+
+
+def test_context_hook_updates_are_not_reported():
+    events = run_turn([], [AIMessage(content=ANSWER)], pre_model_hook=context_hook("PROMPT"))
+    assert [kind for kind, _ in events] == ["token"] * 5 + ["answer"]
@@ -0,0 +1,120 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tools import StructuredTool, ToolException
+
+from agent.tool_executor import ToolExecutor
+
+
+@pytest.fixture
+def executor():
+    executor = ToolExecutor(max_workers=8, limits={"sleepy": 2}, timeouts={"sleepy": 5})
+    yield executor
+    executor.close()
+
+
+class InFlight:
+    """Counts concurrent calls and remembers the highest count"""
+    def __init__(self):
+        self.current = self.peak = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.current -= 1
+
+
+def sleeping_tool(name, seconds, in_flight=None):
+    def sleep(x: int) -> int:
+        """Sleep, then return x"""
+        with in_flight or InFlight():
+            time.sleep(seconds)
+        return x
+    return StructuredTool.from_function(sleep, name=name)
+
+
+def test_calls_of_one_tool_are_limited(executor):
+    in_flight, other = InFlight(), InFlight()
+    sleepy = executor.wrap(sleeping_tool("sleepy", 0.1, in_flight))
+    unlimited = executor.wrap(sleeping_tool("unlimited", 0.1, other))
+    with ThreadPoolExecutor(max_workers=12) as callers:
+        results = list(callers.map(lambda x: sleepy.invoke({"x": x}), range(6)))
+        list(callers.map(lambda x: unlimited.invoke({"x": x}), range(4)))
+    assert results == list(range(6))
+    assert in_flight.peak == 2
+    # Tools without a configured limit get DEFAULT_TOOL_LIMIT
+    assert other.peak == 4
+
+
+def test_timed_out_call_returns_an_error(executor):
+    executor.timeouts["slow"] = 0.2
+    slow = executor.wrap(sleeping_tool("slow", 2))
+    started = time.monotonic()
+    result = slow.invoke({"x": 1})
+    assert "slow timed out after 0.2s" in result
+    assert time.monotonic() - started < 1
+
+
+def test_aborted_turn_cancels_its_calls(executor):
+    slow = executor.wrap(sleeping_tool("slow", 5))
+    config = {"configurable": {"thread_id": "t1"}}
+    with executor.turn("t1"), ThreadPoolExecutor(max_workers=1) as caller:
+        future = caller.submit(slow.invoke, {"x": 1}, config)
+        time.sleep(0.2)
+        executor.cancel("t1")
+        assert "cancelled" in future.result(timeout=1)
+
+
+def test_leaving_a_turn_by_an_exception_cancels_it(executor):
+    slow = executor.wrap(sleeping_tool("slow", 5))
+    config = {"configurable": {"thread_id": "t2"}}
+    with ThreadPoolExecutor(max_workers=1) as caller:
+        with pytest.raises(KeyboardInterrupt), executor.turn("t2"):
+            future = caller.submit(slow.invoke, {"x": 1}, config)
+            time.sleep(0.2)
+            raise KeyboardInterrupt
+        assert "cancelled" in future.result(timeout=1)
+    # Other conversations are not affected
+    assert executor.wrap(sleeping_tool("fast", 0)).invoke({"x": 3}, {"configurable": {"thread_id": "t3"}}) == 3
+
+
+class ToolStarts(BaseCallbackHandler):
+    def __init__(self):
+        self.started = []
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self.started.append((serialized["name"], parent_run_id))
+
+
+def test_the_wrapped_tool_is_invoked_as_a_child_run(executor):
+    starts = ToolStarts()
+    wrapped = executor.wrap(sleeping_tool("sleepy", 0))
+    assert wrapped.invoke({"x": "7"}, {"callbacks": [starts]}) == 7
+    (outer, outer_parent), (inner, inner_parent) = starts.started
+    assert outer == inner == "sleepy"
+    assert outer_parent is None and inner_parent is not None
+
+
+def test_the_wrapped_tool_handles_its_own_errors(executor):
+    def failing(x: int) -> int:
+        """Always fails"""
+        raise ToolException("no such tenant")
+
+    handled = StructuredTool.from_function(failing, handle_tool_error=lambda error: f"handled: {error}")
+    assert executor.wrap(handled).invoke({"x": 1}) == "handled: no such tenant"
+
+
+def test_coroutine_only_tools_are_awaited(executor):
+    async def double(x: int) -> int:
+        """Return 2x"""
+        return 2 * x
+
+    assert executor.wrap(StructuredTool.from_function(coroutine=double, name="double")).invoke({"x": 4}) == 8
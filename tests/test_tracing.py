@@ -0,0 +1,25 @@
+import json
+
+from agent.tracing import Tracer
+
+
+def test_trace_file_is_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("TRACE_FILE", raising=False)
+    assert Tracer.from_env().path is None
+
+
+def test_spans_nest_and_go_to_one_open_file(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(str(path))
+    with tracer.span("outer") as outer:
+        with tracer.span("apic.http", path="/api/node/class/fvBD.json", query="page=0"):
+            pass
+    trace_file = tracer._file
+    with tracer.span("second"):
+        pass
+    assert tracer._file is trace_file
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [span["name"] for span in spans] == ["apic.http", "outer", "second"]
+    assert spans[0]["parent_id"] == outer.span_id and spans[0]["attributes"]["query"] == "page=0"
+    tracer.close()
+    assert 'apic_agent_spans_total{span="outer",status="ok"} 1' in tracer.metrics.render()
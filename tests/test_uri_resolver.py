@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from agent.uri_resolver import URIResolver, singular
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agent", "content", "docs", "example_urls.txt")
+
+
+@pytest.fixture(scope="module")
+def resolver():
+    return URIResolver(EXAMPLES)
+
+
+def test_singular():
+    assert [singular(word) for word in ("policies", "switches", "tenants", "class", "status", "BDs", "EPGs")] == [
+        "policy", "switch", "tenant", "class", "status", "bd", "epg",
+    ]
+
+
+@pytest.mark.parametrize("query, url", [
+    ("list all tenants", "/api/node/class/fvTenant.json"),
+    ("show bridge domain PROD-DB in tenant PROD", "/api/node/mo/uni/tn-PROD/BD-PROD-DB.json"),
+    ("list EPGs in tenant PROD", "/api/node/mo/uni/tn-PROD.json?query-target=subtree&target-subtree-class=fvAEPg"),
+    ("show tenant PROD health", "/api/node/mo/uni/tn-PROD.json?rsp-subtree-include=health"),
+    ("show pod 2", "/api/node/mo/topology/pod-2.json"),
+    ("list BDs in tenant PROD", "/api/node/mo/uni/tn-PROD.json?query-target=subtree&target-subtree-class=fvBD"),
+    ("show faults in tenant PROD", "/api/node/mo/uni/tn-PROD.json?query-target=subtree&target-subtree-class=faultInst"),
+    ("how many faults are in tenant PROD",
+     "/api/node/mo/uni/tn-PROD.json?query-target=subtree&target-subtree-class=faultInst&rsp-subtree-include=count"),
+    ("show faults of pod 2", "/api/node/mo/topology/pod-2.json?query-target=subtree&target-subtree-class=faultInst"),
+])
+def test_confident_resolutions(resolver, query, url):
+    resolution = resolver.resolve(query)
+    assert resolution.url == url
+    assert resolution.confidence == 1.0
+
+
+def test_node_without_pod_is_found_by_id(resolver):
+    # Node 101 may be in any pod; a class query filtered on the ID finds it without guessing
+    resolution = resolver.resolve("show switch 101 health")
+    assert resolution.url == '/api/node/class/fabricNode.json?rsp-subtree-include=health&query-target-filter=eq(fabricNode.id,"101")'
+    assert resolution.confidence == 1.0
+
+
+def test_node_with_pod_uses_its_dn(resolver):
+    assert resolver.resolve("show node 101 in pod 2").url == "/api/node/mo/topology/pod-2/node-101.json"
+
+
+def test_assumed_pod_lowers_confidence(resolver):
+    stated = resolver.resolve("interfaces of node 101 in pod 1")
+    assumed = resolver.resolve("interfaces of node 101")
+    assert assumed.url == stated.url
+    assert assumed.confidence < stated.confidence
+    assert "pod 1 assumed" in assumed.basis
+
+
+@pytest.mark.parametrize("query", ["create tenant PROD", "why is my EPG down", "hello there"])
+def test_unsupported_requests_are_not_resolved(resolver, query):
+    assert resolver.resolve(query) is None
+
+
+def test_ambiguous_requests_have_low_confidence(resolver):
+    assert resolver.resolve("show tenant PROD and some unknown widgets").confidence < 0.8
+
+
+def test_faults_with_other_includes_lose_confidence(resolver):
+    resolution = resolver.resolve("show tenant PROD faults and health")
+    assert resolution.url == "/api/node/mo/uni/tn-PROD.json?query-target=subtree&target-subtree-class=faultInst"
+    assert resolution.confidence < 1.0
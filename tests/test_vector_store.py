@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from agent.vector_store import LocalVectorStore
+from benchmarks.fakes import deterministic_embeddings
+
+TEXTS = [
+    "fvBD bridge domain arpFlood setting",
+    "fvAEPg endpoint group in an application profile",
+    "fabricNode leaf and spine switches",
+    "faultInst faults raised on a managed object",
+]
+
+
+@pytest.fixture(params=["float32", "int8"])
+def open_store(request, tmp_path):
+    """Open (or reopen) a LocalVectorStore in one directory, with float32 or int8 rows"""
+    def build(**kwargs):
+        return LocalVectorStore(str(tmp_path / "index"), deterministic_embeddings(64), quantize=request.param, **kwargs)
+    return build
+
+
+def top(store, query, k=1):
+    return [doc.metadata["name"] for doc in store.similarity_search(query, k=k)]
+
+
+def test_query_returns_the_closest_texts_first(open_store):
+    store = open_store()
+    store.add_texts(TEXTS, metadatas=[{"name": str(index)} for index in range(4)], ids=list("abcd"))
+    results = store.similarity_search_with_score(TEXTS[2], k=4)
+    assert results[0][0].metadata == {"name": "2"} and results[0][1] == pytest.approx(1.0, abs=0.02)
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+    # k is capped at the number of rows
+    assert len(store.similarity_search(TEXTS[0], k=10)) == 4
+
+
+def test_adding_an_existing_id_replaces_its_row(open_store):
+    store = open_store()
+    store.add_texts(TEXTS[:2], metadatas=[{"name": "old"}, {"name": "other"}], ids=["a", "b"])
+    store.add_texts([TEXTS[3]], metadatas=[{"name": "new"}], ids=["a"])
+    assert store.count == 3
+    # The old text of a is gone; its new text is found under the same id
+    assert sorted(top(store, TEXTS[0], k=3)) == ["new", "other"]
+    assert top(store, TEXTS[3]) == ["new"]
+    assert store.record(2)["id"] == "a" and store._row_index() == {"a": 2, "b": 1}
+
+
+def test_duplicate_ids_in_one_batch_keep_the_last(open_store):
+    store = open_store()
+    store.add_texts(TEXTS[:2], metadatas=[{"name": "first"}, {"name": "second"}], ids=["a", "a"])
+    assert top(store, TEXTS[0], k=2) == ["second"]
+
+
+def test_delete_tombstones_rows(open_store):
+    store = open_store()
+    store.add_texts(TEXTS, metadatas=[{"name": str(index)} for index in range(4)], ids=list("abcd"))
+    assert store.delete(ids=["b", "missing"]) is True
+    assert store.delete(ids=[]) is False
+    assert "1" not in top(store, TEXTS[1], k=4)
+    assert sorted(store._row_index()) == ["a", "c", "d"]
+    # Deleting again finds nothing more to tombstone
+    store.delete(ids=["b"])
+    assert store._deleted.tolist() == [1]
+
+
+def test_reopened_index_maps_the_same_rows(open_store):
+    store = open_store()
+    store.add_texts(TEXTS, metadatas=[{"name": str(index)} for index in range(4)], ids=list("abcd"))
+    store.delete(ids=["d"])
+    expected = store.similarity_search_with_score(TEXTS[0], k=4)
+
+    reopened = open_store()
+    assert isinstance(reopened._vectors, np.memmap)
+    assert (reopened.count, reopened.dim, reopened.dtype) == (4, 64, store.dtype)
+    # The id index is only read from the records when it is first needed
+    assert reopened._rows is None
+    assert reopened.similarity_search_with_score(TEXTS[0], k=4) == expected
+    reopened.add_texts([TEXTS[2]], metadatas=[{"name": "c2"}], ids=["c"])
+    assert reopened._row_index() == {"a": 0, "b": 1, "c": 4}
+    names = top(reopened, TEXTS[2], k=4)
+    assert names[0] == "c2" and sorted(names[1:]) == ["0", "1"]
+
+
+def test_appended_rows_are_searched_after_the_ivf_was_built(open_store):
+    store = open_store(nprobe=1)
+    texts = [f"tenant{index:03d} bridge domain {index}" for index in range(40)]
+    store.add_texts(texts, metadatas=[{"name": str(index)} for index in range(40)])
+    store.build_ivf(nlist=4)
+    store.add_texts(["brand new leaf switch"], metadatas=[{"name": "new"}])
+    assert top(store, "brand new leaf switch") == ["new"]
+    assert top(open_store(nprobe=4), texts[7]) == ["7"]